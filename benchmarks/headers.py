@@ -0,0 +1,89 @@
+"""
+Compare scanning raw headers with the indexed lookups of
+L{klein._headers.FrozenHTTPHeaders} and L{klein._headers.MutableHTTPHeaders}.
+
+Run with::
+
+    python benchmarks/headers.py
+
+For each message size, C{scan} looks a header up by going through every raw
+header, as L{klein._headers.getFromRawHeaders} does, C{frozen} and
+C{mutable} look it up through their indexes, and C{mutate} adds a header to
+and removes one from a L{klein._headers.MutableHTTPHeaders}.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from timeit import repeat
+
+from klein._headers import (
+    FrozenHTTPHeaders,
+    MutableHTTPHeaders,
+    getFromRawHeaders,
+    normalizeRawHeadersFrozen,
+)
+
+
+SIZES = (10, 50, 200)
+
+
+def buildRawHeaders(size):
+    """
+    Build C{size} raw headers: a few common ones, then custom ones.
+    """
+    rawHeaders = [
+        (b"Host", b"example.com"),
+        (b"User-Agent", b"benchmark/1.0"),
+        (b"Accept", b"text/html"),
+        (b"Accept-Encoding", b"gzip, deflate"),
+        (b"Cookie", b"session=abc"),
+    ][:size]
+    for i in range(size - len(rawHeaders)):
+        rawHeaders.append((b"X-Custom-%d" % (i,), b"value %d" % (i,)))
+    return rawHeaders
+
+
+def benchmark(size, number=20000):
+    rawHeaders = buildRawHeaders(size)
+    normalized = normalizeRawHeadersFrozen(rawHeaders)
+    frozen = FrozenHTTPHeaders(rawHeaders=rawHeaders)
+    mutable = MutableHTTPHeaders(rawHeaders=rawHeaders)
+    last = rawHeaders[-1][0]
+
+    def scan():
+        list(getFromRawHeaders(normalized, last))
+        list(getFromRawHeaders(normalized, b"Cookie"))
+
+    def frozenLookup():
+        list(frozen.getValues(last))
+        list(frozen.getValues(b"Cookie"))
+
+    def mutableLookup():
+        list(mutable.getValues(last))
+        list(mutable.getValues(b"Cookie"))
+
+    def mutate():
+        mutable.addValue(b"X-Added", b"1")
+        mutable.remove(b"X-Added")
+
+    results = []
+    for name, function in (
+        ("scan", scan),
+        ("frozen", frozenLookup),
+        ("mutable", mutableLookup),
+        ("mutate", mutate),
+    ):
+        best = min(repeat(function, number=number, repeat=3))
+        results.append((name, best / number * 1e6))
+    return results
+
+
+def main():
+    print("{:>8}  {:>10}  {:>14}".format("headers", "operation", "usec/op"))
+    for size in SIZES:
+        for name, usec in benchmark(size):
+            print("{:>8}  {:>10}  {:>14.2f}".format(size, name, usec))
+
+
+if __name__ == "__main__":
+    main()
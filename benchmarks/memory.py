@@ -0,0 +1,127 @@
+"""
+Measure the memory allocated for each request rendered through
+L{klein.resource.KleinResource}.
+
+Run with::
+
+    python benchmarks/memory.py
+
+This needs Python 3, for L{tracemalloc}.  For a handler returning L{bytes},
+a handler using the HTTP message API to read the request's headers and URL
+and return a L{klein._response.FrozenHTTPResponse}, and a handler which is
+given the request's URL by a L{klein.Requirer} and returns a
+L{klein.Response}, this reports the bytes still allocated for each request
+once it has been rendered, while the requests are kept alive, and the mean
+peak traced while rendering one.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import gc
+import tracemalloc
+
+from twisted.web.server import Request
+from twisted.web.test.requesthelper import DummyChannel
+
+from klein import Klein, RequestURL, Requirer, Response
+from klein._headers import FrozenHTTPHeaders
+from klein._request_compat import HTTPRequestWrappingIRequest
+from klein._response import FrozenHTTPResponse
+
+
+def buildApp():
+    app = Klein()
+    requirer = Requirer()
+
+    @app.route("/plain")
+    def plain(request):
+        return b"ok"
+
+    @app.route("/message")
+    def message(request):
+        wrapped = HTTPRequestWrappingIRequest(request=request)
+        list(wrapped.headers.getValues(u"accept"))
+        wrapped.uri.host
+        return FrozenHTTPResponse(
+            status=200,
+            headers=FrozenHTTPHeaders(
+                rawHeaders=((b"Content-Type", b"text/plain"),)
+            ),
+            body=b"ok",
+        )
+
+    @requirer.require(app.route("/requirer"), url=RequestURL())
+    def required(url):
+        return Response(headers={u"X-Host": url.host}, body=b"ok")
+
+    return app
+
+
+def makeRequest(path):
+    request = Request(DummyChannel(), False)
+    request.method = b"GET"
+    request.uri = path
+    request.clientproto = b"HTTP/1.1"
+    request.prepath = []
+    request.postpath = path.split(b"/")[1:]
+    request.requestHeaders.setRawHeaders(b"host", [b"example.com"])
+    request.requestHeaders.setRawHeaders(b"accept", [b"text/plain"])
+    return request
+
+
+def allocations(resource, path, count=500):
+    """
+    Trace the memory allocated while rendering requests.
+
+    @return: The mean number of bytes still allocated for each of C{count}
+        requests once they've been rendered, and the mean peak traced while
+        rendering one.
+    """
+    requests = [makeRequest(path) for _ in range(count + 10)]
+    # Warm up any caches first.
+    for request in requests[:10]:
+        resource.render(request)
+        assert request.finished, path
+    requests = requests[10:]
+    gc.collect()
+    gc.disable()
+    try:
+        peaks = 0
+        for request in requests[: count // 2]:
+            tracemalloc.start()
+            resource.render(request)
+            peaks += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        requests = requests[count // 2 :]
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for request in requests:
+            resource.render(request)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+    held = sum(
+        stat.size_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.size_diff > 0
+    )
+    return held / len(requests), peaks / (count // 2)
+
+
+def main():
+    resource = buildApp().resource()
+    print(
+        "{:>10}  {:>16}  {:>12}".format("path", "bytes/request", "peak bytes")
+    )
+    for path in (b"/plain", b"/message", b"/requirer"):
+        held, peak = allocations(resource, path)
+        print(
+            "{:>10}  {:16.0f}  {:12.0f}".format(
+                path.decode("ascii"), held, peak
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
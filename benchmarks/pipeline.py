@@ -0,0 +1,137 @@
+"""
+Measure the cost of rendering a request through
+L{klein.resource.KleinResource}.
+
+Run with::
+
+    python benchmarks/pipeline.py
+
+For a handler returning L{bytes}, a handler returning a L{Deferred} and a
+request that matches no route, this reports the time taken to render each
+request and, on Python 3, the peak memory traced while rendering a request
+and the number of memory blocks still held once it has been rendered.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import gc
+from timeit import default_timer
+
+from twisted.internet.defer import succeed
+from twisted.web.server import Request
+from twisted.web.test.requesthelper import DummyChannel
+
+from klein import Klein
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+
+def buildApp():
+    app = Klein()
+
+    @app.route("/health")
+    def health(request):
+        return b"ok"
+
+    @app.route("/lookup/<int:key>")
+    def lookup(request, key):
+        return succeed(u"value {}".format(key))
+
+    return app
+
+
+def makeRequest(path):
+    request = Request(DummyChannel(), False)
+    request.method = b"GET"
+    request.uri = path
+    request.clientproto = b"HTTP/1.1"
+    request.prepath = []
+    request.postpath = path.split(b"/")[1:]
+    return request
+
+
+def allocations(resource, path, count=200):
+    """
+    Trace the memory allocated while rendering requests.
+
+    @return: The mean peak traced memory, in bytes, while rendering a single
+        request, and the mean number of blocks still allocated after
+        rendering each of C{count} requests.
+    """
+    requests = [makeRequest(path) for _ in range(count + 10)]
+    # Warm up any caches first.
+    for request in requests[:10]:
+        resource.render(request)
+    requests = requests[10:]
+    gc.collect()
+    gc.disable()
+    try:
+        peaks = 0
+        for request in requests[: count // 2]:
+            tracemalloc.start()
+            resource.render(request)
+            peaks += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        requests = requests[count // 2 :]
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for request in requests:
+            resource.render(request)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+    blocks = sum(
+        stat.count_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.count_diff > 0
+    )
+    return peaks / (count // 2), blocks / len(requests)
+
+
+def timing(resource, path, number=2000):
+    """
+    Time rendering requests.
+
+    @return: The best mean time to render a request, in microseconds.
+    """
+    best = None
+    for _ in range(3):
+        requests = [makeRequest(path) for _ in range(number)]
+        start = default_timer()
+        for request in requests:
+            resource.render(request)
+        elapsed = default_timer() - start
+        assert all(request.finished for request in requests)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / number * 1e6
+
+
+def main():
+    resource = buildApp().resource()
+    print(
+        "{:>10}  {:>12}  {:>14}  {:>14}".format(
+            "path", "usec/request", "peak bytes", "blocks held"
+        )
+    )
+    for path in (b"/health", b"/lookup/7", b"/missing"):
+        usec = timing(resource, path)
+        if tracemalloc is None:
+            peak = held = "n/a"
+        else:
+            peak, held = allocations(resource, path)
+            peak = "{:.0f}".format(peak)
+            held = "{:.1f}".format(held)
+        print(
+            "{:>10}  {:12.2f}  {:>14}  {:>14}".format(
+                path.decode("ascii"), usec, peak, held
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
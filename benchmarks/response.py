@@ -0,0 +1,63 @@
+"""
+Compare applying a L{klein.Response} to a request with applying one made
+with L{klein.Response.frozen}.
+
+Run with::
+
+    python benchmarks/response.py
+
+For each number of headers, half text and half with a L{list} of values,
+this reports the time taken by C{Response._applyToRequest}.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from timeit import repeat
+
+from twisted.web.server import Request
+from twisted.web.test.requesthelper import DummyChannel
+
+from klein import Response
+
+
+SIZES = (1, 5, 20)
+
+
+def buildHeaders(size):
+    headers = {}
+    for i in range(size):
+        if i % 2:
+            headers[u"X-Text-{}".format(i)] = u"value {}".format(i)
+        else:
+            headers[b"X-List-%d" % (i,)] = [b"first", u"second"]
+    return headers
+
+
+def benchmark(size, number=20000):
+    headers = buildHeaders(size)
+    plain = Response(code=200, headers=headers, body=b"ok")
+    frozen = Response.frozen(code=200, headers=headers, body=b"ok")
+    request = Request(DummyChannel(), False)
+
+    results = []
+    for name, response in (("plain", plain), ("frozen", frozen)):
+        best = min(
+            repeat(
+                lambda: response._applyToRequest(request),
+                number=number,
+                repeat=3,
+            )
+        )
+        results.append((name, best / number * 1e6))
+    return results
+
+
+def main():
+    print("{:>8}  {:>10}  {:>14}".format("headers", "response", "usec/apply"))
+    for size in SIZES:
+        for name, usec in benchmark(size):
+            print("{:>8}  {:>10}  {:>14.2f}".format(size, name, usec))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare werkzeug routing with L{klein._router.CompiledRouter}.
+
+Run with::
+
+    python benchmarks/routing.py
+
+For each table size, the werkzeug numbers are for binding a C{MapAdapter}
+and matching, as L{klein.resource.KleinResource} does for every request
+without compiled routing.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from timeit import repeat
+
+from werkzeug.routing import Map, Rule
+
+from klein._router import CompiledRouter
+
+
+SIZES = (10, 1000, 10000)
+
+
+def buildMap(size):
+    """
+    Build a map with C{size} rules: half static, half with an argument.
+    """
+    rules = []
+    for i in range(size // 2):
+        rules.append(
+            Rule(u"/static{}/page".format(i), endpoint="s{}".format(i))
+        )
+        rules.append(
+            Rule(u"/items{}/<int:id>".format(i), endpoint="i{}".format(i))
+        )
+    return Map(rules)
+
+
+def benchmark(size, number=2000):
+    urlMap = buildMap(size)
+    router = CompiledRouter(urlMap)
+    router.compile()
+    last = size // 2 - 1
+
+    path = u"/items{}/42".format(last)
+    segments = path.encode("ascii").split(b"/")[1:]
+
+    def werkzeugMatch():
+        urlMap.bind(u"localhost", u"", path_info=path).match(return_rule=True)
+
+    def compiledMatch():
+        router.match(segments, b"GET")
+
+    results = []
+    for name, function in (
+        ("werkzeug", werkzeugMatch),
+        ("compiled", compiledMatch),
+    ):
+        best = min(repeat(function, number=number, repeat=3))
+        results.append((name, best / number * 1e6))
+    return results
+
+
+def main():
+    print("{:>8}  {:>10}  {:>14}".format("routes", "router", "usec/match"))
+    for size in SIZES:
+        number = 200 if size > 1000 else 2000
+        for name, usec in benchmark(size, number):
+            print("{:>8}  {:>10}  {:>14.2f}".format(size, name, usec))
+
+
+if __name__ == "__main__":
+    main()
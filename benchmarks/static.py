@@ -0,0 +1,96 @@
+"""
+Compare serving a directory's files with L{twisted.web.static.File} and with
+L{klein.Klein.static}.
+
+Run with::
+
+    python benchmarks/static.py
+
+For a small and a large file, this reports the time taken to render a
+request for the whole file from each, through
+L{klein.resource.KleinResource}, until the request is finished.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+from timeit import repeat
+
+from twisted.web.server import Request
+from twisted.web.static import File
+from twisted.web.test.requesthelper import DummyChannel
+
+from klein import Klein
+
+
+SIZES = (("small", 2 * 1024), ("large", 1024 * 1024))
+
+
+def buildApps(directory):
+    twistedApp = Klein()
+
+    @twistedApp.route("/assets/", branch=True)
+    def assets(request):
+        return File(directory)
+
+    kleinApp = Klein()
+    kleinApp.static("/assets", directory)
+    return (("File", twistedApp), ("static", kleinApp))
+
+
+def makeRequest(path):
+    request = Request(DummyChannel(), False)
+    request.method = b"GET"
+    request.uri = path
+    request.clientproto = b"HTTP/1.1"
+    request.prepath = []
+    request.postpath = path.split(b"/")[1:]
+    return request
+
+
+def render(resource, path):
+    """
+    Render a request, pulling from any producer it registers, as a
+    transport would, until it's finished.
+    """
+    request = makeRequest(path)
+    resource.render(request)
+    while not request.finished:
+        request.producer.resumeProducing()
+    return request
+
+
+def benchmark(directory, number=500):
+    results = []
+    for size, length in SIZES:
+        with open(os.path.join(directory, size + ".txt"), "wb") as f:
+            f.write(b"x" * length)
+        path = b"/assets/" + size.encode("ascii") + b".txt"
+        for name, app in buildApps(directory):
+            resource = app.resource()
+            best = min(
+                repeat(
+                    lambda: render(resource, path),
+                    number=number,
+                    repeat=3,
+                )
+            )
+            results.append((size, name, best / number * 1e6))
+    return results
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        results = benchmark(directory)
+    finally:
+        shutil.rmtree(directory)
+    print("{:>6}  {:>8}  {:>14}".format("file", "served", "usec/request"))
+    for size, name, usec in results:
+        print("{:>6}  {:>8}  {:>14.2f}".format(size, name, usec))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,15 @@ from __future__ import absolute_import, division
 from typing import TYPE_CHECKING
 
 from ._app import Klein, handle_errors, route, run, subroute, urlFor, url_for
+from ._cache import CachePolicy
+from ._compression import Compression
 from ._dihttp import RequestComponent, RequestURL, Response
+from ._file import FileResponse
 from ._form import Field, FieldValues, Form, RenderableForm
 from ._plating import Plating
 from ._requirer import Requirer
 from ._session import Authorization, SessionProcurer
+from ._static import AssetManifest
 from ._version import __version__ as _incremental_version
 
 if TYPE_CHECKING:
@@ -20,6 +24,10 @@ else:
 
 __all__ = (
     "Klein",
+    "AssetManifest",
+    "CachePolicy",
+    "Compression",
+    "FileResponse",
     "Plating",
     "Field",
     "FieldValues",
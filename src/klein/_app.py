@@ -36,9 +36,21 @@ from werkzeug.routing import Map, Rule, Submount
 
 from zope.interface import implementer
 
-from ._decorators import modified, named
+from ._cache import ResponseCache, SingleFlight
+from ._compression import Compression
+from ._conditional import Validators
+from ._decorators import bindable, modified, named
 from ._interfaces import IKleinRequest
-from ._resource import KleinResource
+from ._request_compat import HTTPRequestWrappingIRequest
+from ._requesturl import requestURL
+from ._resource import (
+    ERROR_BODY_FORMATS,
+    ErrorDispatcher,
+    KleinResource,
+    ResultDispatcher,
+)
+from ._router import CompiledRouter, MatchCache
+from ._static import AssetManifest, StaticFiles, isFingerprinted
 
 
 def _call(__klein_instance__, __klein_f__, *args, **kwargs):
@@ -63,11 +75,75 @@ def _call(__klein_instance__, __klein_f__, *args, **kwargs):
     return result
 
 
+def _compressionFor(compress):
+    """
+    Interpret the C{compress} argument to L{Klein} or L{Klein.route}.
+
+    @rtype: L{Compression} or L{None}
+    """
+    if compress is True:
+        return Compression()
+    if not compress:
+        return None
+    return compress
+
+
 @implementer(IKleinRequest)
 class KleinRequest(object):
+    __slots__ = (
+        "_branchSegments",
+        "maxBodySize",
+        "_mapper",
+        "_bindMapper",
+        "_httpRequest",
+    )
+
     def __init__(self, request):
-        self.branch_segments = [""]
-        self.mapper = None
+        self._branchSegments = None
+        self.maxBodySize = None
+        self._mapper = None
+        self._bindMapper = None
+        self._httpRequest = None
+
+    @property
+    def branch_segments(self):
+        """
+        The segments of the path consumed by a branch route.
+
+        Most requests aren't routed to branches, so the list is only made
+        when it's first asked for.
+        """
+        if self._branchSegments is None:
+            self._branchSegments = [""]
+        return self._branchSegments
+
+    @branch_segments.setter
+    def branch_segments(self, segments):
+        self._branchSegments = segments
+
+    @property
+    def mapper(self):
+        """
+        The C{werkzeug.routing.MapAdapter} for the request.
+
+        When the request was routed without one, it is bound on first access.
+        """
+        if self._mapper is None and self._bindMapper is not None:
+            self._mapper = self._bindMapper()
+        return self._mapper
+
+    @mapper.setter
+    def mapper(self, mapper):
+        self._mapper = mapper
+        self._bindMapper = None
+
+    def bindMapperLazily(self, bindMapper):
+        """
+        Arrange for L{KleinRequest.mapper} to be created by calling
+        C{bindMapper} the first time it is accessed.
+        """
+        self._mapper = None
+        self._bindMapper = bindMapper
 
     def url_for(self, *args, **kwargs):
         return self.mapper.build(*args, **kwargs)
@@ -76,6 +152,20 @@ class KleinRequest(object):
 registerAdapter(KleinRequest, Request, IKleinRequest)
 
 
+def _httpRequest(request):
+    """
+    Get the L{IHTTPRequest} wrapping C{request} which is passed to a native
+    route's handler and validators, so that they're all given the same one.
+    """
+    kleinRequest = IKleinRequest(request)
+    wrapped = getattr(kleinRequest, "_httpRequest", None)
+    if wrapped is None:
+        wrapped = HTTPRequestWrappingIRequest(request=request)
+        if isinstance(kleinRequest, KleinRequest):
+            kleinRequest._httpRequest = wrapped
+    return wrapped
+
+
 class Klein(object):
     """
     L{Klein} is an object which is responsible for maintaining the routing
@@ -84,16 +174,113 @@ class Klein(object):
     @ivar _url_map: A C{werkzeug.routing.Map} object which will be used for
         routing resolution.
     @ivar _endpoints: A C{dict} mapping endpoint names to handler functions.
+    @ivar _error_handlers: A C{list} of the error handlers registered with
+        L{Klein.handle_errors}, in order.
+    @ivar _errorDispatcher: An L{ErrorDispatcher} for C{_error_handlers}.
+    @ivar _resultDispatcher: A L{ResultDispatcher} holding the result
+        handlers registered with L{Klein.handleResults}.
+    @ivar _router: A L{CompiledRouter} for C{_url_map}, or L{None} to route
+        every request with werkzeug.
+    @ivar _matchCache: A L{MatchCache} for C{_url_map}, or L{None}.
+    @ivar _cachePolicies: A C{dict} mapping endpoint names to the
+        L{CachePolicy} of their route.
+    @ivar _responseCaches: A C{dict} mapping endpoint names to the
+        L{ResponseCache} of their route, for this app or bound instance.
+    @ivar _coalesced: A C{dict} mapping the names of endpoints which
+        coalesce requests to the names of the headers they vary on.
+    @ivar _singleFlights: A C{dict} mapping endpoint names to the
+        L{SingleFlight} of their route, for this app or bound instance.
+    @ivar _validators: A C{dict} mapping endpoint names to the
+        L{Validators} of their route.
+    @ivar _compression: The L{Compression} of routes which don't specify
+        their own, or L{None}.
+    @ivar _compressions: A C{dict} mapping the names of endpoints whose
+        responses are compressed to their L{Compression}.
+    @ivar _maxBodySize: The largest request body, in bytes, accepted by
+        routes which don't specify their own limit, or L{None}.
+    @ivar _maxBodySizes: A C{dict} mapping the names of endpoints with a
+        limit on the size of request bodies to that limit.
+    @ivar _native: A C{set} of the names of endpoints whose handlers take an
+        L{IHTTPRequest} and return an L{IHTTPResponse}.
+    @ivar _staticFiles: A C{dict} mapping the names of endpoints added with
+        L{Klein.static} to the L{StaticFiles} they serve.
     """
 
     _subroute_segments = 0
 
-    def __init__(self):
+    def __init__(
+        self,
+        compiledRouting=False,
+        matchCacheSize=0,
+        errorBodyFormat="html",
+        compress=None,
+        maxBodySize=None,
+    ):
+        """
+        @param compiledRouting: If true, match requests with a segment trie
+            compiled from the routing rules instead of having werkzeug search
+            all of them in turn.  Matching takes time proportional to the
+            length of the request path rather than the number of routes.
+            Anything the trie can't express exactly is still routed by
+            werkzeug.
+        @type compiledRouting: bool
+
+        @param matchCacheSize: If non-zero, cache the results of routing up
+            to this many distinct requests (by method, host and path),
+            including those that matched no route.
+        @type matchCacheSize: int
+
+        @param errorBodyFormat: The format of the body of responses to
+            werkzeug C{HTTPException}s which aren't handled by an error
+            handler: C{"html"} for werkzeug's own HTML page, or C{"json"} or
+            C{"text"} for a compact JSON object or line of plain text, which
+            may suit API applications better.
+        @type errorBodyFormat: str
+
+        @param compress: How to compress the responses of routes which don't
+            say otherwise: C{True} for the default L{Compression}, a
+            L{Compression}, or L{None} not to.
+        @type compress: bool or L{Compression}
+
+        @param maxBodySize: The largest request body, in bytes, accepted by
+            routes which don't say otherwise, or L{None} for no limit.
+            Requests declaring (or having sent) a larger body are answered
+            with C{413 Request Entity Too Large} before the route is called.
+        @type maxBodySize: int
+        """
+        if errorBodyFormat not in ERROR_BODY_FORMATS:
+            raise ValueError(
+                "errorBodyFormat must be one of {}, not {!r}".format(
+                    ", ".join(ERROR_BODY_FORMATS), errorBodyFormat
+                )
+            )
         self._url_map = Map()
         self._endpoints = {}
         self._error_handlers = []
+        self._errorDispatcher = ErrorDispatcher(self._error_handlers)
+        self._resultDispatcher = ResultDispatcher()
         self._instance = None
         self._boundAs = None
+        if compiledRouting:
+            self._router = CompiledRouter(self._url_map)
+        else:
+            self._router = None
+        if matchCacheSize:
+            self._matchCache = MatchCache(self._url_map, matchCacheSize)
+        else:
+            self._matchCache = None
+        self._errorBodyFormat = errorBodyFormat
+        self._cachePolicies = {}
+        self._responseCaches = {}
+        self._coalesced = {}
+        self._singleFlights = {}
+        self._validators = {}
+        self._compression = _compressionFor(compress)
+        self._compressions = {}
+        self._maxBodySize = maxBodySize
+        self._maxBodySizes = {}
+        self._native = set()
+        self._staticFiles = {}
 
     def __eq__(self, other):
         if isinstance(other, Klein):
@@ -120,6 +307,93 @@ class Klein(object):
         """
         return self._endpoints
 
+    @property
+    def matchCache(self):
+        """
+        Read only property exposing L{Klein._matchCache}, so that its size and
+        hit rate can be inspected.
+        """
+        return self._matchCache
+
+    @property
+    def responseCaches(self):
+        """
+        The L{ResponseCache} of each route with a cache policy, by endpoint
+        name, so that their hit rates can be inspected.
+        """
+        return self._responseCaches
+
+    @property
+    def singleFlights(self):
+        """
+        The L{SingleFlight} of each route which coalesces requests, by
+        endpoint name.
+        """
+        return self._singleFlights
+
+    def _setRouteOptions(
+        self,
+        endpoint,
+        policy,
+        coalesce,
+        validators,
+        compression,
+        maxBodySize,
+        native,
+    ):
+        for options in (
+            self._cachePolicies,
+            self._responseCaches,
+            self._coalesced,
+            self._singleFlights,
+            self._validators,
+            self._compressions,
+            self._maxBodySizes,
+        ):
+            options.pop(endpoint, None)
+        self._native.discard(endpoint)
+        if native:
+            self._native.add(endpoint)
+        if maxBodySize is not None:
+            self._maxBodySizes[endpoint] = maxBodySize
+        if compression is not None:
+            self._compressions[endpoint] = compression
+        if validators is not None:
+            self._validators[endpoint] = validators
+        if policy is not None:
+            self._cachePolicies[endpoint] = policy
+            self._responseCaches[endpoint] = ResponseCache(policy)
+        if coalesce:
+            vary = policy.vary if policy is not None else ()
+            self._coalesced[endpoint] = vary
+            self._singleFlights[endpoint] = SingleFlight(vary)
+
+    def _responseCache(self, endpoint):
+        """
+        Get the L{ResponseCache} for an endpoint, if it has a cache policy.
+
+        Apps bound to different instances don't share cached responses, since
+        their routes may well respond differently.
+        """
+        responseCache = self._responseCaches.get(endpoint)
+        if responseCache is None:
+            policy = self._cachePolicies.get(endpoint)
+            if policy is not None:
+                responseCache = ResponseCache(policy)
+                self._responseCaches[endpoint] = responseCache
+        return responseCache
+
+    def _singleFlight(self, endpoint):
+        """
+        Get the L{SingleFlight} for an endpoint, if it coalesces requests.
+        Like response caches, these aren't shared between instances.
+        """
+        singleFlight = self._singleFlights.get(endpoint)
+        if singleFlight is None and endpoint in self._coalesced:
+            singleFlight = SingleFlight(self._coalesced[endpoint])
+            self._singleFlights[endpoint] = singleFlight
+        return singleFlight
+
     def execute_endpoint(self, endpoint, *args, **kwargs):
         """
         Execute the named endpoint with all arguments and possibly a bound
@@ -128,18 +402,37 @@ class Klein(object):
         endpoint_f = self._endpoints[endpoint]
         return endpoint_f(self._instance, *args, **kwargs)
 
+    def _executeValidator(self, validator, request, kwargs, native=False):
+        """
+        Call a validator function of a route, possibly with a bound instance.
+
+        A native route's validators are given the same L{IHTTPRequest} as
+        its handler.
+        """
+        if native:
+            request = _httpRequest(request)
+        return _call(self._instance, validator, request, **kwargs)
+
     def execute_error_handler(self, handler, request, failure):
         """
         Execute the passed error handler, possibly with a bound instance.
         """
         return handler(self._instance, request, failure)
 
+    def _executeResultHandler(self, handler, request, result):
+        """
+        Call a result handler, possibly with a bound instance.
+        """
+        return handler(self._instance, request, result)
+
     def resource(self):
         """
         Return an L{IResource} which suitably wraps this app.
 
         @returns: An L{IResource}
         """
+        if self._router is not None:
+            self._router.compile()
 
         return KleinResource(self)
 
@@ -170,6 +463,20 @@ class Klein(object):
             k._url_map = self._url_map
             k._endpoints = self._endpoints
             k._error_handlers = self._error_handlers
+            k._errorDispatcher = self._errorDispatcher
+            k._resultDispatcher = self._resultDispatcher
+            k._router = self._router
+            k._matchCache = self._matchCache
+            k._errorBodyFormat = self._errorBodyFormat
+            k._cachePolicies = self._cachePolicies
+            k._coalesced = self._coalesced
+            k._validators = self._validators
+            k._compression = self._compression
+            k._compressions = self._compressions
+            k._maxBodySize = self._maxBodySize
+            k._maxBodySizes = self._maxBodySizes
+            k._native = self._native
+            k._staticFiles = self._staticFiles
             k._instance = instance
             kref = ref(k)
             try:
@@ -206,6 +513,57 @@ class Klein(object):
             match some other route to be consumed.  Default C{False}.
         @type branch: bool
 
+        @param cache: How the responses of this route may be cached in
+            memory, if at all.  Default L{None}.
+        @type cache: L{klein.CachePolicy}
+
+        @param coalesce: If true, identical concurrent C{GET} requests share
+            a single call to the handler while it's waiting on a
+            L{Deferred}; see L{klein._cache.SingleFlight}.  Only suitable
+            for handlers whose response is the same for every such request.
+            Default C{False}.
+        @type coalesce: bool
+
+        @param etag: C{True} to tag C{GET} and C{HEAD} responses with a hash
+            of their body, and answer requests whose C{If-None-Match} header
+            matches with C{304 Not Modified}.  Or, a version function, called
+            with the same arguments as the handler before it and returning
+            the current version of the response (or L{None}); requests which
+            already have that version are answered without calling the
+            handler at all.  Default L{None}.
+        @type etag: bool or callable
+
+        @param lastModified: A function called with the same arguments as the
+            handler before it, returning when the response last changed in
+            seconds since the epoch (or L{None}).  Requests which have
+            already seen that version, by their C{If-Modified-Since} header,
+            are answered with C{304 Not Modified} without calling the
+            handler.  Default L{None}.
+        @type lastModified: callable
+
+        @param compress: How to compress the responses of this route:
+            C{True} for the default L{klein.Compression}, a
+            L{klein.Compression}, or C{False} not to.  Default L{None}, to
+            compress them as the app does.
+        @type compress: bool or L{klein.Compression}
+
+        @param maxBodySize: The largest request body, in bytes, this route
+            accepts.  Requests declaring (or having sent) a larger one are
+            answered with C{413 Request Entity Too Large} without calling
+            the handler, and reading a larger body through
+            L{IHTTPRequest.bodyAsBytes} fails.  Default L{None}, to use the
+            app's limit.
+        @type maxBodySize: int
+
+        @param native: If true, the handler is passed an L{IHTTPRequest}
+            wrapping the request, rather than the request itself, and must
+            return an L{IHTTPResponse} (or a L{Deferred} or coroutine
+            resulting in one), whose status, headers and body are written to
+            the request in one go.  A response made with a L{bytes} body may
+            be returned again and again, for instance from a cache.  The
+            route's C{etag} and C{lastModified} functions are passed the
+            same L{IHTTPRequest}.  Default C{False}.
+        @type native: bool
 
         @returns: decorated handler function.
         """
@@ -214,6 +572,23 @@ class Klein(object):
         @named("router for '" + url + "'")
         def deco(f):
             kwargs.setdefault("endpoint", f.__name__)
+            cachePolicy = kwargs.pop("cache", None)
+            coalesce = kwargs.pop("coalesce", False)
+            etag = kwargs.pop("etag", None)
+            lastModified = kwargs.pop("lastModified", None)
+            if etag is None and lastModified is None:
+                validators = None
+            else:
+                validators = Validators(etag, lastModified)
+            compress = kwargs.pop("compress", None)
+            if compress is None:
+                compression = self._compression
+            else:
+                compression = _compressionFor(compress)
+            maxBodySize = kwargs.pop("maxBodySize", None)
+            if maxBodySize is None:
+                maxBodySize = self._maxBodySize
+            native = kwargs.pop("native", False)
             if kwargs.pop("branch", False):
                 branchKwargs = kwargs.copy()
                 branchKwargs["endpoint"] = branchKwargs["endpoint"] + "_branch"
@@ -223,11 +598,22 @@ class Klein(object):
                     IKleinRequest(request).branch_segments = kw.pop(
                         "__rest__", ""
                     ).split("/")
+                    if native:
+                        request = _httpRequest(request)
                     return _call(instance, f, request, *a, **kw)
 
                 branch_f.segment_count = segment_count
 
                 self._endpoints[branchKwargs["endpoint"]] = branch_f
+                self._setRouteOptions(
+                    branchKwargs["endpoint"],
+                    cachePolicy,
+                    coalesce,
+                    validators,
+                    compression,
+                    maxBodySize,
+                    native,
+                )
                 self._url_map.add(
                     Rule(
                         url.rstrip("/") + "/" + "<path:__rest__>",
@@ -238,11 +624,22 @@ class Klein(object):
 
             @modified("route '{url}' executor".format(url=url), f)
             def _f(instance, request, *a, **kw):
+                if native:
+                    request = _httpRequest(request)
                 return _call(instance, f, request, *a, **kw)
 
             _f.segment_count = segment_count
 
             self._endpoints[kwargs["endpoint"]] = _f
+            self._setRouteOptions(
+                kwargs["endpoint"],
+                cachePolicy,
+                coalesce,
+                validators,
+                compression,
+                maxBodySize,
+                native,
+            )
             self._url_map.add(Rule(url, *args, **kwargs))
             return f
 
@@ -362,6 +759,155 @@ class Klein(object):
 
         return deco
 
+    def static(
+        self,
+        url,
+        directory,
+        endpoint="static",
+        maxAge=None,
+        immutable=None,
+        precompressed=True,
+        maxCachedSize=64 * 1024,
+        cacheSize=8 * 1024 * 1024,
+        statInterval=1.0,
+        manifest=None,
+    ):
+        """
+        Serve the files in C{directory}, and its subdirectories, under
+        C{url}::
+
+            app.static("/assets", "./assets")
+
+        Each file is served as a L{klein.FileResponse}, so ranges of it may
+        be asked for, and it has an C{ETag} and C{Last-Modified} header.
+        Files are C{stat}ed at most once every C{statInterval} seconds, to
+        notice that they've changed, and files of up to C{maxCachedSize}
+        bytes are kept in memory, up to C{cacheSize} bytes in all.
+
+        @param url: The URL the directory is served under.
+        @type url: str
+
+        @param directory: The directory, as a path or a
+            L{twisted.python.filepath.FilePath}.
+
+        @param endpoint: The name of the route's endpoint, which must be
+            unique, so that each directory served needs its own.  Default
+            C{"static"}.
+        @type endpoint: str
+
+        @param maxAge: How many seconds clients may cache files for, in a
+            C{Cache-Control} header.  Default L{None}, to leave them to
+            revalidate them.
+        @type maxAge: int
+
+        @param immutable: A function called with the name of a file, which
+            returns whether its name is a fingerprint of its contents, so
+            that it never changes; or C{True} to guess so from names such as
+            C{app.0123abcd.js}, which files merely stamped with a date or
+            number, such as C{report-20201017.pdf}, may also have.  Such
+            files get a C{Cache-Control} header letting clients keep them
+            for a year without revalidating them.  Default L{None}, for only
+            the fingerprinted names in C{manifest}.
+        @type immutable: callable or bool
+
+        @param precompressed: Whether to serve a file's C{.gz} sibling, if
+            it has one as new as it is, to clients which accept C{gzip}.
+            Default C{True}.
+        @type precompressed: bool
+
+        @param manifest: An L{AssetManifest} of fingerprinted names for the
+            files, such as one loaded with L{AssetManifest.load}, or C{True}
+            to make one now by hashing every file with
+            L{AssetManifest.fromDirectory}.  Files are also served under
+            their fingerprinted names, as immutable, and L{Klein.urlFor}
+            links to them by those names.  Default L{None}.
+        @type manifest: L{AssetManifest} or bool
+
+        @returns: The L{klein._static.StaticFiles} served.
+
+        @raise ValueError: If the app already has an endpoint named
+            C{endpoint}.
+        """
+        if endpoint in self._endpoints:
+            raise ValueError(
+                "The app already has an endpoint named {!r}; pass another"
+                " endpoint= to serve {!r} under {!r}".format(
+                    endpoint, directory, url
+                )
+            )
+        if manifest is True:
+            manifest = AssetManifest.fromDirectory(directory)
+        elif manifest is False:
+            manifest = None
+        if immutable is True:
+            immutable = isFingerprinted
+        elif immutable is False:
+            immutable = None
+        files = StaticFiles(
+            directory,
+            maxAge=maxAge,
+            immutable=immutable,
+            precompressed=precompressed,
+            maxCachedSize=maxCachedSize,
+            cacheSize=cacheSize,
+            statInterval=statInterval,
+            manifest=manifest,
+        )
+
+        @bindable
+        def serve(instance, request):
+            return files.respond(
+                request, IKleinRequest(request).branch_segments
+            )
+
+        self.route(
+            url, branch=True, endpoint=endpoint, methods=["GET", "HEAD"]
+        )(serve)
+        self._staticFiles[endpoint] = files
+        return files
+
+    def handleResults(self, *types):
+        """
+        Register a handler for the results of routes (and error handlers)
+        which are instances of any of C{types}, to turn them into something
+        Klein knows how to render::
+
+            @app.handleResults(dict)
+            def asJSON(request, result):
+                request.setHeader(b"Content-Type", b"application/json")
+                return json.dumps(result)
+
+        The handler is passed the request and the result, and may return
+        anything a route may, other than another instance of one of
+        C{types}: a byte string, text, a L{Deferred}, a L{klein.Response}
+        and so on.
+
+        The handler for the nearest class in a result's MRO applies to it.
+        Handlers registered for byte strings, text, L{Deferred}s or
+        L{klein.Response}s replace Klein's own handling of them, and
+        handlers registered for a class take precedence over the interfaces
+        (such as L{IResource}) it provides.  A handler registered for
+        C{object} applies to any result Klein doesn't otherwise know how to
+        render.  Registering a second handler for a type replaces the first.
+
+        @param types: The types of result to handle.
+        @type types: L{type}
+
+        @returns: A decorator registering the handler.
+        """
+        if not types:
+            raise TypeError("handleResults needs at least one type")
+
+        def deco(f):
+            @modified("result handling wrapper", f)
+            def _f(instance, request, result):
+                return _call(instance, f, request, result)
+
+            self._resultDispatcher.register(types, _f)
+            return _f
+
+        return deco
+
     def urlFor(
         self,
         request,
@@ -371,15 +917,37 @@ class Klein(object):
         force_external=False,
         append_unknown=True,
     ):
-        host = request.getHeader(b"host")
+        """
+        Build the URL of an endpoint, for the host and scheme of
+        C{request}.
+
+        For an endpoint added with L{Klein.static}, a C{path} value names a
+        file in its directory, and the URL is of the file's fingerprinted
+        name, if its manifest has one::
+
+            app.urlFor(request, "static", {"path": "app.js"})
+            # -> "/assets/app.0123abcd.js"
+
+        @raise werkzeug.routing.BuildError: If the URL can't be built.
+        """
+        files = self._staticFiles.get(endpoint)
+        if files is not None and values and "path" in values:
+            values = dict(values)
+            path = values.pop("path")
+            if files.manifest is not None:
+                path = files.manifest.fingerprinted(path)
+            values["__rest__"] = path
+            endpoint += "_branch"
+        url = requestURL(request)
+        host = url.netloc
         if host is None:
             if force_external:
                 raise ValueError(
                     "Cannot build external URL if request"
                     " doesn't contain Host header"
                 )
-            host = b""
-        return self.url_map.bind(host).build(
+            host = u""
+        return self.url_map.bind(host, url_scheme=url.scheme).build(
             endpoint, values, method, force_external, append_unknown
         )
 
@@ -0,0 +1,526 @@
+# -*- test-case-name: klein.test.test_cache -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+In-memory caching of rendered responses, and coalescing of identical
+concurrent requests.
+"""
+
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Text,
+    Tuple,
+    Union,
+)
+
+import attr
+
+from twisted.internet.defer import Deferred
+from twisted.internet.interfaces import IReactorTime
+from twisted.python.compat import intToBytes, unicode
+from twisted.python.failure import Failure
+from twisted.web.http import stringToDatetime
+from twisted.web.iweb import IRenderable, IRequest
+from twisted.web.resource import IResource
+
+from ._conditional import _interceptWriting, notModified, respondNotModified
+from ._dihttp import Response
+from ._response import FrozenHTTPResponse
+
+
+__all__ = ()
+
+
+def _headerNames(names):
+    # type: (Iterable[Union[Text, bytes]]) -> Tuple[bytes, ...]
+    """
+    Normalize a sequence of header names to lower-case L{bytes}.
+    """
+    return tuple(
+        (name.encode("ascii") if not isinstance(name, bytes) else name).lower()
+        for name in names
+    )
+
+
+@attr.s(frozen=True)
+class CachePolicy(object):
+    """
+    How the responses of a route may be cached, given to L{Klein.route} as
+    its C{cache} argument::
+
+        @app.route("/", cache=CachePolicy(ttl=30, vary=["Accept-Language"]))
+        def home(request):
+            ...
+
+    Successful (200) responses to C{GET} requests are stored in memory and
+    served to later C{GET} and C{HEAD} requests for the same host, path and
+    query, without calling the route.  Responses which set a cookie or are
+    marked C{private} or C{no-store} aren't stored, and requests carrying an
+    C{Authorization} header bypass the cache entirely.
+
+    @ivar ttl: How long, in seconds, a response stays fresh.
+    @ivar vary: The names of the request headers a response depends on.
+        Requests which differ in any of them are cached separately.  Pages
+        which depend on who the user is should include C{Cookie} here.
+    @ivar staleWhileRevalidate: For how many seconds after it expires a
+        response may still be served while it's being refreshed.  The first
+        request for a stale response is routed as usual and its response
+        replaces the stale one; until then, every other request is given the
+        stale response.
+    @ivar maxEntries: The number of responses to keep for the route, beyond
+        which the least recently used ones are dropped.
+    """
+
+    ttl = attr.ib()  # type: float
+    vary = attr.ib(
+        default=(), converter=_headerNames
+    )  # type: Tuple[bytes, ...]
+    staleWhileRevalidate = attr.ib(default=0)  # type: float
+    maxEntries = attr.ib(default=256)  # type: int
+
+
+# Headers which are set afresh for every response, or which mustn't be
+# replayed to another client.
+_UNCACHED_HEADERS = frozenset(
+    [b"date", b"server", b"connection", b"transfer-encoding", b"set-cookie"]
+)
+
+
+def _requestKey(request, host, vary):
+    # type: (IRequest, Text, Sequence[bytes]) -> Tuple[Any, ...]
+    """
+    Describe everything about C{request} that its response may depend on.
+    """
+    headers = request.requestHeaders
+    return (host, request.uri) + tuple(
+        tuple(headers.getRawHeaders(name, ())) for name in vary
+    )
+
+
+def _copyResponseHeaders(source, destination):
+    # type: (Union[IRequest, _ResponseHeaders], IRequest) -> None
+    """
+    Copy the response code and the replayable headers of one request, or
+    L{_ResponseHeaders}, to another request.
+    """
+    destination.setResponseCode(source.code)
+    setRawHeaders = destination.responseHeaders.setRawHeaders
+    for name, values in source.responseHeaders.getAllRawHeaders():
+        if name.lower() not in _UNCACHED_HEADERS:
+            setRawHeaders(name, values)
+
+
+class _ResponseHeaders(object):
+    """
+    A snapshot of the response code and headers of a request.
+    """
+
+    __slots__ = ("code", "responseHeaders")
+
+    def __init__(self, request):
+        # type: (IRequest) -> None
+        self.code = request.code
+        self.responseHeaders = request.responseHeaders.copy()
+
+
+class _Entry(object):
+    """
+    A cached response.
+    """
+
+    __slots__ = (
+        "code",
+        "headers",
+        "body",
+        "expires",
+        "staleUntil",
+        "refreshing",
+        "etag",
+        "lastModified",
+    )
+
+    def __init__(
+        self,
+        code,  # type: int
+        headers,  # type: List[Tuple[bytes, List[bytes]]]
+        body,  # type: bytes
+        expires,  # type: float
+        staleUntil,  # type: float
+    ):
+        # type: (...) -> None
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.staleUntil = staleUntil
+        self.refreshing = False
+        self.etag = None  # type: Optional[bytes]
+        self.lastModified = None  # type: Optional[int]
+        for name, values in headers:
+            name = name.lower()
+            if name == b"etag":
+                self.etag = values[0]
+            elif name == b"last-modified":
+                try:
+                    self.lastModified = stringToDatetime(values[0])
+                except ValueError:
+                    pass
+
+
+@attr.s(hash=False)
+class ResponseCache(object):
+    """
+    The cached responses of a single route.
+
+    @ivar policy: The L{CachePolicy} of the route.
+    @ivar clock: The L{IReactorTime} used to expire responses.
+    @ivar hits: The number of requests served a fresh response.
+    @ivar staleHits: The number of requests served a stale response while it
+        was being refreshed.
+    @ivar misses: The number of cacheable requests which were routed.
+    """
+
+    policy = attr.ib()  # type: CachePolicy
+    clock = attr.ib(default=None, cmp=False, repr=False)  # type: IReactorTime
+    hits = attr.ib(init=False, default=0, cmp=False)  # type: int
+    staleHits = attr.ib(init=False, default=0, cmp=False)  # type: int
+    misses = attr.ib(init=False, default=0, cmp=False)  # type: int
+    _entries = attr.ib(
+        init=False, factory=OrderedDict, cmp=False, repr=False
+    )  # type: OrderedDict[Tuple[Any, ...], _Entry]
+
+    def __attrs_post_init__(self):
+        # type: () -> None
+        if self.clock is None:
+            from twisted.internet import reactor
+
+            self.clock = reactor
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._entries)
+
+    def clear(self):
+        # type: () -> None
+        """
+        Forget all cached responses.
+        """
+        self._entries.clear()
+
+    def _key(self, request, host, encoding):
+        # type: (IRequest, Text, Optional[bytes]) -> Tuple[Any, ...]
+        return _requestKey(request, host, self.policy.vary) + (encoding,)
+
+    def serve(self, request, host, encoding=None):
+        # type: (IRequest, Text, Optional[bytes]) -> bool
+        """
+        Serve C{request} from the cache if possible, or else arrange for its
+        response to be cached.
+
+        @param request: The request, which has been routed to this cache's
+            route but not yet handled.
+        @param host: The host the request was routed with.
+        @param encoding: The content coding the response will be compressed
+            with, if any.  Responses are cached separately, already
+            compressed, for each one.
+
+        @return: L{True} if C{request} has been served and finished, and
+            L{False} if the route should be called.
+        """
+        method = request.method
+        if method != b"GET" and method != b"HEAD":
+            return False
+        if request.requestHeaders.hasHeader(b"authorization"):
+            return False
+
+        key = self._key(request, host, encoding)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            now = self.clock.seconds()
+            if now < entry.staleUntil:
+                self._entries[key] = entry
+            if now < entry.expires:
+                self.hits += 1
+                self._write(request, entry)
+                return True
+            if now < entry.staleUntil:
+                if entry.refreshing or method != b"GET":
+                    self.staleHits += 1
+                    self._write(request, entry)
+                    return True
+                entry.refreshing = True
+
+        self.misses += 1
+        if method == b"GET":
+            self._record(request, key)
+        return False
+
+    def _write(self, request, entry):
+        # type: (IRequest, _Entry) -> None
+        request.setResponseCode(entry.code)
+        setRawHeaders = request.responseHeaders.setRawHeaders
+        for name, values in entry.headers:
+            setRawHeaders(name, values)
+        if (
+            entry.etag is not None or entry.lastModified is not None
+        ) and notModified(request, entry.etag, entry.lastModified):
+            respondNotModified(request)
+            return
+        request.write(entry.body)
+        request.finish()
+
+    def _record(self, request, key):
+        # type: (IRequest, Tuple[Any, ...]) -> None
+        """
+        Record what's written to C{request}, and cache it once the request is
+        finished, if it can be.
+        """
+        chunks = []  # type: List[bytes]
+
+        def recordingWrite(data):
+            # type: (bytes) -> None
+            chunks.append(data)
+            write(data)
+
+        def recordingFinish():
+            # type: () -> None
+            restore()
+            self._store(key, request, b"".join(chunks))
+            finish()
+
+        write, finish, restore = _interceptWriting(
+            request, recordingWrite, recordingFinish
+        )
+
+    def _store(self, key, request, body):
+        # type: (Tuple[Any, ...], IRequest, bytes) -> None
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refreshing = False
+
+        if request.code != 200:
+            return
+        responseHeaders = request.responseHeaders
+        if getattr(request, "cookies", None) or responseHeaders.hasHeader(
+            b"set-cookie"
+        ):
+            return
+        for value in responseHeaders.getRawHeaders(b"cache-control", ()):
+            value = value.lower()
+            if b"no-store" in value or b"private" in value:
+                return
+
+        headers = [
+            (name, values)
+            for name, values in responseHeaders.getAllRawHeaders()
+            if name.lower() not in _UNCACHED_HEADERS
+        ]
+        if not responseHeaders.hasHeader(b"content-length"):
+            headers.append((b"Content-Length", [intToBytes(len(body))]))
+
+        policy = self.policy
+        expires = self.clock.seconds() + policy.ttl
+        self._entries.pop(key, None)
+        self._entries[key] = _Entry(
+            request.code,
+            headers,
+            body,
+            expires,
+            expires + policy.staleWhileRevalidate,
+        )
+        while len(self._entries) > policy.maxEntries:
+            self._entries.popitem(last=False)
+
+
+def _replayable(result):
+    # type: (Any) -> bool
+    """
+    Can C{result} be rendered for more than one request?
+
+    Strings, buffers, L{None}, resources, renderables, L{FrozenHTTPResponse}s
+    made with L{bytes} and L{Response}s with such a body can.  Iterators,
+    founts and L{FileResponse}s are used up by rendering them once, and
+    anything else might be.
+    """
+    if result is None or isinstance(
+        result, (bytes, unicode, bytearray, memoryview)
+    ):
+        return True
+    if isinstance(result, Response):
+        return _replayable(result.body)
+    if isinstance(result, FrozenHTTPResponse):
+        return result._bytesBody() is not None
+    return IResource.providedBy(result) or IRenderable.providedBy(result)
+
+
+_AGAIN = object()
+
+
+def _callAgain(result, call):
+    # type: (Any, Callable[[], Any]) -> Any
+    """
+    Call the route again for a request which waited on a result it can't
+    share.
+    """
+    if result is _AGAIN:
+        return call()
+    return result
+
+
+class _Flight(object):
+    """
+    A call to a route whose result is being waited on by one or more
+    requests.
+
+    @ivar leader: The request the route was called with.
+    @ivar waiters: The requests waiting for the result, with the
+        L{Deferred}s they're waiting on.
+    """
+
+    __slots__ = ("singleFlight", "key", "work", "leader", "waiters")
+
+    def __init__(self, singleFlight, key, work, leader):
+        # type: (SingleFlight, Tuple[Any, ...], Deferred, IRequest) -> None
+        self.singleFlight = singleFlight
+        self.key = key
+        self.work = work
+        self.leader = leader
+        self.waiters = []  # type: List[Tuple[IRequest, Deferred]]
+        work.addBoth(self._finished)
+
+    def wait(self, request, call):
+        # type: (IRequest, Callable[[], Any]) -> Deferred
+        """
+        Wait for the result on behalf of C{request}.
+
+        @param call: Call the route for C{request} alone, should the result
+            be one which can't be rendered for more than one request.
+
+        @return: A L{Deferred} which fires with the result.  Cancelling it
+            stops this request from waiting without affecting the others;
+            the call itself is only cancelled once nothing is waiting for it.
+        """
+        waiter = Deferred(self._cancel)
+        self.waiters.append((request, waiter))
+        return waiter.addCallback(_callAgain, call)
+
+    def _forget(self):
+        # type: () -> None
+        flights = self.singleFlight._flights
+        if flights.get(self.key) is self:
+            del flights[self.key]
+
+    def _cancel(self, waiter):
+        # type: (Deferred) -> None
+        self.waiters = [
+            (request, other)
+            for (request, other) in self.waiters
+            if other is not waiter
+        ]
+        if not self.waiters:
+            self._forget()
+            self.work.cancel()
+
+    def _finished(self, result):
+        # type: (Any) -> None
+        self._forget()
+        waiters, self.waiters = self.waiters, []
+        # Copy the leader's response code and headers before its response
+        # is written, which may change them (by compressing it, say).
+        leader = _ResponseHeaders(self.leader)
+        if isinstance(result, Failure) or _replayable(result):
+            for request, waiter in waiters:
+                if request is not self.leader:
+                    _copyResponseHeaders(leader, request)
+                if isinstance(result, Failure):
+                    waiter.errback(result)
+                else:
+                    waiter.callback(result)
+            return
+        # The result can only be rendered once: give it to the first request
+        # still waiting, which is the leader unless its connection was lost,
+        # and call the route again for each of the others.
+        for position, (request, waiter) in enumerate(waiters):
+            if position:
+                waiter.callback(_AGAIN)
+                continue
+            if request is not self.leader:
+                _copyResponseHeaders(leader, request)
+            waiter.callback(result)
+
+
+@attr.s(hash=False)
+class SingleFlight(object):
+    """
+    Coalesce identical concurrent C{GET} requests to a route onto a single
+    call.
+
+    While a call for one request is waiting on a L{Deferred}, requests for
+    the same host and URI (and, if the route has a L{CachePolicy}, the same
+    values of the headers it varies on) wait for that call's result instead
+    of calling the route again.  Its result is handed to each of them, along
+    with the response code and headers the route set on the first request.
+    Only results which can be rendered more than once, such as strings,
+    L{Response}s with such a body, resources and renderables, are shared;
+    for any other, such as a generator or a L{FileResponse}, each of the
+    waiting requests calls the route again once the first call is done.
+
+    @ivar vary: The names of the request headers the route's responses
+        depend on, as lower-case L{bytes}.
+    @ivar calls: The number of calls to the route, including those made
+        again for results which couldn't be shared.
+    @ivar joined: The number of requests which waited on another request's
+        call instead.
+    """
+
+    vary = attr.ib(default=())  # type: Sequence[bytes]
+    calls = attr.ib(init=False, default=0, cmp=False)  # type: int
+    joined = attr.ib(init=False, default=0, cmp=False)  # type: int
+    _flights = attr.ib(
+        init=False, factory=dict, cmp=False, repr=False
+    )  # type: Dict[Tuple[Any, ...], _Flight]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._flights)
+
+    def call(self, request, host, f, *args, **kwargs):
+        # type: (IRequest, Text, Callable[..., Any], *Any, **Any) -> Any
+        """
+        Call C{f} for C{request}, unless an identical request's call is
+        already in flight.
+
+        @param request: The request being handled.
+        @param host: The host the request was routed with.
+        @param f: The route, called with C{args} and C{kwargs}.
+
+        @return: The result of C{f}, or a L{Deferred} which fires with it.
+        """
+        method = request.method
+        if method != b"GET" or request.requestHeaders.hasHeader(
+            b"authorization"
+        ):
+            return f(*args, **kwargs)
+
+        def call():
+            # type: () -> Any
+            self.calls += 1
+            return f(*args, **kwargs)
+
+        key = _requestKey(request, host, self.vary)
+        flight = self._flights.get(key)
+        if flight is None:
+            result = call()
+            if not isinstance(result, Deferred) or result.called:
+                return result
+            flight = self._flights[key] = _Flight(self, key, result, request)
+        else:
+            self.joined += 1
+        return flight.wait(request, call)
@@ -0,0 +1,287 @@
+# -*- test-case-name: klein.test.test_compression -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Response compression negotiated from C{Accept-Encoding}.
+"""
+
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple, Union
+
+import attr
+
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import IRequest
+
+from ._conditional import _interceptWriting
+
+
+__all__ = ()
+
+
+_WBITS = {
+    b"gzip": 16 + zlib.MAX_WBITS,
+    b"deflate": zlib.MAX_WBITS,
+}
+
+# Media types whose content is already compressed, as prefixes.
+_COMPRESSED_TYPES = (
+    b"image/",
+    b"audio/",
+    b"video/",
+    b"font/woff",
+    b"application/gzip",
+    b"application/x-gzip",
+    b"application/zip",
+    b"application/x-bzip2",
+    b"application/x-xz",
+    b"application/x-7z-compressed",
+    b"application/pdf",
+)
+
+# Exceptions to the above which compress well.
+_UNCOMPRESSED_TYPES = (b"image/svg+xml", b"image/x-icon", b"image/bmp")
+
+
+def _encodings(encodings):
+    # type: (Iterable[Union[Text, bytes]]) -> Tuple[bytes, ...]
+    """
+    Normalize a sequence of content codings to lower-case L{bytes}, checking
+    that they're supported.
+    """
+    normalized = tuple(
+        (
+            encoding.encode("ascii")
+            if not isinstance(encoding, bytes)
+            else encoding
+        ).lower()
+        for encoding in encodings
+    )
+    for encoding in normalized:
+        if encoding not in _WBITS:
+            raise ValueError("Unsupported content coding {!r}".format(encoding))
+    return normalized
+
+
+def _acceptedEncodings(values):
+    # type: (Iterable[bytes]) -> Dict[bytes, float]
+    """
+    Parse C{Accept-Encoding} headers.
+
+    @return: A L{dict} mapping lower-case content codings to their quality.
+    """
+    accepted = {}  # type: Dict[bytes, float]
+    for value in values:
+        for item in value.split(b","):
+            parameters = item.split(b";")
+            coding = parameters[0].strip().lower()
+            if not coding:
+                continue
+            quality = 1.0
+            for parameter in parameters[1:]:
+                name, _, q = parameter.partition(b"=")
+                if name.strip().lower() == b"q":
+                    try:
+                        quality = float(q)
+                    except ValueError:
+                        quality = 0.0
+            accepted[coding] = quality
+    return accepted
+
+
+def _addVary(headers, name):
+    # type: (Headers, bytes) -> None
+    """
+    Add C{name} to the C{Vary} header, unless it's already there.
+    """
+    values = headers.getRawHeaders(b"vary", [])
+    for value in values:
+        for existing in value.split(b","):
+            existing = existing.strip().lower()
+            if existing == name.lower() or existing == b"*":
+                return
+    headers.setRawHeaders(b"Vary", values + [name])
+
+
+def _weakETag(headers):
+    # type: (Headers) -> None
+    """
+    Weaken a strong C{ETag} header, since it identifies the uncompressed
+    representation.
+    """
+    etags = headers.getRawHeaders(b"etag")
+    if etags and not etags[0].startswith(b"W/"):
+        headers.setRawHeaders(b"ETag", [b"W/" + etags[0]])
+
+
+@attr.s(frozen=True)
+class Compression(object):
+    """
+    How the responses of an app or route are compressed, given to L{Klein}
+    or L{Klein.route} as their C{compress} argument::
+
+        app = Klein(compress=Compression(minimumSize=512))
+
+        @app.route("/report", compress=True)
+        def report(request):
+            ...
+
+    The body of a response is compressed with the first of C{encodings} the
+    request accepts as it's written, so streamed responses aren't held in
+    memory.  While a streaming producer, such as that of a streamed
+    iterable, is registered, what's been compressed is flushed after each
+    write, so that clients receive each piece of the response as it's
+    written; otherwise small writes are left to C{zlib} to buffer.
+    Responses with a C{Content-Length} smaller than C{minimumSize}, with an
+    already compressed media type such as images or archives, which already
+    have a C{Content-Encoding}, or which have no body, and responses to
+    C{HEAD} requests, are left alone.
+
+    @ivar minimumSize: The smallest C{Content-Length}, in bytes, worth
+        compressing.  Responses without one are always compressed.
+    @ivar level: The C{zlib} compression level, from 1 to 9.
+    @ivar encodings: The content codings to offer, C{gzip} or C{deflate},
+        in order of preference.
+    """
+
+    minimumSize = attr.ib(default=1024)  # type: int
+    level = attr.ib(default=6)  # type: int
+    encodings = attr.ib(
+        default=(b"gzip", b"deflate"), converter=_encodings
+    )  # type: Tuple[bytes, ...]
+
+    def negotiate(self, request):
+        # type: (IRequest) -> Optional[bytes]
+        """
+        Choose how to compress the response to C{request}, and note in its
+        C{Vary} header that the response depends on C{Accept-Encoding}.
+
+        @return: The content coding to use, as L{bytes}, or L{None} to leave
+            the response uncompressed.
+        """
+        _addVary(request.responseHeaders, b"Accept-Encoding")
+        values = request.requestHeaders.getRawHeaders(b"accept-encoding")
+        if not values:
+            return None
+        accepted = _acceptedEncodings(values)
+        best = None  # type: Optional[bytes]
+        bestQuality = 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get(b"*", 0.0))
+            if quality > bestQuality:
+                best, bestQuality = encoding, quality
+        return best
+
+    def compressible(self, code, headers):
+        # type: (int, Headers) -> bool
+        """
+        Is a response with the given code and headers worth compressing?
+        """
+        if code < 200 or code in (204, 206, 304):
+            return False
+        if headers.hasHeader(b"content-encoding"):
+            return False
+        lengths = headers.getRawHeaders(b"content-length")
+        if lengths:
+            try:
+                if int(lengths[0]) < self.minimumSize:
+                    return False
+            except ValueError:
+                pass
+        contentTypes = headers.getRawHeaders(b"content-type")
+        if contentTypes:
+            contentType = contentTypes[0].split(b";", 1)[0].strip().lower()
+            if contentType.startswith(_COMPRESSED_TYPES) and (
+                contentType not in _UNCOMPRESSED_TYPES
+            ):
+                return False
+        return True
+
+    def compressor(self, encoding):
+        # type: (bytes) -> Any
+        """
+        Make a C{zlib} compression object for a content coding.
+        """
+        return zlib.compressobj(self.level, zlib.DEFLATED, _WBITS[encoding])
+
+    def compress(self, body, encoding):
+        # type: (bytes, bytes) -> bytes
+        """
+        Compress a whole body with a content coding.
+        """
+        compressor = self.compressor(encoding)
+        return compressor.compress(body) + compressor.flush()
+
+
+def compressResponse(request, compression, encoding):
+    # type: (IRequest, Compression, bytes) -> None
+    """
+    Compress the response to C{request} as it's written, if it turns out to
+    be worth compressing.
+
+    The decision is made when the first chunk of the body is written, once
+    the handler has set the response code and headers.  Responses finished
+    without a body, and responses to C{HEAD} requests, which never have one,
+    keep their headers, including C{Content-Length}.
+
+    @param encoding: The content coding negotiated for C{request}.
+    """
+    if request.method == b"HEAD":
+        return
+
+    # The compression object, or None to pass the body through unchanged,
+    # once it's been decided.
+    state = []  # type: List[Any]
+
+    def start():
+        # type: () -> None
+        headers = request.responseHeaders
+        if not compression.compressible(request.code, headers):
+            state.append(None)
+            return
+        headers.removeHeader(b"content-length")
+        headers.setRawHeaders(b"Content-Encoding", [encoding])
+        _weakETag(headers)
+        state.append(compression.compressor(encoding))
+
+    def compressingWrite(data):
+        # type: (bytes) -> None
+        if not state:
+            if not data:
+                # Nothing to decide on yet: the headers are sent with the
+                # first chunk of the body, or when the request is finished.
+                return
+            start()
+        compressor = state[0]
+        if compressor is None:
+            write(data)
+            return
+        if not data:
+            return
+        compressed = compressor.compress(data)
+        if getattr(request, "producer", None) is not None and getattr(
+            request, "streamingProducer", False
+        ):
+            # A sync flush ends the compressed data on a byte boundary, so
+            # that everything written so far can be decompressed without
+            # waiting for zlib to fill a block, at the cost of a few bytes
+            # per write.  Only streamed pieces need to arrive as they're
+            # written.
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            write(compressed)
+
+    def compressingFinish():
+        # type: () -> None
+        restore()
+        if not state:
+            # Nothing was written, so there's nothing to compress.
+            state.append(None)
+        compressor = state[0]
+        if compressor is not None:
+            write(compressor.flush())
+        finish()
+
+    write, finish, restore = _interceptWriting(
+        request, compressingWrite, compressingFinish
+    )
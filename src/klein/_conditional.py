@@ -0,0 +1,234 @@
+# -*- test-case-name: klein.test.test_conditional -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Conditional requests: entity tags, modification times and C{304 Not
+Modified} responses.
+"""
+
+import math
+from hashlib import sha1
+from typing import Any, Callable, List, Optional, Text, Tuple, Union
+
+import attr
+
+from twisted.python.compat import intToBytes
+from twisted.web.http import datetimeToString, stringToDatetime
+from twisted.web.iweb import IRequest
+
+
+__all__ = ()
+
+
+_Write = Callable[[bytes], None]
+_Finish = Callable[[], None]
+
+
+def _quoteETag(version):
+    # type: (Union[Text, bytes]) -> bytes
+    """
+    Make a strong entity tag from an opaque version.
+    """
+    if isinstance(version, Text):
+        version = version.encode("utf-8")
+    return b'"' + version + b'"'
+
+
+def bodyETag(body):
+    # type: (bytes) -> bytes
+    """
+    Compute a strong entity tag for a response body.
+    """
+    return _quoteETag(sha1(body).hexdigest())
+
+
+def _opaqueTag(tag):
+    # type: (bytes) -> bytes
+    """
+    Strip the weakness indicator from an entity tag, for weak comparison.
+    """
+    if tag.startswith(b"W/"):
+        return tag[2:]
+    return tag
+
+
+def notModified(request, etag, lastModified):
+    # type: (IRequest, Optional[bytes], Optional[float]) -> bool
+    """
+    Should a C{GET} or C{HEAD} request be answered with C{304 Not Modified}?
+
+    If the request has an C{If-None-Match} header, it alone decides; its tags
+    are compared weakly with C{etag}.  Otherwise the request's
+    C{If-Modified-Since} header is compared with C{lastModified}.
+
+    @param etag: The entity tag of the current response, or L{None}.
+    @param lastModified: When the response last changed, in seconds since
+        the epoch, or L{None}.
+    """
+    if request.method not in (b"GET", b"HEAD"):
+        return False
+
+    headers = request.requestHeaders
+    ifNoneMatch = headers.getRawHeaders(b"if-none-match")
+    if ifNoneMatch is not None:
+        if etag is None:
+            return False
+        etag = _opaqueTag(etag)
+        for value in ifNoneMatch:
+            for tag in value.split(b","):
+                tag = tag.strip()
+                if tag == b"*" or _opaqueTag(tag) == etag:
+                    return True
+        return False
+
+    if lastModified is None:
+        return False
+    ifModifiedSince = headers.getRawHeaders(b"if-modified-since")
+    if not ifModifiedSince:
+        return False
+    try:
+        since = stringToDatetime(ifModifiedSince[0].split(b";", 1)[0])
+    except ValueError:
+        return False
+    return int(math.ceil(lastModified)) <= since
+
+
+def setValidators(request, etag, lastModified):
+    # type: (IRequest, Optional[bytes], Optional[float]) -> None
+    """
+    Set the C{ETag} and C{Last-Modified} headers of a response.
+    """
+    if etag is not None:
+        request.responseHeaders.setRawHeaders(b"ETag", [etag])
+    if lastModified is not None:
+        request.responseHeaders.setRawHeaders(
+            b"Last-Modified", [datetimeToString(int(math.ceil(lastModified)))],
+        )
+
+
+def respondNotModified(request):
+    # type: (IRequest) -> None
+    """
+    Finish a request with an empty C{304 Not Modified} response.
+    """
+    request.setResponseCode(304)
+    request.responseHeaders.removeHeader(b"content-length")
+    request.finish()
+
+
+@attr.s(frozen=True)
+class Validators(object):
+    """
+    How the responses of a route are validated, from the C{etag} and
+    C{lastModified} arguments to L{Klein.route}.
+
+    @ivar etag: L{True} to tag each response with a hash of its body, or a
+        function which is called with the same arguments as the route and
+        returns the current version of its response, as L{bytes} or
+        L{unicode}, or L{None} if it has none.
+    @ivar lastModified: L{None}, or a function which is called with the same
+        arguments as the route and returns when its response last changed,
+        in seconds since the epoch, or L{None}.
+    """
+
+    etag = attr.ib(default=None)  # type: Union[None, bool, Callable[..., Any]]
+    lastModified = attr.ib(default=None)  # type: Optional[Callable[..., Any]]
+
+    def respond(self, request, call):
+        # type: (IRequest, Callable[[Callable[..., Any]], Any]) -> bool
+        """
+        Answer a conditional request without calling the route, if possible,
+        or otherwise arrange for the route's response to carry validators.
+
+        @param request: The request, which has been routed but not handled.
+        @param call: Called with a validator function to call it with the
+            route's arguments.
+
+        @return: L{True} if the request has been answered with C{304 Not
+            Modified}, or L{False} if the route should be called.
+        """
+        if request.method not in (b"GET", b"HEAD"):
+            return False
+
+        hashBody = self.etag is True
+        etag = None  # type: Optional[bytes]
+        lastModified = None  # type: Optional[float]
+        if callable(self.etag):
+            version = call(self.etag)
+            if version is not None:
+                etag = _quoteETag(version)
+        if self.lastModified is not None:
+            lastModified = call(self.lastModified)
+
+        # An If-None-Match header can only be evaluated with the entity tag,
+        # which when it's a hash of the body means calling the route.
+        undecided = hashBody and request.requestHeaders.hasHeader(
+            b"if-none-match"
+        )
+        setValidators(request, etag, lastModified)
+        if not undecided and notModified(request, etag, lastModified):
+            respondNotModified(request)
+            return True
+
+        if hashBody:
+            _tagBody(request)
+        return False
+
+
+def _interceptWriting(request, write, finish):
+    # type: (IRequest, _Write, _Finish) -> Tuple[_Write, _Finish, _Finish]
+    """
+    Replace the C{write} and C{finish} methods of C{request}.
+
+    @return: A 3-L{tuple} of the replaced C{write} and C{finish} methods, and
+        a function which puts them back.
+    """
+    overridden = [name for name in ("write", "finish") if name in vars(request)]
+    originalWrite = request.write
+    originalFinish = request.finish
+
+    def restore():
+        # type: () -> None
+        for name, original in (
+            ("write", originalWrite),
+            ("finish", originalFinish),
+        ):
+            if name in overridden:
+                setattr(request, name, original)
+            else:
+                delattr(request, name)
+
+    request.write = write
+    request.finish = finish
+    return originalWrite, originalFinish, restore
+
+
+def _tagBody(request):
+    # type: (IRequest) -> None
+    """
+    Buffer the response to C{request}, so that it can be tagged with a hash
+    of its body, or replaced with a C{304 Not Modified} response, once it's
+    finished.
+    """
+    chunks = []  # type: List[bytes]
+
+    def bufferingFinish():
+        # type: () -> None
+        restore()
+        body = b"".join(chunks)
+        if request.code == 200 and not request.responseHeaders.hasHeader(
+            b"etag"
+        ):
+            etag = bodyETag(body)
+            setValidators(request, etag, None)
+            if notModified(request, etag, None):
+                respondNotModified(request)
+                return
+        if not request.responseHeaders.hasHeader(b"content-length"):
+            request.setHeader(b"Content-Length", intToBytes(len(body)))
+        write(body)
+        finish()
+
+    write, finish, restore = _interceptWriting(
+        request, chunks.append, bufferingFinish
+    )
@@ -2,7 +2,17 @@
 Dependency-Injected HTTP metadata.
 """
 
-from typing import Any, Dict, Mapping, Sequence, TYPE_CHECKING, Text, Union
+from typing import (
+    Any,
+    Dict,
+    Mapping,
+    Optional,
+    Sequence,
+    TYPE_CHECKING,
+    Text,
+    Tuple,
+    Union,
+)
 
 import attr
 
@@ -13,6 +23,7 @@ from six import text_type
 from zope.interface import implementer, provider
 from zope.interface.interfaces import IInterface
 
+from ._requesturl import requestURL
 from .interfaces import IDependencyInjector, IRequiredParameter
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -23,28 +34,7 @@ if TYPE_CHECKING:  # pragma: no cover
 
 def urlFromRequest(request):
     # type: (IRequest) -> DecodedURL
-    sentHeader = request.getHeader(b"host")
-    if sentHeader is not None:
-        sentHeader = sentHeader.decode("charmap")
-        if ":" in sentHeader:
-            host, port = sentHeader.split(":")
-            port = int(port)
-        else:
-            host = sentHeader
-            port = None
-    else:
-        host = request.client.host
-        port = request.client.port
-        if not isinstance(host, text_type):
-            host = host.decode("ascii")
-
-    url = DecodedURL.fromText(request.uri.decode("charmap"))
-    url = url.replace(
-        scheme=u"https" if request.isSecure() else u"http",
-        host=host,
-        port=port,
-    )
-    return url
+    return requestURL(request).url
 
 
 @provider(IRequiredParameter, IDependencyInjector)  # type: ignore[misc]
@@ -99,7 +89,49 @@ class RequestComponent(object):
         "Nothing to do upon finalization."
 
 
-@attr.s(frozen=True)
+HeaderPlan = Tuple[Tuple[bytes, Tuple[bytes, ...]], ...]
+
+
+def _headerPlan(headers):
+    # type: (Mapping[Any, Any]) -> HeaderPlan
+    """
+    Check and encode the headers of a L{Response} once, as
+    L{Headers.setRawHeaders} would each time they're applied.
+
+    @return: A L{tuple} of pairs of a header name and a L{tuple} of its
+        values, all L{bytes}.
+
+    @raise TypeError: If a name isn't text or bytes, or a value isn't text,
+        bytes, or a sequence of them.
+    """
+    plan = []
+    for name, valueOrValues in headers.items():
+        if isinstance(name, text_type):
+            rawName = name.encode("iso-8859-1")
+        elif isinstance(name, bytes):
+            rawName = name
+        else:
+            raise TypeError(
+                "header name {!r} must be text or bytes".format(name)
+            )
+        if isinstance(valueOrValues, (text_type, bytes)):
+            valueOrValues = [valueOrValues]
+        rawValues = []
+        for value in valueOrValues:
+            if isinstance(value, text_type):
+                value = value.encode("utf-8")
+            elif not isinstance(value, bytes):
+                raise TypeError(
+                    "value {!r} of header {!r} must be text or bytes".format(
+                        value, name
+                    )
+                )
+            rawValues.append(value)
+        plan.append((rawName, tuple(rawValues)))
+    return tuple(plan)
+
+
+@attr.s(frozen=True, slots=True)
 class Response(object):
     """
     Metadata about an HTTP response, with an object that Klein knows how to
@@ -112,7 +144,8 @@ class Response(object):
         - some HTTP headers
 
         - a body object, which can be anything else Klein understands; for
-          example, an IResource, an IRenderable, text, bytes, etc.
+          example, an IResource, an IRenderable, text, bytes, a buffer such
+          as a memoryview, etc.
 
     @since: Klein NEXT
     """
@@ -125,6 +158,40 @@ class Response(object):
         default=attr.Factory(dict),
     )
     body = attr.ib(type=Any, default=u"")
+    _plan = attr.ib(
+        type=Optional[HeaderPlan],
+        default=None,
+        init=False,
+        cmp=False,
+        repr=False,
+    )
+
+    @classmethod
+    def frozen(cls, code=200, headers=None, body=u""):
+        # type: (int, Optional[Mapping[Any, Any]], Any) -> Response
+        """
+        Make a L{Response} whose headers are checked and encoded now, rather
+        than each time it's applied to a request.
+
+        This is worth doing for a response with the same code and headers
+        returned over and over, made once and kept at module level.  To give
+        it a different body each time, use L{Response.withBody}.
+
+        @raise TypeError: If the headers aren't text or bytes.
+        """
+        response = cls(code=code, headers=dict(headers or {}), body=body)
+        object.__setattr__(response, "_plan", _headerPlan(response.headers))
+        return response
+
+    def withBody(self, body):
+        # type: (Any) -> Response
+        """
+        Make a copy of this L{Response} with another body, which shares its
+        encoded headers if it's L{frozen <Response.frozen>}.
+        """
+        response = attr.evolve(self, body=body)
+        object.__setattr__(response, "_plan", self._plan)
+        return response
 
     def _applyToRequest(self, request):
         # type: (IRequest) -> Any
@@ -140,6 +207,12 @@ class Response(object):
               actually creates a txrequest-style response object.
         """
         request.setResponseCode(self.code)
+        plan = self._plan
+        if plan is not None:
+            setRawHeaders = request.responseHeaders.setRawHeaders
+            for rawName, rawValues in plan:
+                setRawHeaders(rawName, list(rawValues))
+            return self.body
         for headerName, headerValueOrValues in self.headers.items():
             if not isinstance(headerValueOrValues, (text_type, bytes)):
                 headerValues = headerValueOrValues
@@ -0,0 +1,535 @@
+# -*- test-case-name: klein.test.test_file -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Serving files, and ranges of them, from routes.
+"""
+
+import errno
+import io
+import math
+import mimetypes
+import os
+import stat
+from binascii import hexlify
+from collections import OrderedDict
+from typing import (
+    Any,
+    IO,
+    Iterable,
+    List,
+    Mapping,
+    NoReturn,
+    Optional,
+    Sequence,
+    Text,
+    Tuple,
+    Union,
+    cast,
+)
+
+import attr
+
+from twisted.internet.interfaces import IReactorTime
+from twisted.python.compat import intToBytes, unicode
+from twisted.web.http import stringToDatetime
+from twisted.web.iweb import IRequest
+
+from werkzeug.exceptions import NotFound
+
+from ._conditional import _quoteETag, notModified, setValidators
+from ._dihttp import _headerPlan
+
+
+__all__ = ()
+
+
+# Range headers asking for more ranges than this, once overlapping ones have
+# been merged, are ignored rather than answered with that many parts.
+_MAX_RANGES = 32
+
+_NOT_FOUND_ERRORS = frozenset([errno.ENOENT, errno.ENOTDIR, errno.EISDIR])
+
+_DEFAULT_CONTENT_TYPE = b"application/octet-stream"
+
+_Path = Union[Text, bytes]
+
+# The parts of a body made from a file: the offsets and lengths of ranges
+# of the file, and the bytes between them.
+_Span = Union[bytes, Tuple[int, int]]
+
+_Body = Union[bytes, Iterable[bytes]]
+
+
+@attr.s(frozen=True, slots=True)
+class FileInfo(object):
+    """
+    What's known about a file from when it was last C{stat}ed.
+
+    @ivar size: Its size, in bytes.
+    @ivar lastModified: When it was last modified, in seconds since the
+        epoch.
+    @ivar etag: A strong entity tag made from its size and modification
+        time.
+    """
+
+    size = attr.ib()  # type: int
+    lastModified = attr.ib()  # type: float
+    etag = attr.ib()  # type: bytes
+
+    @classmethod
+    def fromStat(cls, result):
+        # type: (os.stat_result) -> FileInfo
+        """
+        Make a L{FileInfo} from the result of L{os.stat} or L{os.fstat}.
+
+        @raise OSError: With C{errno.EISDIR} if the file isn't a regular
+            file.
+        """
+        if not stat.S_ISREG(result.st_mode):
+            raise OSError(errno.EISDIR, "Not a regular file")
+        version = u"{:x}-{:x}".format(
+            result.st_size, int(result.st_mtime * 1000000)
+        )
+        return cls(
+            size=result.st_size,
+            lastModified=result.st_mtime,
+            etag=_quoteETag(version),
+        )
+
+
+@attr.s
+class FileInfoCache(object):
+    """
+    A bounded cache of the sizes, modification times and entity tags of
+    files, by path, so that serving a file needn't mean C{stat}ing it for
+    every request.  That a file couldn't be C{stat}ed, because it doesn't
+    exist for instance, is remembered too.
+
+    What's known about a file is trusted for C{maxAge} seconds, so a file
+    that's changed may be served with the size and validators it had before
+    for up to that long, and a new file isn't found until then.
+
+    @ivar maxAge: How long, in seconds, what's known about a file is used
+        before it's C{stat}ed again.
+    @ivar maxEntries: The number of files to remember.
+    @ivar clock: The L{IReactorTime} used to expire what's known.
+    """
+
+    maxAge = attr.ib(default=1.0)  # type: float
+    maxEntries = attr.ib(default=1024)  # type: int
+    clock = attr.ib(default=None, cmp=False, repr=False)  # type: IReactorTime
+    _entries = attr.ib(
+        init=False, factory=OrderedDict, cmp=False, repr=False
+    )  # type: OrderedDict[_Path, Tuple[float, Union[FileInfo, int]]]
+
+    def __attrs_post_init__(self):
+        # type: () -> None
+        if self.clock is None:
+            from twisted.internet import reactor
+
+            self.clock = reactor
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._entries)
+
+    def clear(self):
+        # type: () -> None
+        """
+        Forget everything known about every file.
+        """
+        self._entries.clear()
+
+    def info(self, path):
+        # type: (_Path) -> FileInfo
+        """
+        Get what's known about the file at C{path}, C{stat}ing it if it
+        hasn't been recently.
+
+        @raise OSError: If the file can't be C{stat}ed, or isn't a regular
+            file.
+        """
+        now = self.clock.seconds()
+        entry = self._entries.get(path)
+        if entry is None or now - entry[0] >= self.maxAge:
+            # Entries are 2-tuples of when the file was stat()ed, and either
+            # its FileInfo or the errno of the failure.
+            try:
+                entry = (now, FileInfo.fromStat(os.stat(path)))
+            except EnvironmentError as e:
+                entry = (now, e.errno)
+            self._entries.pop(path, None)
+            self._entries[path] = entry
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+        checked, result = entry
+        if not isinstance(result, FileInfo):
+            raise OSError(result, os.strerror(result), path)
+        return result
+
+
+_fileInfoCache = FileInfoCache()
+
+
+def parseRanges(values, size):
+    # type: (Sequence[bytes], int) -> Optional[List[Tuple[int, int]]]
+    """
+    Parse the C{Range} header of a request for part of a file.
+
+    @param values: The raw values of the header.
+
+    @param size: The size of the file, in bytes.
+
+    @return: L{None} if the header should be ignored, because it's
+        malformed, isn't for bytes or asks for too many ranges.  Otherwise,
+        a sorted L{list} of the satisfiable ranges it asks for, as
+        2-L{tuple}s of the offset of their first byte and of the byte after
+        their last, with overlapping and adjacent ranges merged.  The
+        L{list} is empty if none of them are satisfiable.
+    """
+    if len(values) != 1:
+        return None
+    unit, equals, specs = values[0].partition(b"=")
+    if not equals or unit.strip().lower() != b"bytes":
+        return None
+
+    ranges = []  # type: List[Tuple[int, int]]
+    seen = False
+    for spec in specs.split(b","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        seen = True
+        first, dash, last = (part.strip() for part in spec.partition(b"-"))
+        if not dash or not (first or last):
+            return None
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # The last so many bytes.
+            length = int(last)
+            if length and size:
+                ranges.append((max(size - length, 0), size))
+            continue
+        start = int(first)
+        end = size
+        if last:
+            end = int(last) + 1
+            if end <= start:
+                return None
+        if start < size:
+            ranges.append((start, min(end, size)))
+    if not seen:
+        return None
+
+    merged = []  # type: List[Tuple[int, int]]
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    if len(merged) > _MAX_RANGES:
+        return None
+    return merged
+
+
+def _ifRangeMatches(request, info):
+    # type: (IRequest, FileInfo) -> bool
+    """
+    Should a request's C{Range} header be honoured, given its C{If-Range}
+    header?
+
+    It should if there's no C{If-Range} header, or if the header is the
+    file's entity tag or exactly its modification date.
+    """
+    values = request.requestHeaders.getRawHeaders(b"if-range")
+    if not values:
+        return True
+    value = values[0].strip()
+    if value.startswith((b'"', b"W/")):
+        # Weak tags never match, since they aren't equal to a strong one.
+        return value == info.etag
+    try:
+        return stringToDatetime(value) == int(math.ceil(info.lastModified))
+    except ValueError:
+        return False
+
+
+def _guessContentType(name):
+    # type: (Optional[_Path]) -> bytes
+    """
+    Guess the media type of a file from its name.
+    """
+    if name is None:
+        return _DEFAULT_CONTENT_TYPE
+    if isinstance(name, bytes) and bytes is not str:
+        name = name.decode("iso-8859-1")
+    contentType, encoding = mimetypes.guess_type(cast(str, name))
+    # A compressed file, such as a .tar.gz, is served as it is, rather than
+    # as its contents with a Content-Encoding.
+    if contentType is None or encoding is not None:
+        return _DEFAULT_CONTENT_TYPE
+    return contentType.encode("ascii")
+
+
+def _contentRange(start, end, size):
+    # type: (int, int, int) -> bytes
+    return b"bytes %s-%s/%s" % (
+        intToBytes(start),
+        intToBytes(end - 1),
+        intToBytes(size),
+    )
+
+
+def _multipartSpans(ranges, size, contentType, boundary):
+    # type: (Iterable[Tuple[int, int]], int, bytes, bytes) -> List[_Span]
+    """
+    Lay out a C{multipart/byteranges} body.
+
+    @return: A L{list} of the headers and delimiters of its parts, as
+        L{bytes}, and the ranges of the file between them, as 2-L{tuple}s of
+        their offset and length.
+    """
+    spans = []  # type: List[_Span]
+    for start, end in ranges:
+        spans.append(
+            (b"\r\n" if spans else b"")
+            + b"--"
+            + boundary
+            + b"\r\nContent-Type: "
+            + contentType
+            + b"\r\nContent-Range: "
+            + _contentRange(start, end, size)
+            + b"\r\n\r\n"
+        )
+        spans.append((start, end - start))
+    spans.append(b"\r\n--" + boundary + b"--\r\n")
+    return spans
+
+
+class _FileSpans(object):
+    """
+    An iterator over spans of a file, read C{chunkSize} bytes at a time, and
+    the L{bytes} between them, which closes the file once they've all been
+    read or when it's closed itself.
+    """
+
+    def __init__(self, file, spans, chunkSize):
+        # type: (IO[bytes], Iterable[_Span], int) -> None
+        self._file = file
+        self._spans = iter(spans)
+        self._chunkSize = chunkSize
+        self._remaining = 0
+
+    def __iter__(self):
+        # type: () -> _FileSpans
+        return self
+
+    def __next__(self):
+        # type: () -> bytes
+        while not self._remaining:
+            span = next(self._spans, None)
+            if span is None:
+                self.close()
+                raise StopIteration()
+            if isinstance(span, bytes):
+                return span
+            offset, self._remaining = span
+            self._file.seek(offset)
+        chunk = self._file.read(min(self._chunkSize, self._remaining))
+        if not chunk:
+            self.close()
+            raise IOError("File ended {} bytes early".format(self._remaining))
+        self._remaining -= len(chunk)
+        return chunk
+
+    next = __next__
+
+    def close(self):
+        # type: () -> None
+        self._file.close()
+
+
+def _notFound(error):
+    # type: (EnvironmentError) -> NoReturn
+    """
+    Raise L{NotFound} in place of an error from opening or C{stat}ing a
+    file which doesn't exist or isn't a regular file, and otherwise re-raise
+    it.
+    """
+    if error.errno in _NOT_FOUND_ERRORS:
+        raise NotFound()
+    raise error
+
+
+@attr.s(frozen=True)
+class FileResponse(object):
+    """
+    A file, which a route may return to have it served.
+
+    The file is read in chunks, no faster than the client receives them.
+    Its size, modification time and entity tag are cached between requests,
+    so conditional requests are answered with C{304 Not Modified} without
+    opening it.  C{GET} and C{HEAD} requests with a C{Range} header (and a
+    matching C{If-Range} header, if any) are answered with C{206 Partial
+    Content}, as a C{multipart/byteranges} body if they ask for more than
+    one range, or C{416 Range Not Satisfiable} if none of their ranges are.
+
+    If the file doesn't exist, or isn't a regular file, the route fails with
+    L{werkzeug.exceptions.NotFound}.
+
+    @ivar file: The path of the file, as text, L{bytes} or a
+        L{twisted.python.filepath.FilePath}; or a binary file object open
+        for reading, or a file descriptor, which is closed once it's been
+        served, and whose size and modification time aren't cached.
+    @ivar contentType: The media type of the file, as L{bytes}, or L{None}
+        to guess it from the file's name, or serve a file descriptor as
+        C{application/octet-stream}.
+    @ivar headers: More headers for the response, such as a
+        C{Content-Disposition}, as for L{klein.Response.headers}.
+    @ivar chunkSize: How many bytes of the file to read at a time.
+    @ivar cache: The L{FileInfoCache} to use, or L{None} for one shared by
+        every L{FileResponse}.
+
+    @since: Klein NEXT
+    """
+
+    file = attr.ib()  # type: Any
+    contentType = attr.ib(default=None)  # type: Optional[bytes]
+    headers = attr.ib(factory=dict)  # type: Mapping[Any, Any]
+    chunkSize = attr.ib(default=64 * 1024)  # type: int
+    cache = attr.ib(
+        default=None, cmp=False, repr=False
+    )  # type: Optional[FileInfoCache]
+
+    def _info(self):
+        # type: () -> Tuple[FileInfo, Optional[_Path], Optional[IO[bytes]]]
+        """
+        Find out about the file.
+
+        @return: A 3-L{tuple} of its L{FileInfo}, its name (or L{None}) and
+            the file object to read it from, if it's already open.
+        """
+        opened = None  # type: Optional[IO[bytes]]
+        try:
+            if isinstance(self.file, int):
+                opened = io.open(self.file, "rb")
+            elif hasattr(self.file, "read"):
+                opened = self.file
+            if opened is not None:
+                # Open files aren't cached: a file descriptor's number is
+                # reused for other files once it's closed.
+                info = FileInfo.fromStat(os.fstat(opened.fileno()))
+                name = getattr(opened, "name", None)
+                if not isinstance(name, (bytes, unicode)):
+                    # Files opened from descriptors are named by them.
+                    name = None
+                return info, name, opened
+            cache = self.cache if self.cache is not None else _fileInfoCache
+            name = getattr(self.file, "path", self.file)
+            return cache.info(name), name, None
+        except EnvironmentError as e:
+            if opened is not None:
+                opened.close()
+            _notFound(e)
+
+    def _body(self, opened, spans):
+        # type: (IO[bytes], List[_Span]) -> _Body
+        """
+        Make the body of a response from spans of the file.
+
+        @param opened: The file object to read the spans from.
+        @param spans: The L{tuple}s of the offset and length of each span,
+            and the L{bytes} to write between them.
+        """
+        return _FileSpans(opened, spans, self.chunkSize)
+
+    def _applyToRequest(self, request):
+        # type: (IRequest) -> Optional[_Body]
+        """
+        Set the response code and headers of C{request} for the file, or
+        the parts of it that the request asks for.
+
+        @return: What to render as the body: L{None}, if there's nothing to
+            write, or an iterator of chunks of the file.
+
+        @raise NotFound: If the file doesn't exist or isn't a regular file.
+        """
+        info, name, opened = self._info()
+        headers = request.responseHeaders
+        if notModified(request, info.etag, info.lastModified):
+            if opened is not None:
+                opened.close()
+            setValidators(request, info.etag, info.lastModified)
+            request.setResponseCode(304)
+            return None
+
+        # Opened before any headers are set, so that if it fails, the
+        # response is an error's alone.
+        if opened is None and request.method != b"HEAD":
+            assert name is not None
+            try:
+                opened = open(name, "rb")
+            except EnvironmentError as e:
+                _notFound(e)
+
+        for rawName, rawValues in _headerPlan(self.headers):
+            headers.setRawHeaders(rawName, list(rawValues))
+        setValidators(request, info.etag, info.lastModified)
+        headers.setRawHeaders(b"Accept-Ranges", [b"bytes"])
+        contentType = self.contentType
+        if contentType is None:
+            contentType = _guessContentType(name)
+
+        ranges = None
+        rangeValues = request.requestHeaders.getRawHeaders(b"range")
+        if (
+            rangeValues
+            and request.method in (b"GET", b"HEAD")
+            and _ifRangeMatches(request, info)
+        ):
+            ranges = parseRanges(rangeValues, info.size)
+
+        if ranges is None:
+            code = 200
+            spans = [(0, info.size)]  # type: List[_Span]
+            headers.setRawHeaders(b"Content-Type", [contentType])
+        elif not ranges:
+            if opened is not None:
+                opened.close()
+            request.setResponseCode(416)
+            headers.setRawHeaders(
+                b"Content-Range", [b"bytes */" + intToBytes(info.size)]
+            )
+            headers.setRawHeaders(b"Content-Length", [b"0"])
+            return None
+        elif len(ranges) == 1:
+            [(start, end)] = ranges
+            code = 206
+            spans = [(start, end - start)]
+            headers.setRawHeaders(b"Content-Type", [contentType])
+            headers.setRawHeaders(
+                b"Content-Range", [_contentRange(start, end, info.size)]
+            )
+        else:
+            code = 206
+            boundary = hexlify(os.urandom(12))
+            spans = _multipartSpans(ranges, info.size, contentType, boundary)
+            headers.setRawHeaders(
+                b"Content-Type",
+                [b"multipart/byteranges; boundary=" + boundary],
+            )
+
+        request.setResponseCode(code)
+        length = sum(
+            len(span) if isinstance(span, bytes) else span[1] for span in spans
+        )
+        headers.setRawHeaders(b"Content-Length", [intToBytes(length)])
+        if opened is None:
+            return None
+        if request.method == b"HEAD":
+            opened.close()
+            return None
+        return self._body(opened, spans)
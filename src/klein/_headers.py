@@ -5,7 +5,16 @@
 HTTP headers API.
 """
 
-from typing import AnyStr, Iterable, Text, Tuple, Union
+from typing import (
+    AnyStr,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Text,
+    Tuple,
+    Union,
+)
 
 from attr import Factory, attrib, attrs
 
@@ -79,6 +88,81 @@ def normalizeHeaderName(name):
     return name.lower()
 
 
+# Normalized names of common headers, mapped from themselves and from their
+# usual spelling, so that looking them up doesn't need to lower-case them,
+# and the names of every message's headers share the same objects.
+_commonHeaderNames = {}  # type: Dict[bytes, bytes]
+_commonTextHeaderNames = {}  # type: Dict[Text, bytes]
+
+for _name in (
+    b"Accept",
+    b"Accept-Charset",
+    b"Accept-Encoding",
+    b"Accept-Language",
+    b"Accept-Ranges",
+    b"Age",
+    b"Authorization",
+    b"Cache-Control",
+    b"Connection",
+    b"Content-Disposition",
+    b"Content-Encoding",
+    b"Content-Language",
+    b"Content-Length",
+    b"Content-Range",
+    b"Content-Type",
+    b"Cookie",
+    b"Date",
+    b"ETag",
+    b"Expires",
+    b"Host",
+    b"If-Match",
+    b"If-Modified-Since",
+    b"If-None-Match",
+    b"If-Range",
+    b"Last-Modified",
+    b"Location",
+    b"Origin",
+    b"Pragma",
+    b"Range",
+    b"Referer",
+    b"Server",
+    b"Set-Cookie",
+    b"Transfer-Encoding",
+    b"User-Agent",
+    b"Vary",
+    b"X-Forwarded-For",
+    b"X-Forwarded-Proto",
+    b"X-Requested-With",
+):
+    _normalized = normalizeHeaderName(_name)
+    for _spelling in (_name, _normalized):
+        _commonHeaderNames[_spelling] = _normalized
+        _commonTextHeaderNames[headerNameAsText(_spelling)] = _normalized
+del _name, _normalized, _spelling
+
+
+def normalizeRawHeaderName(name):
+    # type: (String) -> bytes
+    """
+    Normalize a header name, as the raw bytes it's stored as.
+
+    @raise TypeError: If C{name} isn't text or bytes.
+    """
+    if isinstance(name, bytes):
+        rawName = _commonHeaderNames.get(name)
+        if rawName is None:
+            rawName = normalizeHeaderName(name)
+        return rawName
+
+    if isinstance(name, Text):
+        rawName = _commonTextHeaderNames.get(name)
+        if rawName is None:
+            rawName = normalizeHeaderName(headerNameAsBytes(name))
+        return rawName
+
+    raise TypeError("name {!r} must be text or bytes".format(name))
+
+
 # Internal data representation
 
 
@@ -90,10 +174,7 @@ def normalizeRawHeaders(headerPairs):
         except ValueError:
             raise ValueError("header pair must be a 2-item iterable")
 
-        name = normalizeHeaderName(headerNameAsBytes(name))
-        value = headerValueAsBytes(value)
-
-        yield (normalizeHeaderName(name), value)
+        yield (normalizeRawHeaderName(name), headerValueAsBytes(value))
 
 
 def normalizeRawHeadersFrozen(headerPairs):
@@ -110,16 +191,43 @@ def getFromRawHeaders(rawHeaders, name):
     # type: (RawHeaders, AnyStr) -> Iterable[AnyStr]
     """
     Get a value from raw headers.
+
+    This looks at every header; L{FrozenHTTPHeaders} and
+    L{MutableHTTPHeaders} use an index instead.
     """
+    rawName = normalizeRawHeaderName(name)
+
     if isinstance(name, bytes):
-        name = normalizeHeaderName(name)
-        return (v for n, v in rawHeaders if name == n)
+        return (v for n, v in rawHeaders if rawName == n)
 
-    if isinstance(name, Text):
-        rawName = headerNameAsBytes(normalizeHeaderName(name))
-        return (headerValueAsText(v) for n, v in rawHeaders if rawName == n)
+    return (headerValueAsText(v) for n, v in rawHeaders if rawName == n)
 
-    raise TypeError("name {!r} must be text or bytes".format(name))
+
+def indexRawHeaders(rawHeaders):
+    # type: (RawHeaders) -> Dict[bytes, List[bytes]]
+    """
+    Map the names of normalized raw headers to their values, in order.
+    """
+    index = {}  # type: Dict[bytes, List[bytes]]
+    for name, value in rawHeaders:
+        values = index.get(name)
+        if values is None:
+            index[name] = [value]
+        else:
+            values.append(value)
+    return index
+
+
+def valuesFromIndex(index, name):
+    # type: (Mapping[bytes, Iterable[bytes]], AnyStr) -> Iterable[AnyStr]
+    """
+    Get the values for a header name from an index of raw headers, as text if
+    the name is text.
+    """
+    values = index.get(normalizeRawHeaderName(name), ())
+    if isinstance(name, bytes):
+        return values
+    return [headerValueAsText(value) for value in values]
 
 
 def rawHeaderName(name):
@@ -158,7 +266,7 @@ def rawHeaderNameAndValue(name, value):
 
 
 @implementer(IHTTPHeaders)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class FrozenHTTPHeaders(object):
     """
     Immutable HTTP entity headers.
@@ -168,13 +276,23 @@ class FrozenHTTPHeaders(object):
         converter=normalizeRawHeadersFrozen, default=(),
     )  # type: RawHeaders
 
+    # Normalized header names mapped to their values, built the first time
+    # a header is looked up.
+    _index = attrib(
+        default=Factory(dict), init=False, cmp=False, repr=False
+    )  # type: Dict[bytes, Tuple[bytes, ...]]
+
     def getValues(self, name):
         # type: (AnyStr) -> Iterable[AnyStr]
-        return getFromRawHeaders(self.rawHeaders, name)
+        index = self._index
+        if not index and self.rawHeaders:
+            for rawName, values in indexRawHeaders(self.rawHeaders).items():
+                index[rawName] = tuple(values)
+        return valuesFromIndex(index, name)
 
 
 @implementer(IMutableHTTPHeaders)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class MutableHTTPHeaders(object):
     """
     Mutable HTTP entity headers.
@@ -184,6 +302,19 @@ class MutableHTTPHeaders(object):
         converter=normalizeRawHeadersMutable, default=Factory(list),
     )  # type: MutableRawHeaders
 
+    # Normalized header names mapped to their values, built the first time
+    # it's needed and then kept up to date as headers are added and removed.
+    _index = attrib(
+        default=Factory(dict), init=False, cmp=False, repr=False
+    )  # type: Dict[bytes, List[bytes]]
+
+    def _indexed(self):
+        # type: () -> Dict[bytes, List[bytes]]
+        index = self._index
+        if not index and self._rawHeaders:
+            index.update(indexRawHeaders(self._rawHeaders))
+        return index
+
     @property
     def rawHeaders(self):
         # type: () -> RawHeaders
@@ -191,14 +322,30 @@ class MutableHTTPHeaders(object):
 
     def getValues(self, name):
         # type: (AnyStr) -> Iterable[AnyStr]
-        return getFromRawHeaders(self._rawHeaders, name)
+        values = valuesFromIndex(self._indexed(), name)
+        if isinstance(name, bytes):
+            # Don't share the index's list with the caller.
+            return tuple(values)
+        return values
 
     def remove(self, name):
         # type: (String) -> None
-        rawName = rawHeaderName(name)
+        rawName = normalizeRawHeaderName(name)
+        index = self._indexed()
+        if index.pop(rawName, None) is None:
+            return
 
         self._rawHeaders[:] = [p for p in self._rawHeaders if p[0] != rawName]
 
     def addValue(self, name, value):
         # type: (AnyStr, AnyStr) -> None
-        self._rawHeaders.append(rawHeaderNameAndValue(name, value))
+        rawName, rawValue = rawHeaderNameAndValue(name, value)
+        rawName = normalizeRawHeaderName(rawName)
+        self._rawHeaders.append((rawName, rawValue))
+
+        if self._index:
+            values = self._index.get(rawName)
+            if values is None:
+                self._index[rawName] = [rawValue]
+            else:
+                values.append(rawValue)
@@ -5,9 +5,9 @@
 Support for interoperability with L{twisted.web.http_headers.Headers}.
 """
 
-from typing import AnyStr, Iterable, Text, Tuple
+from typing import AnyStr, Dict, Iterable, Optional, Text, Tuple
 
-from attr import attrib, attrs
+from attr import Factory, attrib, attrs
 from attr.validators import instance_of
 
 from twisted.web.http_headers import Headers
@@ -20,7 +20,7 @@ from ._headers import (
     String,
     headerNameAsBytes,
     headerValueAsText,
-    normalizeHeaderName,
+    normalizeRawHeaderName,
     rawHeaderName,
     rawHeaderNameAndValue,
 )
@@ -29,14 +29,55 @@ from ._headers import (
 __all__ = ()
 
 
+@attrs(slots=True)
+class _HeadersView(object):
+    """
+    Views of wrapped headers, cached until they're next changed.
+
+    @ivar mutations: The number of times the headers have been changed.
+    @ivar viewedAt: The value of C{mutations} when the cached views were
+        made.
+    @ivar rawHeaders: The cached raw headers, or L{None}.
+    @ivar textValues: A L{dict} mapping text header names to the raw values
+        they were decoded from, and the cached L{tuple} of their decoded
+        values.
+    """
+
+    mutations = attrib(default=0)  # type: int
+    viewedAt = attrib(default=0)  # type: int
+    rawHeaders = attrib(default=None)  # type: Optional[RawHeaders]
+    textValues = attrib(
+        default=Factory(dict)
+    )  # type: Dict[Text, Tuple[Tuple[bytes, ...], Tuple[Text, ...]]]
+
+    def current(self):
+        # type: () -> _HeadersView
+        """
+        Discard views cached before the latest change.
+
+        @return: C{self}
+        """
+        if self.viewedAt != self.mutations:
+            self.viewedAt = self.mutations
+            self.rawHeaders = None
+            self.textValues.clear()
+        return self
+
+
 @implementer(IMutableHTTPHeaders)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class HTTPHeadersWrappingHeaders(object):
     """
     HTTP entity headers.
 
     This is an L{IMutableHTTPHeaders} implementation that wraps a L{Headers}
     object.
+
+    The raw headers are cached until the headers are changed through this
+    object, so changes made to the wrapped L{Headers} directly aren't seen
+    by them.  The values of a header looked up by name always are: those
+    looked up by a text name are only decoded again once its raw values
+    have changed, however they were changed.
     """
 
     # NOTE: In case Headers has different ideas about encoding text than we do,
@@ -44,29 +85,42 @@ class HTTPHeadersWrappingHeaders(object):
 
     _headers = attrib(validator=instance_of(Headers))  # type: Headers
 
+    _view = attrib(
+        default=Factory(_HeadersView), init=False, cmp=False, repr=False
+    )  # type: _HeadersView
+
     @property
     def rawHeaders(self):
         # type: () -> RawHeaders
-        def pairs():
-            # type: () -> Iterable[Tuple[bytes, bytes]]
-            for name, values in self._headers.getAllRawHeaders():
-                name = normalizeHeaderName(name)
-                for value in values:
-                    yield (name, value)
+        view = self._view.current()
+        if view.rawHeaders is None:
+
+            def pairs():
+                # type: () -> Iterable[Tuple[bytes, bytes]]
+                for name, values in self._headers.getAllRawHeaders():
+                    name = normalizeRawHeaderName(name)
+                    for value in values:
+                        yield (name, value)
+
+            view.rawHeaders = tuple(pairs())
 
-        return tuple(pairs())
+        return view.rawHeaders
 
     def getValues(self, name):
         # type: (AnyStr) -> Iterable[AnyStr]
         if isinstance(name, bytes):
             values = self._headers.getRawHeaders(name, default=())
         elif isinstance(name, Text):
-            values = (
-                headerValueAsText(value)
-                for value in self._headers.getRawHeaders(
-                    headerNameAsBytes(name), default=()
-                )
+            rawValues = tuple(
+                self._headers.getRawHeaders(headerNameAsBytes(name), default=())
             )
+            textValues = self._view.current().textValues
+            cached = textValues.get(name)
+            if cached is not None and cached[0] == rawValues:
+                values = cached[1]
+            else:
+                values = tuple(headerValueAsText(value) for value in rawValues)
+                textValues[name] = (rawValues, values)
         else:
             raise TypeError("name {!r} must be text or bytes".format(name))
 
@@ -75,9 +129,11 @@ class HTTPHeadersWrappingHeaders(object):
     def remove(self, name):
         # type: (String) -> None
         self._headers.removeHeader(rawHeaderName(name))
+        self._view.mutations += 1
 
     def addValue(self, name, value):
         # type: (AnyStr, AnyStr) -> None
         rawName, rawValue = rawHeaderNameAndValue(name, value)
 
         self._headers.addRawHeader(rawName, rawValue)
+        self._view.mutations += 1
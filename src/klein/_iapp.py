@@ -3,9 +3,27 @@ from zope.interface import Attribute, Interface
 from ._typing import ifmethod
 
 
+class IRequestURL(Interface):
+    """
+    The URL a request was made to, worked out once per request.
+    """
+
+    scheme = Attribute("The scheme, C{u'http'} or C{u'https'}.")
+    host = Attribute("The host name, as text.")
+    port = Attribute("The port number, or L{None} for the scheme's default.")
+    netloc = Attribute(
+        "The request's C{Host} header, as text, or L{None} if it has none."
+    )
+    path = Attribute("The path, as text, still percent-encoded.")
+    url = Attribute("The whole URL, as a L{hyperlink.DecodedURL}.")
+
+
 class IKleinRequest(Interface):
     branch_segments = Attribute("Segments consumed by a branch route.")
     mapper = Attribute("L{werkzeug.routing.MapAdapter}")
+    maxBodySize = Attribute(
+        "The most bytes of request body the route accepts, or L{None}."
+    )
 
     @ifmethod
     def url_for(
@@ -19,6 +19,8 @@ from tubes.itube import IFount
 
 from twisted.internet.defer import Deferred
 
+from werkzeug.exceptions import RequestEntityTooLarge
+
 from zope.interface import Attribute, Interface
 
 from ._typing import ifmethod
@@ -39,6 +41,22 @@ class FountAlreadyAccessedError(Exception):
     """
 
 
+class BodyTooLargeError(RequestEntityTooLarge):
+    """
+    The HTTP message's body is larger than allowed.
+
+    Left unhandled, this is answered with a C{413 Request Entity Too Large}
+    response.
+    """
+
+    def __init__(self, maxLength):
+        # type: (int) -> None
+        super(BodyTooLargeError, self).__init__(
+            "The body is larger than {} bytes.".format(maxLength)
+        )
+        self.maxLength = maxLength
+
+
 class IHTTPHeaders(Interface):
     """
     HTTP entity headers.
@@ -174,6 +192,25 @@ class IHTTPMessage(Interface):
             accessed.
         """
 
+    @ifmethod
+    def bodyAsBuffer():
+        # type: () -> Deferred[memoryview]
+        """
+        The entity body, as a read-only L{memoryview}.
+
+        Where the body is already in memory, or in a file, the view is over
+        that buffer, or over a memory map of that file, rather than over a
+        copy, so that parsers and digests can read a large body without
+        copying it.
+        Otherwise, it's a view over the bytes C{self.bodyAsBytes} returns.
+
+        @note: Like C{self.bodyAsBytes}, this may access the fount, and the
+            same view is returned by repeated calls.
+
+        @raise FountAlreadyAccessedError: If the fount has previously been
+            accessed.
+        """
+
 
 class IHTTPRequest(IHTTPMessage):
     """
@@ -9,7 +9,7 @@ works, since mypy doesn't otherwise get along with Zope Interface.
 
 from typing import TYPE_CHECKING
 
-from ._iapp import IKleinRequest
+from ._iapp import IKleinRequest, IRequestURL
 from ._imessage import (
     IHTTPHeaders as _IHTTPHeaders,
     IHTTPMessage as _IHTTPMessage,
@@ -18,7 +18,7 @@ from ._imessage import (
     IMutableHTTPHeaders as _IMutableHTTPHeaders,
 )
 
-IKleinRequest  # Silence linter
+IKleinRequest, IRequestURL  # Silence linter
 
 
 if TYPE_CHECKING:  # pragma: no cover
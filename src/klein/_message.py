@@ -24,7 +24,7 @@ __all__ = ()
 InternalBody = Union[bytes, IFount]
 
 
-@attrs(frozen=False)
+@attrs(frozen=False, slots=True)
 class MessageState(object):
     """
     Internal mutable state for HTTP message implementations in L{klein}.
@@ -37,10 +37,21 @@ class MessageState(object):
         init=False,
     )
 
+    cachedBuffer = attrib(
+        type=Optional[memoryview],
+        validator=optional(instance_of(memoryview)),
+        default=None,
+        init=False,
+    )
+
     fountExhausted = attrib(
         type=bool, validator=instance_of(bool), default=False, init=False
     )
 
+    # The IHTTPHeaders view of a wrapped message's headers, made on first
+    # access, so that what it caches is kept between accesses.
+    cachedHeaders = attrib(type=Optional[Any], default=None, init=False)
+
 
 def validateBody(instance, attribute, body):
     # type: (Any, Any, InternalBody) -> None
@@ -92,3 +103,20 @@ def bodyAsBytes(body, state):
     d = fountToBytes(body)
     d.addCallback(cache)
     return d
+
+
+def bodyAsBuffer(body, state):
+    # type: (InternalBody, MessageState) -> Deferred[memoryview]
+    """
+    Return a read-only L{memoryview} for a given L{InternalBody}.
+    """
+
+    if state.cachedBuffer is not None:
+        return succeed(state.cachedBuffer)
+
+    def cache(bodyBytes):
+        # type: (bytes) -> memoryview
+        state.cachedBuffer = memoryview(bodyBytes)
+        return state.cachedBuffer
+
+    return bodyAsBytes(body, state).addCallback(cache)
@@ -19,14 +19,20 @@ from twisted.internet.defer import Deferred
 from zope.interface import implementer
 
 from ._interfaces import IHTTPHeaders, IHTTPRequest
-from ._message import MessageState, bodyAsBytes, bodyAsFount, validateBody
+from ._message import (
+    MessageState,
+    bodyAsBuffer,
+    bodyAsBytes,
+    bodyAsFount,
+    validateBody,
+)
 
 
 __all__ = ()
 
 
 @implementer(IHTTPRequest)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class FrozenHTTPRequest(object):
     """
     Immutable HTTP request.
@@ -51,3 +57,7 @@ class FrozenHTTPRequest(object):
     def bodyAsBytes(self):
         # type: () -> Deferred[bytes]
         return bodyAsBytes(self._body, self._state)
+
+    def bodyAsBuffer(self):
+        # type: () -> Deferred[memoryview]
+        return bodyAsBuffer(self._body, self._state)
@@ -6,7 +6,9 @@ Support for interoperability with L{twisted.web.iweb.IRequest}.
 """
 
 from io import BytesIO
-from typing import Text
+from mmap import ACCESS_READ, mmap
+from os import SEEK_END
+from typing import BinaryIO, Optional, Text
 
 from attr import Factory, attrib, attrs
 from attr.validators import provides
@@ -15,16 +17,18 @@ from hyperlink import DecodedURL
 
 from tubes.itube import IFount
 
-from twisted.internet.defer import Deferred, succeed
-from twisted.python.compat import nativeString
+from twisted.internet.defer import Deferred, fail, succeed
 from twisted.web.iweb import IRequest
 
 from zope.interface import implementer
 
 from ._headers import IHTTPHeaders
 from ._headers_compat import HTTPHeadersWrappingHeaders
+from ._imessage import BodyTooLargeError
+from ._interfaces import IKleinRequest
 from ._message import FountAlreadyAccessedError, MessageState
 from ._request import IHTTPRequest
+from ._requesturl import requestURL
 from ._tubes import IOFount, fountToBytes
 
 
@@ -34,8 +38,46 @@ __all__ = ()
 noneIO = BytesIO()
 
 
+def _contentBuffer(content):
+    # type: (BinaryIO) -> memoryview
+    """
+    A read-only view of the whole of a request's content, without copying
+    it if possible.
+
+    Twisted keeps small bodies in a L{BytesIO}, whose value is shared rather
+    than copied by C{getvalue} (on CPython 3), and spools large ones to a
+    temporary file, which is memory mapped.  The view stays valid once the
+    request is finished and its content closed.
+    """
+    if isinstance(content, BytesIO):
+        return memoryview(content.getvalue())
+
+    position = content.tell()
+    try:
+        content.seek(0, SEEK_END)
+        size = content.tell()
+        if size:
+            try:
+                fileno = content.fileno()
+            except (AttributeError, IOError, ValueError):
+                pass
+            else:
+                try:
+                    mapped = mmap(fileno, 0, access=ACCESS_READ)
+                    # typeshed doesn't know mmap provides the buffer protocol.
+                    return memoryview(mapped)  # type: ignore[arg-type]
+                except (EnvironmentError, TypeError, ValueError):
+                    # Not a mappable file, or Python 2's mmap, which
+                    # doesn't provide the new buffer protocol.
+                    pass
+        content.seek(0)
+        return memoryview(content.read())
+    finally:
+        content.seek(position)
+
+
 @implementer(IHTTPRequest)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class HTTPRequestWrappingIRequest(object):
     """
     HTTP request.
@@ -57,35 +99,27 @@ class HTTPRequestWrappingIRequest(object):
     @property
     def uri(self):
         # type: () -> DecodedURL
-        request = self._request
-
-        # This code borrows from t.w.server.Request._prePathURL.
-
-        if request.isSecure():
-            scheme = u"https"
-        else:
-            scheme = u"http"
-
-        netloc = nativeString(request.getRequestHostname())
-
-        port = request.getHost().port
-        if request.isSecure():
-            default = 443
-        else:
-            default = 80
-        if port != default:
-            netloc += u":{}".format(port)
-
-        path = nativeString(request.uri)
-        if path and path[0] == u"/":
-            path = path[1:]
-
-        return DecodedURL.fromText(u"{}://{}/{}".format(scheme, netloc, path))
+        url = requestURL(self._request)
+        if url.netloc is not None:
+            return url.url
+        # Without a Host header, as in an HTTP/1.0 request, the URI is of the
+        # address the server received the request on, as in
+        # Request.prePathURL, rather than the client's.
+        address = self._request.getHost()
+        host = address.host
+        if isinstance(host, bytes):
+            host = host.decode("charmap")
+        return url.url.replace(host=host, port=address.port)
 
     @property
     def headers(self):
         # type: () -> IHTTPHeaders
-        return HTTPHeadersWrappingHeaders(headers=self._request.requestHeaders)
+        headers = self._state.cachedHeaders
+        if headers is None:
+            headers = self._state.cachedHeaders = HTTPHeadersWrappingHeaders(
+                headers=self._request.requestHeaders
+            )
+        return headers
 
     def bodyAsFount(self):
         # type: () -> IFount
@@ -110,6 +144,38 @@ class HTTPRequestWrappingIRequest(object):
             return bodyBytes
 
         fount = self.bodyAsFount()
-        d = fountToBytes(fount)
+        d = fountToBytes(fount, self._maxBodySize())
         d.addCallback(cache)
         return d
+
+    def bodyAsBuffer(self):
+        # type: () -> Deferred[memoryview]
+        """
+        The body of the wrapped request, as a read-only L{memoryview} over
+        its content, or a memory map of the file it's spooled to.
+
+        Unlike C{bodyAsBytes}, this leaves the fount available.
+        """
+        state = self._state
+        if state.cachedBuffer is None:
+            if state.cachedBody is not None:
+                state.cachedBuffer = memoryview(state.cachedBody)
+            else:
+                content = self._request.content
+                if content is noneIO:
+                    raise FountAlreadyAccessedError()
+                buffer = _contentBuffer(content)
+                maxBodySize = self._maxBodySize()
+                if maxBodySize is not None and len(buffer) > maxBodySize:
+                    return fail(BodyTooLargeError(maxBodySize))
+                state.cachedBuffer = buffer
+        return succeed(state.cachedBuffer)
+
+    def _maxBodySize(self):
+        # type: () -> Optional[int]
+        """
+        The most bytes of body the route handling the wrapped request
+        accepts, if it's limited.
+        """
+        kleinRequest = IKleinRequest(self._request, None)
+        return getattr(kleinRequest, "maxBodySize", None)
@@ -0,0 +1,128 @@
+# -*- test-case-name: klein.test.test_requesturl -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+The URL of a request, worked out lazily and once per request.
+"""
+
+from typing import Optional, Text, Tuple
+
+from hyperlink import DecodedURL
+
+from six import text_type
+
+from twisted.python.components import registerAdapter
+from twisted.web.iweb import IRequest
+from twisted.web.server import Request
+
+from zope.interface import implementer
+
+from ._interfaces import IRequestURL
+
+
+__all__ = ()
+
+
+@implementer(IRequestURL)
+class LazyRequestURL(object):
+    """
+    The URL a request was made to.
+
+    The host and port come from the request's C{Host} header or, if it has
+    none, the client's address.  Each part is only worked out when it's first
+    asked for, and parsing the whole URL into a L{DecodedURL}, which is much
+    slower than the rest, only happens if L{LazyRequestURL.url} is asked for.
+
+    Adapting a L{Request} to L{IRequestURL} stores one of these as one of its
+    components, so that it's shared by everything that needs the request's
+    URL: L{klein.RequestURL}, L{klein.Klein.urlFor} and the C{uri} of
+    L{IHTTPRequest}s wrapping the request.
+    """
+
+    __slots__ = ("_request", "_hostAndPort", "_url")
+
+    def __init__(self, request):
+        # type: (IRequest) -> None
+        self._request = request
+        self._hostAndPort = None  # type: Optional[Tuple[Text, Optional[int]]]
+        self._url = None  # type: Optional[DecodedURL]
+
+    @property
+    def scheme(self):
+        # type: () -> Text
+        return u"https" if self._request.isSecure() else u"http"
+
+    @property
+    def netloc(self):
+        # type: () -> Optional[Text]
+        sentHeader = self._request.getHeader(b"host")
+        if sentHeader is None:
+            return None
+        return sentHeader.decode("charmap")
+
+    def _parseHost(self):
+        # type: () -> Tuple[Text, Optional[int]]
+        if self._hostAndPort is None:
+            netloc = self.netloc
+            port = None  # type: Optional[int]
+            if netloc is not None:
+                portText = None  # type: Optional[Text]
+                if netloc.startswith(u"["):
+                    host, _, rest = netloc[1:].partition(u"]")
+                    if rest.startswith(u":"):
+                        portText = rest[1:]
+                elif netloc.count(u":") == 1:
+                    host, portText = netloc.split(u":")
+                else:
+                    host = netloc
+                if portText is not None:
+                    try:
+                        port = int(portText)
+                    except ValueError:
+                        pass
+            else:
+                client = self._request.client
+                host, port = client.host, client.port
+                if not isinstance(host, text_type):
+                    host = host.decode("ascii")
+            self._hostAndPort = (host, port)
+        return self._hostAndPort
+
+    @property
+    def host(self):
+        # type: () -> Text
+        return self._parseHost()[0]
+
+    @property
+    def port(self):
+        # type: () -> Optional[int]
+        return self._parseHost()[1]
+
+    @property
+    def path(self):
+        # type: () -> Text
+        return self._request.uri.split(b"?", 1)[0].decode("charmap")
+
+    @property
+    def url(self):
+        # type: () -> DecodedURL
+        if self._url is None:
+            host, port = self._parseHost()
+            self._url = DecodedURL.fromText(
+                self._request.uri.decode("charmap")
+            ).replace(scheme=self.scheme, host=host, port=port)
+        return self._url
+
+
+registerAdapter(LazyRequestURL, Request, IRequestURL)
+
+
+def requestURL(request):
+    # type: (IRequest) -> IRequestURL
+    """
+    Get the L{IRequestURL} of a request, stored on it if it's a L{Request}.
+    """
+    url = IRequestURL(request, None)
+    if url is None:
+        url = LazyRequestURL(request)
+    return url
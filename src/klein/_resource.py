@@ -2,8 +2,19 @@
 
 from __future__ import absolute_import, division
 
+import json
+from array import array
+from bisect import bisect_left
+from functools import partial
+from mmap import mmap
+from typing import Any, Dict, Tuple
+
+import attr
+
+from tubes.itube import IFount
+
 from twisted.internet import defer
-from twisted.python import failure, log
+from twisted.python import failure, log, reflect
 from twisted.python.compat import intToBytes, unicode
 from twisted.web import server
 from twisted.web.iweb import IRenderable
@@ -11,10 +22,20 @@ from twisted.web.resource import IResource, Resource, getChildForRequest
 from twisted.web.server import NOT_DONE_YET
 from twisted.web.template import renderElement
 
-from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import (
+    HTTPException,
+    MethodNotAllowed,
+    default_exceptions,
+)
 
+from ._compression import compressResponse
 from ._dihttp import Response
+from ._file import FileResponse
+from ._imessage import BodyTooLargeError, IHTTPResponse
 from ._interfaces import IKleinRequest
+from ._response import FrozenHTTPResponse
+from ._stream import byteView, isStreamableType, streamResponse
+from ._tubes import fountToRequest
 
 
 def ensure_utf8_bytes(v):
@@ -27,14 +48,325 @@ def ensure_utf8_bytes(v):
     return v
 
 
-class _StandInResource(object):
+ERROR_BODY_FORMATS = ("html", "json", "text")
+
+_ERROR_CONTENT_TYPES = {
+    "json": b"application/json",
+    "text": b"text/plain; charset=utf-8",
+}
+
+# Bounds the number of distinct responses remembered, in case an application
+# raises exceptions with descriptions that vary from request to request.
+_MAX_CANNED_RESPONSES = 512
+
+_cannedResponses = {}  # type: Dict[Tuple[Any, ...], Tuple[Any, ...]]
+
+
+_RESPONSE_METHODS = (
+    "get_description",
+    "get_body",
+    "get_headers",
+    "get_response",
+)
+
+
+def _isCannable(exceptionType):
+    """
+    Is the default response to exceptions of C{exceptionType} entirely
+    determined by their class, code and description?
+
+    That's true of the werkzeug exceptions which don't customize how their
+    response is built, and of L{MethodNotAllowed}, whose only other input is
+    its valid methods.
+    """
+    if exceptionType is MethodNotAllowed:
+        return True
+    for klass in exceptionType.__mro__:
+        if klass is HTTPException:
+            return True
+        for name in _RESPONSE_METHODS:
+            if name in vars(klass):
+                return False
+    return False
+
+
+_CANNED_EXCEPTION_TYPES = frozenset(
+    exceptionType
+    for exceptionType in set(default_exceptions.values())
+    if _isCannable(exceptionType)
+)
+
+
+def _httpExceptionResponse(he, bodyFormat="html"):
+    """
+    Get the default response for a werkzeug C{HTTPException}.
+
+    The responses to werkzeug's own exceptions are only computed once for
+    each distinct class, code and description (and, for L{MethodNotAllowed},
+    set of valid methods).
+
+    @param bodyFormat: One of L{ERROR_BODY_FORMATS}: C{"html"} for
+        werkzeug's own response, or C{"json"} or C{"text"} for a compact
+        body of the given type.  Exceptions which carry their own response
+        always get that response.
+
+    @return: A 3-L{tuple} of the response code, a sequence of encoded header
+        name and value pairs, and the encoded body.
+    """
+    key = None
+    if type(he) in _CANNED_EXCEPTION_TYPES and he.response is None:
+        key = (
+            type(he),
+            he.code,
+            he.description,
+            frozenset(getattr(he, "valid_methods", None) or ()),
+            bodyFormat,
+        )
+        canned = _cannedResponses.get(key)
+        if canned is not None:
+            return canned
+
+    if bodyFormat == "html" or he.response is not None:
+        resp = he.get_response({})
+        headers = resp.headers
+        body = b"".join(resp.iter_encoded())
+    else:
+        if bodyFormat == "json":
+            body = json.dumps(
+                {
+                    u"code": he.code,
+                    u"name": he.name,
+                    u"description": he.description or u"",
+                },
+                separators=(",", ":"),
+                sort_keys=True,
+            )
+        else:
+            body = u"{} {}: {}".format(he.code, he.name, he.description or u"")
+        body = ensure_utf8_bytes(body)
+        headers = [
+            (header, value)
+            for header, value in he.get_headers({})
+            if header.lower() != u"content-type"
+        ]
+        headers.insert(0, (b"Content-Type", _ERROR_CONTENT_TYPES[bodyFormat]))
+        headers.append((b"Content-Length", intToBytes(len(body))))
+
+    canned = (
+        he.code,
+        tuple(
+            (ensure_utf8_bytes(header), ensure_utf8_bytes(value))
+            for header, value in headers
+        ),
+        ensure_utf8_bytes(body),
+    )
+    if key is not None and len(_cannedResponses) < _MAX_CANNED_RESPONSES:
+        _cannedResponses[key] = canned
+    return canned
+
+
+# Responses with these codes can't have a body, and so shouldn't be given a
+# Content-Length.
+_NO_BODY_CODES = frozenset([204, 304])
+
+
+def _requestFinished(request):
+    """
+    Has C{request} been finished, or has its connection been lost?
+    """
+    return getattr(request, "finished", False) or getattr(
+        request, "_disconnected", False
+    )
+
+
+def _requireHTTPResponse(result):
+    """
+    Check that a native route's handler resulted in an L{IHTTPResponse}.
+
+    @raise TypeError: If it didn't.
+    """
+    if not IHTTPResponse.providedBy(result):
+        raise TypeError(
+            "Native routes must return an IHTTPResponse, not {!r}".format(
+                result
+            )
+        )
+    return result
+
+
+def _bodySize(request):
+    """
+    How large is the body of C{request}?
+
+    This is the length its C{Content-Length} header declares, if it has one,
+    and otherwise the length of the body received, since a chunked body has
+    been read by the time the request is rendered.
+    """
+    contentLength = request.getHeader(b"content-length")
+    if contentLength is not None:
+        try:
+            return int(contentLength)
+        except ValueError:
+            pass
+    content = request.content
+    if content is None:
+        return 0
+    position = content.tell()
+    content.seek(0, 2)
+    size = content.tell()
+    content.seek(position)
+    return size
+
+
+@attr.s
+class ErrorDispatcher(object):
+    """
+    Find the error handlers registered with L{Klein.handle_errors} that
+    apply to a failure.
+
+    Handlers are indexed by the names of the exception types they handle, so
+    finding the handlers for a failure means looking up the classes in its
+    MRO rather than checking every handler in turn.  The result is memoized
+    for each exception type.  The index is rebuilt whenever handlers are
+    added.
+
+    @ivar _handlers: The L{list} of error handlers, as 2-L{tuple}s of a
+        L{list} of exception types and the handler.
     """
-    A standin for a Resource.
 
-    This is a sentinel value for L{KleinResource}, to say that we are rendering
-    a L{Resource}, which may close the connection itself later.
+    _handlers = attr.ib()
+    _byName = attr.ib(init=False, default=None, cmp=False, repr=False)
+    _byType = attr.ib(init=False, factory=dict, cmp=False, repr=False)
+    _handlerCount = attr.ib(init=False, default=-1, cmp=False, repr=False)
+
+    def _compile(self):
+        byName = {}
+        for index, (types, _handler) in enumerate(self._handlers):
+            for errorType in types:
+                # Name the type the same way that Failure.check does.
+                if isinstance(errorType, type) and issubclass(
+                    errorType, Exception
+                ):
+                    errorType = reflect.qual(errorType)
+                byName.setdefault(errorType, set()).add(index)
+        self._byName = byName
+        self._byType.clear()
+        self._handlerCount = len(self._handlers)
+
+    def find(self, reason, start=0):
+        """
+        Find the first handler for C{reason}, in the order the handlers were
+        registered, starting from the handler at index C{start}.
+
+        @param reason: The failure to handle.
+        @type reason: L{twisted.python.failure.Failure}
+
+        @return: The index of the handler, or L{None} if none of them apply.
+        @rtype: L{int} or L{None}
+        """
+        if len(self._handlers) != self._handlerCount:
+            self._compile()
+
+        indexes = self._byType.get(reason.type)
+        if indexes is None:
+            found = set()
+            for name in reason.parents:
+                found.update(self._byName.get(name, ()))
+            indexes = self._byType[reason.type] = sorted(found)
+
+        position = bisect_left(indexes, start)
+        if position < len(indexes):
+            return indexes[position]
+        return None
+
+
+@attr.s
+class ResultDispatcher(object):
+    """
+    Find how to render each type of result returned by a route or error
+    handler.
+
+    A result is rendered by the handler registered with
+    L{Klein.handleResults} for the nearest class in its type's MRO, or as
+    one of the types Klein knows about (byte strings, text, buffers,
+    L{None}, L{Deferred}s, L{Response}s, L{FileResponse}s, founts,
+    L{IHTTPResponse}s, resources, renderables and iterables).  A handler
+    registered for C{object} applies to anything else.  How to render each
+    type is memoized, so rendering another result of the same type costs a
+    single C{dict} lookup.  The memo is cleared whenever a handler is
+    registered.
+
+    @ivar _handlers: A C{dict} mapping types to the result handlers
+        registered for them.
+    @ivar _byType: A C{dict} mapping result types to a function which
+        renders results of that type, called with the L{KleinResource}, the
+        result, the request, the L{_Processing} state and the index of the
+        first error handler to try.
     """
 
+    _handlers = attr.ib(factory=dict)
+    _byType = attr.ib(init=False, factory=dict, cmp=False, repr=False)
+
+    def register(self, types, handler):
+        """
+        Render results of each of C{types} with C{handler}.
+
+        @param types: The types of result C{handler} applies to.
+        @type types: iterable of L{type}
+
+        @param handler: A result handler, called with a bound instance (or
+            L{None}), the request and the result, and returning something
+            else to render in its place.
+        """
+        for resultType in types:
+            self._handlers[resultType] = handler
+        self._byType.clear()
+
+    def find(self, resultType):
+        """
+        Find how to render results of type C{resultType}.
+
+        @return: A function taking the L{KleinResource}, the result, the
+            request, the L{_Processing} state and the index of the first
+            error handler to try.
+        """
+        render = self._byType.get(resultType)
+        if render is None:
+            render = self._byType[resultType] = self._resolve(resultType)
+        return render
+
+    def _resolve(self, resultType):
+        for klass in resultType.__mro__:
+            if klass is object:
+                break
+            handler = self._handlers.get(klass)
+            if handler is not None:
+                return partial(_adaptResult, handler)
+            render = _RESULT_TYPES.get(klass)
+            if render is not None:
+                return render
+        for interface, render in _RESULT_INTERFACES:
+            if interface.implementedBy(resultType):
+                return render
+        if isStreamableType(resultType):
+            return KleinResource._handleStreamable
+        handler = self._handlers.get(object)
+        if handler is not None:
+            return partial(_adaptResult, handler)
+        return KleinResource._handleOther
+
+
+def _adaptResult(handler, resource, result, request, state, index):
+    """
+    Render what the result handler C{handler} makes of C{result}.
+    """
+    resource._handle(
+        resource._app._executeResultHandler(handler, request, result),
+        request,
+        state,
+        index,
+    )
+
 
 class _URLDecodeError(Exception):
     """
@@ -141,6 +473,23 @@ class KleinResource(Resource):
             return result
         return not result
 
+    def _match(self, request):
+        """
+        Route C{request}.
+
+        @return: A 3-L{tuple} of the endpoint name, the arguments for the
+            endpoint and its segment count.
+        """
+        match = None
+        router = self._app._router
+        if router is not None:
+            match = router.match(request.postpath, request.method)
+        if match is None:
+            match = IKleinRequest(request).mapper.match(return_rule=True)
+        (rule, kwargs) = match
+        endpoint = rule.endpoint
+        return endpoint, kwargs, self._app.endpoints[endpoint].segment_count
+
     def render(self, request):
         # Stuff we need to know for the mapper.
         try:
@@ -157,133 +506,331 @@ class KleinResource(Resource):
             request.setResponseCode(400)
             return b"Non-UTF-8 encoding in URL."
 
-        # Bind our mapper.
-        mapper = self._app.url_map.bind(
-            server_name,
-            script_name,
-            path_info=path_info,
-            default_method=request.method,
-            url_scheme=url_scheme,
-        )
-        # Make the mapper available to the view.
+        # Make the mapper available to the view.  It's only bound when
+        # something needs it, since a compiled router can match without it.
         kleinRequest = IKleinRequest(request)
-        kleinRequest.mapper = mapper
-
-        # Make sure we'll notice when the connection goes away unambiguously.
-        request_finished = [False]
-
-        def _finish(result):
-            request_finished[0] = True
+        kleinRequest.bindMapperLazily(
+            partial(
+                self._app.url_map.bind,
+                server_name,
+                script_name,
+                path_info=path_info,
+                default_method=request.method,
+                url_scheme=url_scheme,
+            )
+        )
+        matchCache = self._app._matchCache
 
-        def _execute():
-            # Actually doing the match right here. This can cause an exception
-            # to percolate up. If that happens it will be handled below in
-            # processing_failed, either by a user-registered error handler or
-            # one of our defaults.
-            (rule, kwargs) = mapper.match(return_rule=True)
-            endpoint = rule.endpoint
+        try:
+            if matchCache is None:
+                (endpoint, kwargs, segment_count) = self._match(request)
+            else:
+                (endpoint, kwargs, segment_count) = matchCache.match(
+                    (request.method, server_name, path_info),
+                    partial(self._match, request),
+                )
 
             # Try pretty hard to fix up prepath and postpath.
-            segment_count = self._app.endpoints[endpoint].segment_count
             request.prepath.extend(request.postpath[:segment_count])
             request.postpath = request.postpath[segment_count:]
 
-            request.notifyFinish().addBoth(_finish)
-
-            # Standard Twisted Web stuff. Defer the method action, giving us
-            # something renderable or printable. Return NOT_DONE_YET and set up
-            # the incremental renderer.
-            d = defer.maybeDeferred(
-                self._app.execute_endpoint, endpoint, request, **kwargs
-            )
-
-            request.notifyFinish().addErrback(lambda _: d.cancel())
+            if self._app._maxBodySizes:
+                maxBodySize = self._app._maxBodySizes.get(endpoint)
+                if maxBodySize is not None:
+                    kleinRequest.maxBodySize = maxBodySize
+                    if _bodySize(request) > maxBodySize:
+                        raise BodyTooLargeError(maxBodySize)
+
+            compression = encoding = None
+            if self._app._compressions:
+                compression = self._app._compressions.get(endpoint)
+                if compression is not None:
+                    encoding = compression.negotiate(request)
+
+            if self._app._cachePolicies:
+                responseCache = self._app._responseCache(endpoint)
+                if responseCache is not None and responseCache.serve(
+                    request, server_name, encoding
+                ):
+                    return server.NOT_DONE_YET
+
+            # Installed after the cache, so that what it records is
+            # compressed, and before validators, so that they see the
+            # uncompressed body.
+            if encoding is not None:
+                compressResponse(request, compression, encoding)
+
+            native = bool(self._app._native) and endpoint in self._app._native
+
+            if self._app._validators:
+                validators = self._app._validators.get(endpoint)
+                if validators is not None and validators.respond(
+                    request,
+                    partial(
+                        self._app._executeValidator,
+                        request=request,
+                        kwargs=kwargs,
+                        native=native,
+                    ),
+                ):
+                    return server.NOT_DONE_YET
+
+            if self._app._coalesced and endpoint in self._app._coalesced:
+                result = self._app._singleFlight(endpoint).call(
+                    request,
+                    server_name,
+                    self._app.execute_endpoint,
+                    endpoint,
+                    request,
+                    **kwargs
+                )
+            else:
+                result = self._app.execute_endpoint(endpoint, request, **kwargs)
+        except Exception:
+            # Routing failures and exceptions raised by the endpoint are
+            # handled either by a user-registered error handler or one of
+            # our defaults.
+            self._fail(failure.Failure(), request, None, 0)
+        else:
+            if native:
+                self._respond(result, request, None, 0)
+            else:
+                self._handle(result, request, None, 0)
 
-            return d
+        return server.NOT_DONE_YET
 
-        d = defer.maybeDeferred(_execute)
+    def _handle(self, result, request, state, index):
+        """
+        Handle the result of an endpoint or error handler, writing it to the
+        request and finishing the request once it's ready.
+
+        How to render the result is looked up by its type in the app's
+        L{ResultDispatcher}.  Byte strings, text, buffers and L{None} are
+        written and the request finished immediately, without allocating any
+        L{Deferred}s.  Buffers, such as L{bytearray}s and L{memoryview}s,
+        are written without being copied, so they mustn't be changed
+        afterwards.
+
+        @param result: The result to render.
+        @param request: The request being rendered.
+        @param state: The L{_Processing} state of the request, or L{None} if
+            it hasn't been needed yet.
+        @param index: The index of the first error handler that may handle a
+            failure while processing C{result}.
+        """
+        try:
+            render = self._app._resultDispatcher.find(type(result))
+            render(self, result, request, state, index)
+        except Exception:
+            self._fail(failure.Failure(), request, state, index)
+
+    def _writeResult(self, result, request, state, index):
+        self._write(result, request, state)
+
+    def _writeBuffer(self, result, request, state, index):
+        self._write(byteView(result), request, state)
+
+    def _handleDeferred(self, result, request, state, index):
+        if state is None and not result.called:
+            state = _Processing(request)
+        if state is not None and index == 0:
+            state.waiting = result
+        result.addCallbacks(
+            self._handle,
+            self._fail,
+            callbackArgs=(request, state, index),
+            errbackArgs=(request, state, index),
+        )
+        result.addErrback(log.err, _why="Unhandled Error writing response")
 
-        def process(r):
-            """
-            Recursively go through r and any child Resources until something
-            returns an IRenderable, then render it and let the result of that
-            bubble back up.
-            """
-            if isinstance(r, Response):
-                r = r._applyToRequest(request)
+    def _handleResponse(self, result, request, state, index):
+        self._handle(result._applyToRequest(request), request, state, index)
 
-            if IResource.providedBy(r):
-                request.render(getChildForRequest(r, request))
-                return _StandInResource
+    def _handleFount(self, result, request, state, index):
+        self._handle(fountToRequest(result, request), request, state, index)
 
-            if IRenderable.providedBy(r):
-                renderElement(request, r)
-                return _StandInResource
+    def _renderResource(self, result, request, state, index):
+        request.render(getChildForRequest(result, request))
 
-            return r
+    def _renderElement(self, result, request, state, index):
+        renderElement(request, result)
 
-        d.addCallback(process)
+    def _handleStreamable(self, result, request, state, index):
+        self._handle(streamResponse(request, result), request, state, index)
 
-        def processing_failed(failure, error_handlers):
-            # The failure processor writes to the request.  If the
-            # request is already finished we should suppress failure
-            # processing.  We don't return failure here because there
-            # is no way to surface this failure to the user if the
-            # request is finished.
-            if request_finished[0]:
-                if not failure.check(defer.CancelledError):
-                    log.err(failure, "Unhandled Error Processing Request.")
+    def _handleOther(self, result, request, state, index):
+        """
+        Handle a result of a type Klein doesn't otherwise know about, which
+        may still provide one of the interfaces it does directly, or support
+        the buffer protocol.
+        """
+        for interface, render in _RESULT_INTERFACES:
+            if interface.providedBy(result):
+                render(self, result, request, state, index)
                 return
+        try:
+            result = byteView(result)
+        except TypeError:
+            pass
+        self._write(result, request, state)
 
-            # If there are no more registered handlers, apply some defaults
-            if len(error_handlers) == 0:
-                if failure.check(HTTPException):
-                    he = failure.value
-                    request.setResponseCode(he.code)
-                    resp = he.get_response({})
+    def _respond(self, result, request, state, index):
+        """
+        Handle the result of a native route's handler, which must be an
+        L{IHTTPResponse}, or a L{Deferred} resulting in one.
+        """
+        try:
+            if IHTTPResponse.providedBy(result):
+                self._writeHTTPResponse(result, request, state, index)
+                return
+            if not isinstance(result, defer.Deferred):
+                _requireHTTPResponse(result)
+        except Exception:
+            self._fail(failure.Failure(), request, state, index)
+            return
+        self._handle(
+            result.addCallback(_requireHTTPResponse), request, state, index
+        )
 
-                    for header, value in resp.headers:
-                        request.setHeader(
-                            ensure_utf8_bytes(header), ensure_utf8_bytes(value)
-                        )
+    def _writeHTTPResponse(self, response, request, state, index):
+        """
+        Write an L{IHTTPResponse}'s status, headers and body to the request.
 
-                    return ensure_utf8_bytes(b"".join(resp.iter_encoded()))
-                else:
-                    request.processingFailed(failure)
-                    return
+        A L{FrozenHTTPResponse} made with L{bytes} is written directly, and
+        may be written again; any other body is flowed from its fount.
+        """
+        request.setResponseCode(response.status)
+        addRawHeader = request.responseHeaders.addRawHeader
+        for name, value in response.headers.rawHeaders:
+            addRawHeader(name, value)
+        if isinstance(response, FrozenHTTPResponse):
+            body = response._bytesBody()
+            if body is not None:
+                self._write(body, request, state)
+                return
+        self._handle(response.bodyAsFount(), request, state, index)
 
-            error_handler = error_handlers[0]
+    def _fail(self, reason, request, state, index):
+        """
+        Handle a failure while processing a request, with the first matching
+        error handler from C{index} onwards or one of the defaults.
 
+        @param reason: The failure to handle.
+        @type reason: L{twisted.python.failure.Failure}
+        """
+        # The failure processor writes to the request.  If the request is
+        # already finished we should suppress failure processing.  We don't
+        # return the failure here because there is no way to surface it to
+        # the user if the request is finished.
+        if (state is not None and state.finished) or _requestFinished(request):
+            if not reason.check(defer.CancelledError):
+                log.err(reason, "Unhandled Error Processing Request.")
+            return
+
+        dispatcher = self._app._errorDispatcher
+        index = dispatcher.find(reason, index)
+        while index is not None:
             # Each error handler is a tuple of
             # (list_of_exception_types, handler_fn)
-            if failure.check(*error_handler[0]):
-                d = defer.maybeDeferred(
-                    self._app.execute_error_handler,
-                    error_handler[1],
-                    request,
-                    failure,
+            handler = self._app._error_handlers[index][1]
+            index += 1
+            try:
+                result = self._app.execute_error_handler(
+                    handler, request, reason
                 )
+            except Exception:
+                reason = failure.Failure()
+                index = dispatcher.find(reason, index)
+                continue
+            self._handle(result, request, state, index)
+            return
+
+        # If there are no more registered handlers, apply some defaults.
+        if reason.check(HTTPException):
+            code, headers, body = _httpExceptionResponse(
+                reason.value, self._app._errorBodyFormat
+            )
+            request.setResponseCode(code)
 
-                d.addCallback(process)
-
-                return d.addErrback(processing_failed, error_handlers[1:])
+            for header, value in headers:
+                request.setHeader(header, value)
 
-            return processing_failed(failure, error_handlers[1:])
+            self._write(body, request, state)
+        else:
+            request.processingFailed(reason)
+            self._write(None, request, state)
 
-        d.addErrback(processing_failed, self._app._error_handlers)
+    def _write(self, body, request, state):
+        """
+        Write C{body} to the request, if there is one, and finish it unless
+        it's already finished.
 
-        def write_response(r):
-            if r is not _StandInResource:
-                if isinstance(r, unicode):
-                    r = r.encode("utf-8")
+        If nothing has been written yet, the response gets a
+        C{Content-Length} header, so that it needn't be chunked.
+        """
+        try:
+            if isinstance(body, unicode):
+                body = body.encode("utf-8")
+
+            if (body is not None) and (body != NOT_DONE_YET):
+                if (
+                    not getattr(request, "startedWriting", True)
+                    and getattr(request, "code", None) not in _NO_BODY_CODES
+                    and not request.responseHeaders.hasHeader(b"content-length")
+                ):
+                    request.setHeader(b"Content-Length", intToBytes(len(body)))
+                request.write(body)
+
+            if not (
+                (state is not None and state.finished)
+                or _requestFinished(request)
+            ):
+                request.finish()
+        except Exception:
+            log.err(None, "Unhandled Error writing response")
+
+
+_RESULT_TYPES = {
+    bytes: KleinResource._writeResult,
+    unicode: KleinResource._writeResult,
+    type(None): KleinResource._writeResult,
+    bytearray: KleinResource._writeBuffer,
+    memoryview: KleinResource._writeBuffer,
+    mmap: KleinResource._writeBuffer,
+    array: KleinResource._writeBuffer,
+    defer.Deferred: KleinResource._handleDeferred,
+    Response: KleinResource._handleResponse,
+    FileResponse: KleinResource._handleResponse,
+}
+
+# In the order they're checked for.
+_RESULT_INTERFACES = (
+    (IFount, KleinResource._handleFount),
+    (IHTTPResponse, KleinResource._writeHTTPResponse),
+    (IResource, KleinResource._renderResource),
+    (IRenderable, KleinResource._renderElement),
+)
+
+
+class _Processing(object):
+    """
+    The state of a request whose response isn't ready yet.
 
-                if (r is not None) and (r != NOT_DONE_YET):
-                    request.write(r)
+    @ivar finished: Whether the request has been finished or its connection
+        lost.
+    @ivar waiting: The L{Deferred} result of the endpoint, which is cancelled
+        if the connection is lost.
+    """
 
-                if not request_finished[0]:
-                    request.finish()
+    __slots__ = ("finished", "waiting")
 
-        d.addCallback(write_response)
-        d.addErrback(log.err, _why="Unhandled Error writing response")
+    def __init__(self, request):
+        self.waiting = None
+        self.finished = _requestFinished(request)
+        if not self.finished:
+            request.notifyFinish().addBoth(self._finished)
 
-        return server.NOT_DONE_YET
+    def _finished(self, result):
+        self.finished = True
+        if isinstance(result, failure.Failure) and self.waiting is not None:
+            self.waiting.cancel()
@@ -5,7 +5,7 @@
 HTTP response API.
 """
 
-from typing import Union
+from typing import Optional, Union
 
 from attr import Factory, attrib, attrs
 from attr.validators import instance_of, provides
@@ -17,14 +17,20 @@ from twisted.internet.defer import Deferred
 from zope.interface import implementer
 
 from ._interfaces import IHTTPHeaders, IHTTPResponse
-from ._message import MessageState, bodyAsBytes, bodyAsFount, validateBody
+from ._message import (
+    MessageState,
+    bodyAsBuffer,
+    bodyAsBytes,
+    bodyAsFount,
+    validateBody,
+)
 
 
 __all__ = ()
 
 
 @implementer(IHTTPResponse)  # type: ignore[misc]
-@attrs(frozen=True)
+@attrs(frozen=True, slots=True)
 class FrozenHTTPResponse(object):
     """
     Immutable HTTP response.
@@ -46,6 +52,21 @@ class FrozenHTTPResponse(object):
         # type: () -> IFount
         return bodyAsFount(self._body, self._state)
 
+    def _bytesBody(self):
+        # type: () -> Optional[bytes]
+        """
+        The body, if this response was made with L{bytes}, without accessing
+        its fount, so that the response can be written any number of times.
+        """
+        body = self._body
+        if isinstance(body, bytes):
+            return body
+        return None
+
     def bodyAsBytes(self):
         # type: () -> Deferred[bytes]
         return bodyAsBytes(self._body, self._state)
+
+    def bodyAsBuffer(self):
+        # type: () -> Deferred[memoryview]
+        return bodyAsBuffer(self._body, self._state)
@@ -0,0 +1,508 @@
+# -*- test-case-name: klein.test.test_router -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Compiled and cached URL routing.
+
+L{CompiledRouter} indexes the rules of a C{werkzeug.routing.Map} in a segment
+trie so that matching a request costs a walk proportional to the depth of its
+path rather than a regular expression search across every rule in the map.
+
+The trie only ever answers when it can be certain that werkzeug would give
+the same answer; anything it can't express exactly (redirects, host and
+subdomain matching, aliases, defaults, custom converters and so on) is left
+to werkzeug's own matcher.
+
+L{MatchCache} remembers the outcome of routing recent requests, including
+the ones that didn't match any route.
+"""
+
+import re
+from collections import OrderedDict
+from copy import copy
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Text,
+    Tuple,
+    Union,
+    cast,
+)
+
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, NotFound
+from werkzeug.routing import (
+    AnyConverter,
+    BaseConverter,
+    FloatConverter,
+    IntegerConverter,
+    Map,
+    PathConverter,
+    Rule,
+    UUIDConverter,
+    UnicodeConverter,
+    ValidationError,
+    parse_rule,
+)
+
+
+__all__ = ()
+
+
+# A segment of a rule: the bytes of a static segment, or the name of an
+# argument and its converter.
+_Segment = Union[bytes, Tuple[str, BaseConverter]]
+
+# A rule matching a path: its entry in the trie, the converted values of its
+# arguments, and whether matching it needs a redirect to add a trailing
+# slash.
+_Candidate = Tuple["_Entry", Tuple[Any, ...], bool]
+
+
+# Converters whose regular expressions can only ever match within a single
+# path segment.  Subclasses are deliberately not included, since they may
+# override either the regular expression or the conversion.
+_SEGMENT_CONVERTERS = frozenset(
+    [
+        AnyConverter,
+        FloatConverter,
+        IntegerConverter,
+        UUIDConverter,
+        UnicodeConverter,
+    ]
+)
+
+
+def _ruleCount(urlMap):
+    # type: (Map) -> int
+    """
+    Count the rules added to a map so far, which is cheap enough to do for
+    every request.
+    """
+    return len(urlMap._rules)  # type: ignore[attr-defined]
+
+
+class _Unsupported(Exception):
+    """
+    Raised while compiling a rule that the trie can't represent exactly.
+    """
+
+
+class _SegmentEdge(object):
+    """
+    An edge of the trie that matches one path segment with a converter.
+    """
+
+    __slots__ = ("converter", "node", "_pattern")
+
+    def __init__(self, converter):
+        # type: (BaseConverter) -> None
+        self.converter = converter
+        self.node = _Node()
+        self._pattern = re.compile(
+            u"(?:{})\\Z".format(converter.regex), re.UNICODE
+        )
+
+    def convert(self, text):
+        # type: (Text) -> Any
+        """
+        Convert a single path segment.
+
+        @return: the converted value, or C{self} if the segment doesn't match.
+        """
+        if self._pattern.match(text) is None:
+            return self
+        try:
+            return self.converter.to_python(text)
+        except ValidationError:
+            return self
+
+
+class _Node(object):
+    """
+    A node of the trie.
+
+    @ivar static: Child nodes, keyed by the UTF-8 encoded text of a static
+        path segment.
+    @ivar dynamic: L{_SegmentEdge}s for converter segments, keyed by a
+        description of the converter so that rules sharing a converter also
+        share an edge.
+    @ivar rest: L{_Entry}s for rules ending in a C{path} converter which
+        consumes the remainder of the path from this node.
+    @ivar terminal: L{_Entry}s for rules ending at this node.
+    """
+
+    __slots__ = ("static", "dynamic", "rest", "terminal")
+
+    def __init__(self):
+        # type: () -> None
+        self.static = {}  # type: Dict[bytes, _Node]
+        self.dynamic = {}  # type: Dict[Tuple[Any, ...], _SegmentEdge]
+        self.rest = []  # type: List[_Entry]
+        self.terminal = []  # type: List[_Entry]
+
+
+class _Entry(object):
+    """
+    A rule that can be reached in the trie.
+
+    @ivar index: The position of the rule in werkzeug's matching order.
+    @ivar names: The names of the rule's arguments, in path order.
+    @ivar methods: The rule's methods as encoded upper-case method names, or
+        L{None} if it accepts any method.
+    """
+
+    __slots__ = ("index", "rule", "names", "methods", "isLeaf", "strict")
+
+    def __init__(self, index, rule, names):
+        # type: (int, Rule, Tuple[str, ...]) -> None
+        self.index = index
+        self.rule = rule
+        self.names = names
+        self.methods = None  # type: Optional[FrozenSet[bytes]]
+        if rule.methods is not None:
+            self.methods = frozenset(m.encode("ascii") for m in rule.methods)
+        self.isLeaf = rule.is_leaf
+        self.strict = rule.strict_slashes
+
+
+def _converterKey(converter):
+    # type: (BaseConverter) -> Tuple[Any, ...]
+    """
+    Describe a converter so that equivalent converters compare equal.
+    """
+    return (
+        type(converter),
+        converter.regex,
+        tuple(
+            sorted(
+                (name, repr(value))
+                for name, value in vars(converter).items()
+                if name != "map"
+            )
+        ),
+    )
+
+
+def _ruleSegments(rule):
+    # type: (Rule) -> List[_Segment]
+    """
+    Split a bound werkzeug rule into path segments.
+
+    @return: A L{list} of segments, each of which is either the L{bytes} of a
+        static segment or a 2-L{tuple} of an argument name and its converter.
+
+    @raise _Unsupported: if the rule can't be expressed in the trie.
+    """
+    if rule.map.host_matching or rule.subdomain:
+        raise _Unsupported("host or subdomain matching")
+    if rule.defaults or rule.alias or rule.redirect_to is not None:
+        raise _Unsupported("defaults, alias or redirect")
+    if getattr(rule, "websocket", False):
+        raise _Unsupported("websocket")
+
+    body = rule.rule if rule.is_leaf else rule.rule.rstrip(u"/")
+    segments = []  # type: List[List[_Segment]]
+    current = []  # type: List[_Segment]
+
+    for converter, _arguments, variable in parse_rule(body):
+        if converter is None:
+            parts = variable.split(u"/")
+            if parts[0]:
+                current.append(parts[0].encode("utf-8"))
+            for part in parts[1:]:
+                segments.append(current)
+                current = [part.encode("utf-8")] if part else []
+        else:
+            bound = rule._converters[variable]  # type: ignore[attr-defined]
+            current.append((str(variable), bound))
+    segments.append(current)
+
+    # The rule starts with a slash, so the first segment is always empty.
+    segments = segments[1:]
+
+    result = []  # type: List[_Segment]
+    for position, pieces in enumerate(segments):
+        if len(pieces) != 1:
+            raise _Unsupported("empty segment or mixed static and converter")
+        [piece] = pieces
+        if not isinstance(piece, bytes):
+            name, converter = piece
+            if type(converter) is PathConverter:
+                if position != len(segments) - 1 or not rule.is_leaf:
+                    raise _Unsupported("path converter before the end")
+            elif type(converter) not in _SEGMENT_CONVERTERS:
+                raise _Unsupported("custom converter")
+        result.append(piece)
+    return result
+
+
+class CompiledRouter(object):
+    """
+    Match requests against the rules of a C{werkzeug.routing.Map} using a
+    segment trie.
+
+    The trie is (re)built whenever the number of rules in the map changes, so
+    routes may still be added after the router is created.
+
+    @ivar supported: Whether every rule in the map could be compiled.  If
+        not, L{CompiledRouter.match} always defers to werkzeug.
+    """
+
+    def __init__(self, urlMap):
+        # type: (Map) -> None
+        self._map = urlMap
+        self._root = _Node()
+        self._ruleCount = -1
+        self.supported = False
+
+    def compile(self):
+        # type: () -> None
+        """
+        Build the trie from the current rules of the map.
+        """
+        urlMap = self._map
+        urlMap.update()
+        root = _Node()
+        supported = True
+
+        for index, rule in enumerate(urlMap.iter_rules()):
+            if rule.build_only:
+                continue
+            try:
+                segments = _ruleSegments(rule)
+            except _Unsupported:
+                supported = False
+                break
+
+            node = root
+            names = []  # type: List[str]
+            for segment in segments:
+                if isinstance(segment, bytes):
+                    node = node.static.setdefault(segment, _Node())
+                    continue
+                name, converter = segment
+                names.append(name)
+                if type(converter) is PathConverter:
+                    node.rest.append(_Entry(index, rule, tuple(names)))
+                    break
+                key = _converterKey(converter)
+                edge = node.dynamic.get(key)
+                if edge is None:
+                    edge = node.dynamic[key] = _SegmentEdge(converter)
+                node = edge.node
+            else:
+                node.terminal.append(_Entry(index, rule, tuple(names)))
+
+        self._root = root
+        self._ruleCount = _ruleCount(urlMap)
+        self.supported = supported
+
+    def match(self, segments, method):
+        # type: (List[bytes], bytes) -> Optional[Tuple[Rule, Dict[str, Any]]]
+        """
+        Match a request path.
+
+        @param segments: The path of the request, as a L{list} of URL-decoded
+            L{bytes} segments, like L{twisted.web.server.Request.postpath}.
+        @param method: The request method, as L{bytes}.
+
+        @return: A 2-L{tuple} of the matching rule and its converted
+            arguments, or L{None} if werkzeug must decide.
+
+        @raise NotFound: if no rule matches the path.
+        @raise MethodNotAllowed: if rules match the path but not the method.
+        """
+        if self._ruleCount != _ruleCount(self._map):
+            self.compile()
+        if not self.supported:
+            return None
+
+        method = method.upper()
+        trailing = False
+        if segments and not segments[-1]:
+            trailing = True
+            segments = segments[:-1]
+        for segment in segments:
+            if not segment:
+                # Repeated slashes are merged (with a redirect) by werkzeug.
+                return None
+            if b"/" in segment:
+                # An encoded slash, as in /a%2Fb, is decoded after the path
+                # is split, and werkzeug matches it as a separator.
+                return None
+
+        candidates = self._candidates(segments, trailing)
+        candidates.sort(key=lambda candidate: candidate[0].index)
+
+        haveMatchFor = set()  # type: Set[Text]
+        for entry, values, redirect in candidates:
+            methodAllowed = entry.methods is None or method in entry.methods
+            if redirect and methodAllowed:
+                return None
+            if not methodAllowed:
+                haveMatchFor.update(entry.rule.methods)
+                continue
+            return entry.rule, dict(zip(entry.names, values))
+
+        if haveMatchFor:
+            raise MethodNotAllowed(valid_methods=list(haveMatchFor))
+        raise NotFound()
+
+    def _candidates(self, segments, trailing):
+        # type: (Sequence[bytes], bool) -> List[_Candidate]
+        """
+        Find every rule whose pattern matches the given path.
+
+        @return: A L{list} of 3-L{tuple}s of an L{_Entry}, the converted
+            values of its arguments, and whether matching it requires a
+            redirect to add a trailing slash.
+        """
+        found = []  # type: List[_Candidate]
+        count = len(segments)
+        texts = [None] * count  # type: List[Optional[Text]]
+        stack = [
+            (self._root, 0, ())
+        ]  # type: List[Tuple[_Node, int, Tuple[Any, ...]]]
+
+        while stack:
+            node, position, values = stack.pop()
+
+            if node.rest and position < count:
+                for entry in node.rest:
+                    for i in range(position, count):
+                        if texts[i] is None:
+                            texts[i] = segments[i].decode("utf-8")
+                    rest = u"/".join(cast(List[Text], texts[position:]))
+                    if trailing and entry.strict:
+                        rest += u"/"
+                    found.append((entry, values + (rest,), False))
+
+            if position == count:
+                for entry in node.terminal:
+                    if entry.isLeaf:
+                        if trailing and entry.strict:
+                            continue
+                        found.append((entry, values, False))
+                    else:
+                        redirect = entry.strict and not trailing
+                        found.append((entry, values, redirect))
+                continue
+
+            segment = segments[position]
+            child = node.static.get(segment)
+            if child is not None:
+                stack.append((child, position + 1, values))
+
+            if node.dynamic:
+                text = texts[position]
+                if text is None:
+                    text = texts[position] = segment.decode("utf-8")
+                for edge in node.dynamic.values():
+                    value = edge.convert(text)
+                    if value is not edge:
+                        stack.append(
+                            (edge.node, position + 1, values + (value,))
+                        )
+
+        return found
+
+
+class MatchCache(object):
+    """
+    A bounded, least-recently-used cache of routing results.
+
+    Successful matches are cached as the endpoint, its converted arguments
+    and its segment count.  Requests that match no route (L{NotFound}) or no
+    route for their method (L{MethodNotAllowed}) are cached too, but in a
+    separate table of the same size, so that a flood of distinct bad paths
+    can't evict the good ones.  Redirects are never cached.
+
+    The cache is emptied whenever the number of rules in the map changes.
+
+    @ivar maxSize: The maximum number of entries in each table.
+    @ivar hits: The number of lookups answered from the cache.
+    @ivar misses: The number of lookups that had to be routed.
+    """
+
+    def __init__(self, urlMap, maxSize):
+        # type: (Map, int) -> None
+        self._map = urlMap
+        self._ruleCount = _ruleCount(urlMap)
+        self._matches = (
+            OrderedDict()
+        )  # type: OrderedDict[Hashable, Tuple[Any, ...]]
+        self._errors = (
+            OrderedDict()
+        )  # type: OrderedDict[Hashable, HTTPException]
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._matches) + len(self._errors)
+
+    def clear(self):
+        # type: () -> None
+        """
+        Forget all cached results.
+        """
+        self._matches.clear()
+        self._errors.clear()
+
+    def match(self, key, matcher):
+        # type: (Hashable, Callable[[], Tuple[Any, ...]]) -> Tuple[Any, ...]
+        """
+        Route a request, using a cached result if there is one.
+
+        @param key: A hashable description of everything routing depends on,
+            such as the method, host and path of the request.
+        @param matcher: A callable which routes the request when it isn't
+            cached, returning a 3-L{tuple} of the endpoint name, the
+            arguments for the endpoint and its segment count.
+
+        @return: The result of C{matcher}, possibly cached.
+
+        @raise NotFound: if no rule matches.
+        @raise MethodNotAllowed: if rules match, but not for the method.
+        """
+        ruleCount = _ruleCount(self._map)
+        if ruleCount != self._ruleCount:
+            self._ruleCount = ruleCount
+            self.clear()
+
+        result = self._matches.pop(key, None)
+        if result is not None:
+            self.hits += 1
+            self._matches[key] = result
+            return result
+
+        error = self._errors.pop(key, None)
+        if error is not None:
+            self.hits += 1
+            self._errors[key] = error
+            # Raise a copy, so that tracebacks don't accumulate on the
+            # cached exception.
+            raise copy(error)
+
+        self.misses += 1
+        try:
+            result = matcher()
+        except (NotFound, MethodNotAllowed) as e:
+            self._store(self._errors, key, copy(e))
+            raise
+        self._store(self._matches, key, result)
+        return result
+
+    def _store(self, table, key, value):
+        # type: (OrderedDict[Hashable, Any], Hashable, Any) -> None
+        table[key] = value
+        if len(table) > self.maxSize:
+            table.popitem(last=False)
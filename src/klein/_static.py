@@ -0,0 +1,428 @@
+# -*- test-case-name: klein.test.test_static -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Serving a directory of static files, such as a site's assets.
+"""
+
+import json
+import re
+from collections import OrderedDict
+from hashlib import sha256
+from io import BytesIO
+from typing import (
+    Callable,
+    Dict,
+    IO,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Text,
+    Tuple,
+    Union,
+)
+
+import attr
+
+from twisted.internet.interfaces import IReactorTime
+from twisted.python.filepath import FilePath, InsecurePath
+from twisted.web.iweb import IRequest
+
+from werkzeug.exceptions import NotFound
+
+from ._compression import _acceptedEncodings
+from ._file import (
+    FileInfo,
+    FileInfoCache,
+    FileResponse,
+    _Body,
+    _Path,
+    _Span,
+    _guessContentType,
+    _notFound,
+)
+
+
+__all__ = ()
+
+
+# A name such as app.0123abcd.js or app-0123456789abcdef.css, which changes
+# whenever the file's contents do.
+_FINGERPRINTED = re.compile(u"[.-][0-9a-f]{8,}\\.[^.]+\\Z")
+
+_IMMUTABLE = b"public, max-age=31536000, immutable"
+
+
+def isFingerprinted(name):
+    # type: (Text) -> bool
+    """
+    Does a file's name look like it includes a fingerprint of its contents,
+    such as the hexadecimal digits in C{app.0123abcd.js}?
+
+    This is only a guess from the name's shape: names stamped with a date
+    or number, such as C{report-20201017.pdf}, look the same.
+
+    @param name: The name of the file, as text.
+    """
+    return _FINGERPRINTED.search(name) is not None
+
+
+def _textPath(directory):
+    # type: (Union[_Path, FilePath]) -> FilePath
+    """
+    Convert a directory's path, as text, L{bytes} or a L{FilePath}, to a
+    L{FilePath} in text mode.
+    """
+    if not isinstance(directory, FilePath):
+        directory = FilePath(directory)
+    return directory.asTextMode()
+
+
+def _fingerprint(path, length, chunkSize=64 * 1024):
+    # type: (_Path, int, int) -> Text
+    """
+    Hash a file's contents.
+
+    @return: The first C{length} hexadecimal digits of the hash, as text.
+    """
+    digest = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunkSize), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def _fingerprintedName(name, fingerprint):
+    # type: (Text, Text) -> Optional[Text]
+    """
+    Put a fingerprint before the extension of a file's path, as in
+    C{css/site.0123abcd.css}.
+
+    @return: The fingerprinted path, or L{None} if the file's name has no
+        extension for the fingerprint to go before.
+    """
+    directory, slash, base = name.rpartition(u"/")
+    stem, dot, extension = base.rpartition(u".")
+    if not stem:
+        return None
+    return u"{}{}{}.{}.{}".format(
+        directory, slash, stem, fingerprint, extension
+    )
+
+
+def _namesDict(names):
+    # type: (Mapping[Text, Text]) -> Dict[Text, Text]
+    """
+    Copy the names given to L{AssetManifest}.
+    """
+    return dict(names)
+
+
+@attr.s(frozen=True)
+class AssetManifest(object):
+    """
+    Fingerprinted names for the files in a directory served by
+    L{Klein.static}, such as C{app.0123abcd.js} for C{app.js}, which change
+    whenever the files' contents do.
+
+    Files are served under their fingerprinted names as well as their own,
+    and may be cached by clients forever under them, and
+    L{Klein.urlFor} links to them by those names.  The names are worked out
+    once, so a file which changes afterwards keeps its old one until a new
+    manifest is made.
+
+    @ivar names: A L{dict} mapping the path of each file within the
+        directory, as text with C{/} separators, to its fingerprinted path.
+
+    @since: Klein NEXT
+    """
+
+    names = attr.ib(converter=_namesDict)  # type: Dict[Text, Text]
+    _sources = attr.ib(
+        init=False, cmp=False, repr=False
+    )  # type: Dict[Text, Text]
+
+    @_sources.default
+    def _reverseNames(self):
+        # type: () -> Dict[Text, Text]
+        return {
+            fingerprinted: name for name, fingerprinted in self.names.items()
+        }
+
+    @classmethod
+    def fromDirectory(cls, directory, length=8):
+        # type: (Union[_Path, FilePath], int) -> AssetManifest
+        """
+        Make a manifest by hashing every file in a directory, and its
+        subdirectories.  Files whose names have no extension, such as
+        C{LICENSE}, are left out.
+
+        @param directory: The directory, as a path or a L{FilePath}.
+
+        @param length: How many hexadecimal digits of each file's hash to
+            put in its name.
+        """
+        directory = _textPath(directory)
+        names = {}  # type: Dict[Text, Text]
+        for path in directory.walk():
+            if path == directory or not path.isfile():
+                continue
+            name = u"/".join(path.segmentsFrom(directory))
+            fingerprinted = _fingerprintedName(
+                name, _fingerprint(path.path, length)
+            )
+            if fingerprinted is not None:
+                names[name] = fingerprinted
+        return cls(names)
+
+    @classmethod
+    def load(cls, path):
+        # type: (Union[_Path, FilePath]) -> AssetManifest
+        """
+        Load a manifest saved by L{AssetManifest.save}, or made by a build
+        tool: a JSON object mapping the paths of files to their
+        fingerprinted paths.
+
+        @param path: The manifest's path, or L{FilePath}.
+        """
+        if not isinstance(path, FilePath):
+            path = FilePath(path)
+        names = json.loads(path.getContent().decode("utf-8"))
+        if not isinstance(names, dict):
+            raise ValueError(
+                "{} is not a JSON object of names".format(path.path)
+            )
+        return cls(names)
+
+    def save(self, path):
+        # type: (Union[_Path, FilePath]) -> None
+        """
+        Save the manifest as JSON, so that it can be loaded with
+        L{AssetManifest.load} rather than hashing every file again.
+
+        @param path: The manifest's path, or L{FilePath}.
+        """
+        if not isinstance(path, FilePath):
+            path = FilePath(path)
+        content = json.dumps(self.names, indent=2, sort_keys=True)
+        path.setContent(content.encode("ascii") + b"\n")
+
+    def fingerprinted(self, name):
+        # type: (Text) -> Text
+        """
+        Get the fingerprinted path of a file.
+
+        @param name: The file's path within the directory, as text with
+            C{/} separators.
+
+        @return: Its fingerprinted path, or C{name} itself if the manifest
+            doesn't have it.
+        """
+        return self.names.get(name, name)
+
+    def source(self, fingerprinted):
+        # type: (Text) -> Optional[Text]
+        """
+        Get the path of the file a fingerprinted path is for.
+
+        @return: The file's path, or L{None} if C{fingerprinted} isn't one of
+            the manifest's.
+        """
+        return self._sources.get(fingerprinted)
+
+
+@attr.s(frozen=True)
+class _CachedFileResponse(FileResponse):
+    """
+    A L{FileResponse} for a file whose contents are already in memory.
+
+    @ivar content: The contents of the file.
+    @ivar info: The L{klein._file.FileInfo} of the file they were read
+        with.
+    """
+
+    content = attr.ib(default=None)  # type: bytes
+    info = attr.ib(default=None)  # type: FileInfo
+
+    def _info(self):
+        # type: () -> Tuple[FileInfo, Optional[_Path], Optional[IO[bytes]]]
+        return self.info, self.file, BytesIO(self.content)
+
+    def _body(self, opened, spans):
+        # type: (IO[bytes], List[_Span]) -> _Body
+        # The whole file, or a single range of it, is written at once,
+        # rather than streamed; it's no larger than maxCachedSize.
+        if len(spans) == 1:
+            [(offset, length)] = spans
+            if length == len(self.content):
+                return self.content
+            end = offset + length
+            return self.content[offset:end]
+        return FileResponse._body(self, opened, spans)
+
+
+@attr.s
+class StaticFiles(object):
+    """
+    The files in a directory, served by a route added with L{Klein.static}.
+
+    Files are C{stat}ed at most once every C{statInterval} seconds, and
+    small files are kept in memory until they change.  Files with a C{.gz}
+    sibling at least as new as they are are served as that, with a
+    C{Content-Encoding}, to clients which accept C{gzip}.  Files named in
+    C{manifest} are served under their fingerprinted names too.
+
+    @ivar directory: The L{FilePath} of the directory.
+    @ivar maxAge: How many seconds clients may cache files for, or L{None}
+        to leave them to revalidate them with their validators.
+    @ivar immutable: A function called with the name of a file, as text,
+        which returns whether the file will never change, because its name
+        is a fingerprint of its contents, such as L{isFingerprinted}; or
+        L{None} if only the files requested by names in C{manifest} are.
+        Such files may be cached by clients for a year, without being
+        revalidated.
+    @ivar precompressed: Whether to serve C{.gz} siblings.
+    @ivar manifest: An L{AssetManifest} of the files, or L{None}.  Files
+        requested by the fingerprinted names in it are always served as
+        immutable.
+    @ivar maxCachedSize: The largest file, in bytes, to keep in memory.
+    @ivar cacheSize: How many bytes of files to keep in memory, in all.
+    @ivar statInterval: How often, in seconds, to check files for changes.
+    @ivar clock: The L{IReactorTime} used to decide when to check files.
+    """
+
+    directory = attr.ib(converter=_textPath)  # type: FilePath
+    maxAge = attr.ib(default=None)  # type: Optional[int]
+    immutable = attr.ib(default=None)  # type: Optional[Callable[[Text], bool]]
+    precompressed = attr.ib(default=True)  # type: bool
+    manifest = attr.ib(default=None)  # type: Optional[AssetManifest]
+    maxCachedSize = attr.ib(default=64 * 1024)  # type: int
+    cacheSize = attr.ib(default=8 * 1024 * 1024)  # type: int
+    statInterval = attr.ib(default=1.0)  # type: float
+    clock = attr.ib(default=None, cmp=False, repr=False)  # type: IReactorTime
+    _infos = attr.ib(init=False, cmp=False, repr=False)  # type: FileInfoCache
+    _contents = attr.ib(
+        init=False, factory=OrderedDict, cmp=False, repr=False
+    )  # type: OrderedDict[Text, Tuple[bytes, bytes]]
+    _cachedBytes = attr.ib(
+        init=False, default=0, cmp=False, repr=False
+    )  # type: int
+
+    def __attrs_post_init__(self):
+        # type: () -> None
+        self._infos = FileInfoCache(maxAge=self.statInterval, clock=self.clock)
+        self.clock = self._infos.clock
+
+    def _resolve(self, segments):
+        # type: (Sequence[Text]) -> FilePath
+        """
+        Find the file at the path made up of C{segments}, within the
+        directory.
+
+        @raise NotFound: If the path is empty, or leads out of the directory.
+        """
+        for segment in segments:
+            if segment in (u"", u".", u"..") or u"\0" in segment:
+                raise NotFound()
+        try:
+            return self.directory.descendant(segments)
+        except InsecurePath:
+            raise NotFound()
+
+    def _acceptsGzip(self, request):
+        # type: (IRequest) -> bool
+        values = request.requestHeaders.getRawHeaders(b"accept-encoding")
+        if not values:
+            return False
+        accepted = _acceptedEncodings(values)
+        return accepted.get(b"gzip", accepted.get(b"*", 0.0)) > 0
+
+    def _content(self, path, info):
+        # type: (Text, FileInfo) -> Optional[bytes]
+        """
+        Get the contents of a small file, from memory if they haven't
+        changed since they were last read.
+
+        @return: The contents, or L{None} if they couldn't be read whole.
+        """
+        entry = self._contents.pop(path, None)
+        if entry is not None:
+            etag, content = entry
+            if etag == info.etag:
+                self._contents[path] = entry
+                return content
+            self._cachedBytes -= len(content)
+        try:
+            with open(path, "rb") as f:
+                content = f.read(info.size + 1)
+        except EnvironmentError:
+            return None
+        if len(content) != info.size:
+            return None
+        self._contents[path] = (info.etag, content)
+        self._cachedBytes += len(content)
+        while self._cachedBytes > self.cacheSize:
+            _, (_, evicted) = self._contents.popitem(last=False)
+            self._cachedBytes -= len(evicted)
+        return content
+
+    def respond(self, request, segments):
+        # type: (IRequest, Sequence[Text]) -> FileResponse
+        """
+        Respond to a request for the file at the path made up of
+        C{segments}.
+
+        @param segments: The path's segments, as text.
+
+        @raise NotFound: If there's no such file.
+        """
+        immutable = self.immutable is not None and self.immutable(segments[-1])
+        if self.manifest is not None:
+            source = self.manifest.source(u"/".join(segments))
+            if source is not None:
+                segments = source.split(u"/")
+                immutable = True
+        path = self._resolve(segments).path
+        try:
+            info = self._infos.info(path)
+        except EnvironmentError as e:
+            _notFound(e)
+
+        headers = {}  # type: Dict[bytes, bytes]
+        if immutable:
+            headers[b"Cache-Control"] = _IMMUTABLE
+        elif self.maxAge is not None:
+            headers[b"Cache-Control"] = b"public, max-age=%d" % (self.maxAge,)
+        contentType = _guessContentType(path)
+
+        if self.precompressed:
+            headers[b"Vary"] = b"Accept-Encoding"
+            if self._acceptsGzip(request):
+                compressed = path + u".gz"
+                compressedInfo = None  # type: Optional[FileInfo]
+                try:
+                    compressedInfo = self._infos.info(compressed)
+                except EnvironmentError:
+                    pass
+                if (
+                    compressedInfo is not None
+                    and compressedInfo.lastModified >= info.lastModified
+                ):
+                    headers[b"Content-Encoding"] = b"gzip"
+                    path, info = compressed, compressedInfo
+
+        if info.size <= self.maxCachedSize:
+            content = self._content(path, info)
+            if content is not None:
+                return _CachedFileResponse(
+                    path,
+                    contentType=contentType,
+                    headers=headers,
+                    cache=self._infos,
+                    content=content,
+                    info=info,
+                )
+        return FileResponse(
+            path, contentType=contentType, headers=headers, cache=self._infos
+        )
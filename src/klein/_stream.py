@@ -0,0 +1,287 @@
+# -*- test-case-name: klein.test.test_stream -*-
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Streaming the items of iterables and asynchronous iterators returned by
+routes, as they're produced.
+"""
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
+
+from typing import Any, List, Optional, Union
+
+from twisted.internet.defer import Deferred, ensureDeferred
+from twisted.internet.interfaces import IPushProducer
+from twisted.python import log
+from twisted.python.compat import unicode
+from twisted.python.failure import Failure
+from twisted.web.iweb import IRequest
+
+from zope.interface import implementer
+
+
+__all__ = ()
+
+
+def isStreamable(result):
+    # type: (object) -> bool
+    """
+    Should the result of a route be streamed, item by item?
+
+    Asynchronous iterators, such as asynchronous generators, and iterables
+    other than strings and mappings are.
+    """
+    return isStreamableType(type(result))
+
+
+def isStreamableType(resultType):
+    # type: (type) -> bool
+    """
+    Should results of type C{resultType} be streamed?  See L{isStreamable}.
+    """
+    if hasattr(resultType, "__aiter__") and hasattr(resultType, "__anext__"):
+        return True
+    return hasattr(resultType, "__iter__") and not issubclass(
+        resultType, (bytes, unicode, bytearray, memoryview, Mapping)
+    )
+
+
+def byteView(buffer):
+    # type: (Any) -> Union[memoryview, bytes]
+    """
+    Get a view of the bytes of C{buffer}, such as a L{bytearray}, an
+    L{mmap.mmap} or a slice of a L{memoryview}, so that it can be written to
+    a request without being copied.
+
+    @param buffer: An object supporting the buffer protocol.
+
+    @return: A one-dimensional L{memoryview} of C{buffer}'s bytes, whose
+        length is their number.  Only a buffer which isn't contiguous has to
+        be copied, into L{bytes}.
+
+    @raise TypeError: If C{buffer} doesn't support the buffer protocol.
+    """
+    view = memoryview(buffer)
+    if view.ndim == 1 and view.itemsize == 1:
+        return view
+    if getattr(view, "c_contiguous", False):
+        return view.cast("B")
+    return view.tobytes()
+
+
+@implementer(IPushProducer)
+class _StreamProducer(object):
+    """
+    Write the items of an iterator, or asynchronous iterator, to a request
+    as they're produced, pausing while the transport's buffer is full.
+
+    @ivar done: A L{Deferred} which fires with L{None} once every item has
+        been written, or fails if the iterator or a write fails before the
+        response has started to be written.  Cancelling it stops producing
+        and closes the iterator.
+    """
+
+    def __init__(self, request, items):
+        # type: (IRequest, Any) -> None
+        self._request = request
+        self._asynchronous = hasattr(items, "__anext__")
+        self._items = items if self._asynchronous else iter(items)
+        self._paused = False
+        self._producing = False
+        self._stopped = False
+        self._waiting = None  # type: Optional[Deferred]
+        self.done = Deferred(lambda _: self.stopProducing())
+
+    def start(self):
+        # type: () -> Deferred
+        """
+        Register with the request and start writing items.
+
+        @return: L{_StreamProducer.done}
+        """
+        self._request.registerProducer(self, True)
+        self._produce()
+        return self.done
+
+    def _produce(self):
+        # type: () -> None
+        # Items are written in a loop, rather than recursively, so pausing
+        # and resuming from within a write, or items which are ready at
+        # once, don't grow the stack.
+        if self._producing:
+            return
+        self._producing = True
+        try:
+            while not (self._paused or self._stopped or self._waiting):
+                if self._asynchronous:
+                    outcome = []  # type: List[Any]
+                    waiting = ensureDeferred(self._items.__anext__())
+                    waiting.addBoth(outcome.append)
+                    if not outcome:
+                        self._waiting = waiting
+                        waiting.addCallback(lambda _: self._arrived(outcome[0]))
+                        return
+                    item = outcome[0]
+                else:
+                    try:
+                        item = next(self._items)
+                    except StopIteration:
+                        self._finish(None)
+                        return
+                    except Exception:
+                        item = Failure()
+                self._consume(item)
+        finally:
+            self._producing = False
+
+    def _arrived(self, item):
+        # type: (Any) -> None
+        self._waiting = None
+        if not self._stopped:
+            self._consume(item)
+            self._produce()
+
+    def _consume(self, item):
+        # type: (Any) -> None
+        if isinstance(item, Failure):
+            # StopAsyncIteration only exists, and can only end iteration, on
+            # Python 3, where asynchronous iterators do.
+            if self._asynchronous and item.check(StopAsyncIteration):
+                self._finish(None)
+            else:
+                self._finish(item)
+            return
+        try:
+            if isinstance(item, unicode):
+                item = item.encode("utf-8")
+            elif not isinstance(item, bytes):
+                try:
+                    item = byteView(item)
+                except TypeError:
+                    raise TypeError(
+                        "Can only stream bytes, text or buffers,"
+                        " not {!r}".format(item)
+                    )
+            self._request.write(item)
+        except Exception:
+            self._finish(Failure())
+
+    def _finish(self, result):
+        # type: (Optional[Failure]) -> None
+        if self._stopped:
+            return
+        self._stopped = True
+        self._unregister()
+        if not isinstance(result, Failure):
+            self._release()
+            self.done.callback(result)
+            return
+        self._close()
+        if getattr(self._request, "startedWriting", False):
+            # The status and part of the body have been sent, so an error
+            # page can't replace them, and appending one would corrupt the
+            # body.  Abort the connection instead, so that the client can
+            # tell the response is incomplete.
+            log.err(result, "Error streaming response")
+            self._abort()
+            self._release()
+            self.done.callback(None)
+        else:
+            self._release()
+            self.done.errback(result)
+
+    def _unregister(self):
+        # type: () -> None
+        # A request's channel is gone once its connection is lost.
+        if not getattr(self._request, "_disconnected", False):
+            self._request.unregisterProducer()
+
+    def _abort(self):
+        # type: () -> None
+        transport = getattr(self._request, "transport", None)
+        if transport is None:
+            return
+        abort = getattr(transport, "abortConnection", None)
+        if abort is None:
+            abort = transport.loseConnection
+        abort()
+
+    def _close(self):
+        # type: () -> None
+        """
+        Close the iterator, if it's a generator that hasn't finished.
+        """
+        try:
+            if self._asynchronous:
+                aclose = getattr(self._items, "aclose", None)
+                if aclose is not None:
+                    ensureDeferred(aclose()).addErrback(
+                        log.err, "Error closing streamed response"
+                    )
+            else:
+                close = getattr(self._items, "close", None)
+                if close is not None:
+                    close()
+        except Exception:
+            log.err(None, "Error closing streamed response")
+
+    def pauseProducing(self):
+        # type: () -> None
+        self._paused = True
+
+    def resumeProducing(self):
+        # type: () -> None
+        self._paused = False
+        if not self._stopped:
+            self._produce()
+
+    def stopProducing(self):
+        # type: () -> None
+        """
+        The response is no longer wanted: stop writing items, and close the
+        iterator.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self._unregister()
+        waiting, self._waiting = self._waiting, None
+        if waiting is not None:
+            waiting.cancel()
+        self._close()
+        self._release()
+
+    def _release(self):
+        # type: () -> None
+        # Like twisted.web.static's producers, let go of the request and the
+        # iterator once stopped: done's canceller refers back to this
+        # producer, and the cycle would otherwise keep them, and a file the
+        # iterator reads from, until the garbage collector breaks it.
+        self._request = None
+        self._items = None
+
+
+def streamResponse(request, items):
+    # type: (IRequest, Any) -> Deferred
+    """
+    Write the items of an iterable or asynchronous iterator of L{bytes} or
+    text to C{request}, as they're produced.
+
+    A push producer is registered on C{request}, so that while its
+    transport's buffer is full, no more items are asked for; streaming a
+    large response takes as little memory as its largest item.  When the
+    returned L{Deferred} is cancelled, typically because the client has
+    gone away, generators are closed, so that their C{finally} blocks run.
+
+    If the iterator fails, or an item can't be written, before the response
+    has started to be written, the returned L{Deferred} fails, so that the
+    error can be rendered instead.  Once it has, the error is logged and the
+    connection aborted, since the response can no longer be replaced.
+
+    @return: A L{Deferred} which fires with L{None} once every item has been
+        written, without finishing the request.
+    """
+    return _StreamProducer(request, items).start()
@@ -5,36 +5,100 @@ Extensions to Tubes.
 """
 
 from io import BytesIO
-from typing import BinaryIO, Iterable
+from typing import BinaryIO, Iterable, List, Optional
 
-from attr import attrib, attrs
+from attr import Factory, attrib, attrs
 from attr.validators import instance_of, optional, provides
 
-from tubes.itube import IDrain, IFount, ISegment
-from tubes.kit import Pauser, beginFlowingTo
+from tubes.itube import IDrain, IFount, IPause, ISegment
+from tubes.kit import Pauser, beginFlowingFrom, beginFlowingTo
 from tubes.undefer import fountToDeferred
 
 from twisted.internet.defer import Deferred
+from twisted.internet.interfaces import (
+    IDelayedCall,
+    IPushProducer,
+    IReactorTime,
+)
 from twisted.python.failure import Failure
+from twisted.web.iweb import IRequest
 
 from zope.interface import implementer
 
+from ._imessage import BodyTooLargeError
+
 
 __all__ = ()
 
 
 # See https://github.com/twisted/tubes/issues/60
-def fountToBytes(fount):
-    # type: (IFount) -> Deferred[bytes]
+def fountToBytes(fount, maxLength=None):
+    # type: (IFount, Optional[int]) -> Deferred[bytes]
+    """
+    Collect everything a fount delivers.
+
+    @param maxLength: The most bytes to collect.  Once the fount has
+        delivered more, its flow is stopped and the returned L{Deferred}
+        fails with L{BodyTooLargeError}.
+    """
+
     def collect(chunks):
         # type: (Iterable[bytes]) -> bytes
         return b"".join(chunks)
 
-    d = fountToDeferred(fount)
+    if maxLength is None:
+        d = fountToDeferred(fount)
+    else:
+        d = Deferred()
+        fount.flowTo(_BoundedAggregatingDrain(d, maxLength))
     d.addCallback(collect)
     return d
 
 
+@implementer(IDrain)
+class _BoundedAggregatingDrain(object):
+    """
+    Drain which collects what it receives into a list, up to a limit.
+    """
+
+    inputType = None
+    fount = None  # type: Optional[IFount]
+
+    def __init__(self, deferred, maxLength):
+        # type: (Deferred[List[bytes]], int) -> None
+        self._deferred = deferred
+        self._maxLength = maxLength
+        self._length = 0
+        self._chunks = []  # type: List[bytes]
+
+    def flowingFrom(self, fount):
+        # type: (Optional[IFount]) -> None
+        self.fount = fount
+
+    def receive(self, item):
+        # type: (bytes) -> float
+        if self._deferred.called:
+            return 0.0
+        self._length += len(item)
+        if self._length > self._maxLength:
+            self._chunks = []
+            if self.fount is not None:
+                self.fount.stopFlow()
+            self._deferred.errback(BodyTooLargeError(self._maxLength))
+            return 0.0
+        self._chunks.append(item)
+        return 0.0
+
+    def flowStopped(self, reason):
+        # type: (Failure) -> None
+        if self._deferred.called:
+            return
+        if reason.check(StopIteration):
+            self._deferred.callback(self._chunks)
+        else:
+            self._deferred.errback(reason)
+
+
 # See https://github.com/twisted/tubes/issues/60
 def bytesToFount(data):
     # type: (bytes) -> IFount
@@ -47,16 +111,32 @@ def bytesToFount(data):
 class IOFount(object):
     """
     Fount that reads from a file-like-object.
+
+    The source is read C{chunkSize} bytes at a time, and each chunk is
+    delivered to the drain before the next is read, so that a large body
+    (such as an upload spooled to a temporary file) needn't be in memory all
+    at once.  If the drain pauses the flow, reading stops until it's
+    resumed; the flow then carries on from the reactor rather than from
+    within the call that resumed it, so pausing and resuming from a drain
+    doesn't recurse.
     """
 
     outputType = ISegment
 
     _source = attrib()  # type: BinaryIO
+    chunkSize = attrib(
+        validator=instance_of(int), default=64 * 1024
+    )  # type: int
+    _reactor = attrib(default=None)  # type: Optional[IReactorTime]
 
     drain = attrib(
         validator=optional(provides(IDrain)), default=None, init=False
     )  # type: IDrain
     _paused = attrib(validator=instance_of(bool), default=False, init=False)
+    _stopped = attrib(validator=instance_of(bool), default=False, init=False)
+    _scheduled = attrib(
+        default=None, init=False
+    )  # type: Optional[IDelayedCall]
 
     def __attrs_post_init__(self):
         # type: () -> None
@@ -64,11 +144,14 @@ class IOFount(object):
 
     def _flowToDrain(self):
         # type: () -> None
-        if self.drain is not None and not self._paused:
-            data = self._source.read()
-            if data:
-                self.drain.receive(data)
-            self.drain.flowStopped(Failure(StopIteration()))
+        self._scheduled = None
+        while self.drain is not None and not self._paused and not self._stopped:
+            data = self._source.read(self.chunkSize)
+            if not data:
+                self._stopped = True
+                self.drain.flowStopped(Failure(StopIteration()))
+                return
+            self.drain.receive(data)
 
     def flowTo(self, drain):
         # type: (IDrain) -> IFount
@@ -77,12 +160,15 @@ class IOFount(object):
         return result
 
     def pauseFlow(self):
-        # type: () -> None
+        # type: () -> IPause
         return self._pauser.pause()
 
     def stopFlow(self):
         # type: () -> None
-        return self._pauser.resume()
+        self._stopped = True
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
 
     def _pause(self):
         # type: () -> None
@@ -91,4 +177,117 @@ class IOFount(object):
     def _resume(self):
         # type: () -> None
         self._paused = False
-        self._flowToDrain()
+        if self._scheduled is None and not self._stopped:
+            reactor = self._reactor
+            if reactor is None:
+                from twisted.internet import reactor as globalReactor
+
+                reactor = globalReactor
+            self._scheduled = reactor.callLater(0, self._flowToDrain)
+
+
+@implementer(IDrain, IPushProducer)
+@attrs(frozen=False)
+class RequestDrain(object):
+    """
+    Drain that writes segments to a request as they're received.
+
+    It's registered with the request as a push producer, so that its fount
+    is paused while the request's transport is backed up, and stopped if the
+    connection is lost.
+    """
+
+    inputType = ISegment
+
+    _request = attrib()  # type: IRequest
+
+    fount = attrib(
+        validator=optional(provides(IFount)), default=None, init=False
+    )  # type: Optional[IFount]
+    done = attrib(
+        default=Factory(lambda self: Deferred(self._cancel), takes_self=True),
+        init=False,
+    )  # type: Deferred[None]
+    _pause = attrib(default=None, init=False)  # type: Optional[IPause]
+    _stopped = attrib(validator=instance_of(bool), default=False, init=False)
+
+    def flowingFrom(self, fount):
+        # type: (Optional[IFount]) -> None
+        beginFlowingFrom(self, fount)
+
+    def receive(self, item):
+        # type: (bytes) -> float
+        if not self._stopped:
+            try:
+                self._request.write(item)
+            except Exception:
+                self._stopFount()
+                self._finish(Failure())
+        return 0.0
+
+    def flowStopped(self, reason):
+        # type: (Failure) -> None
+        if reason.check(StopIteration):
+            self._finish(None)
+        else:
+            self._finish(reason)
+
+    def _finish(self, result):
+        # type: (Optional[Failure]) -> None
+        if self._stopped:
+            return
+        self._stopped = True
+        self._unregister()
+        if result is None:
+            self.done.callback(None)
+        else:
+            self.done.errback(result)
+
+    def _unregister(self):
+        # type: () -> None
+        # A request's channel is gone once its connection is lost.
+        if not getattr(self._request, "_disconnected", False):
+            self._request.unregisterProducer()
+
+    def _stopFount(self):
+        # type: () -> None
+        if self.fount is not None:
+            self.fount.stopFlow()
+
+    def _cancel(self, done):
+        # type: (Deferred[None]) -> None
+        if not self._stopped:
+            self._stopped = True
+            self._unregister()
+            self._stopFount()
+
+    def pauseProducing(self):
+        # type: () -> None
+        if self._pause is None and self.fount is not None:
+            self._pause = self.fount.pauseFlow()
+
+    def resumeProducing(self):
+        # type: () -> None
+        pause, self._pause = self._pause, None
+        if pause is not None:
+            pause.unpause()
+
+    def stopProducing(self):
+        # type: () -> None
+        self.done.cancel()
+
+
+def fountToRequest(fount, request):
+    # type: (IFount, IRequest) -> Deferred[None]
+    """
+    Flow a fount of L{bytes} to a request, pausing it while the request's
+    transport is backed up.
+
+    @return: A L{Deferred} which fires with L{None} once the fount's flow has
+        stopped, without finishing the request, or fails if the flow failed.
+        Cancelling it stops the fount.
+    """
+    drain = RequestDrain(request=request)
+    request.registerProducer(drain, True)
+    fount.flowTo(drain)
+    return drain.done
@@ -0,0 +1,75 @@
+"""
+Tests for streaming asynchronous generators returned by routes, which need
+Python 3.6 or later.
+"""
+
+from typing import AsyncIterator, List
+
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from .test_resource import _render, requestMock
+from .. import Klein
+from .._resource import KleinResource
+
+
+class AsyncStreamedRouteTests(SynchronousTestCase):
+    """
+    Tests for streaming the asynchronous generators returned by routes.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.pending = []  # type: List[Deferred]
+        self.closed = []  # type: List[bool]
+
+        @self.app.route("/")
+        async def root(request):
+            # type: (IRequest) -> AsyncIterator[bytes]
+            try:
+                yield b"first "
+                for _ in range(2):
+                    d = Deferred()
+                    self.pending.append(d)
+                    yield await d
+            finally:
+                self.closed.append(True)
+
+    def test_streamed(self):
+        # type: () -> None
+        """
+        Each item is written as it's produced, while the generator waits on
+        L{Deferred}s in between.
+        """
+        request = requestMock(b"/")
+        done = _render(self.kr, request)
+
+        self.assertEqual(request.getWrittenData(), b"first ")
+        self.pending[0].callback(b"second ")
+        self.assertEqual(request.getWrittenData(), b"first second ")
+        self.assertNoResult(done)
+
+        self.pending[1].callback(u"third")
+        self.successResultOf(done)
+        self.assertEqual(request.getWrittenData(), b"first second third")
+        self.assertTrue(request.finished)
+        self.assertEqual(self.closed, [True])
+
+    def test_connectionLost(self):
+        # type: () -> None
+        """
+        When the connection is lost, what the generator is waiting on is
+        cancelled, and the generator closed.
+        """
+        request = requestMock(b"/")
+        done = _render(self.kr, request)
+
+        request.connectionLost(ConnectionLost())
+
+        self.failureResultOf(done, ConnectionLost)
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(len(self.pending), 1)
@@ -581,3 +581,25 @@ class KleinTestCase(unittest.TestCase):
         request.requestHeaders.removeHeader(b"host")
         with self.assertRaises(ValueError):
             app.urlFor(request, "bar", {"postid": 123}, force_external=True)
+
+
+class KleinRequestTests(unittest.TestCase):
+    """
+    Tests for L{KleinRequest}.
+    """
+
+    def test_compact(self):
+        """
+        L{KleinRequest} has no instance dictionary, and only makes its list
+        of branch segments when it's asked for.
+        """
+        kleinRequest = KleinRequest(requestMock(b"/"))
+        self.assertFalse(hasattr(kleinRequest, "__dict__"))
+        self.assertIsNone(kleinRequest._branchSegments)
+
+        self.assertEqual(kleinRequest.branch_segments, [""])
+        self.assertIdentical(
+            kleinRequest.branch_segments, kleinRequest.branch_segments
+        )
+        kleinRequest.branch_segments = ["", "a"]
+        self.assertEqual(kleinRequest.branch_segments, ["", "a"])
@@ -0,0 +1,467 @@
+"""
+Tests for L{klein._cache}.
+"""
+
+from __future__ import absolute_import, division
+
+from typing import Any, Iterator, List, Tuple
+
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+from twisted.internet.task import Clock
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from .test_resource import SimpleElement, _render, requestMock
+from .. import CachePolicy, FileResponse, Klein
+from .._cache import ResponseCache
+from .._resource import KleinResource
+
+
+class CachePolicyTests(SynchronousTestCase):
+    """
+    Tests for L{CachePolicy}.
+    """
+
+    def test_varyNormalized(self):
+        # type: () -> None
+        """
+        The names of the headers a policy varies on are normalized to
+        lower-case L{bytes}.
+        """
+        policy = CachePolicy(ttl=1, vary=[u"Accept-Language", b"Cookie"])
+        self.assertEqual(policy.vary, (b"accept-language", b"cookie"))
+
+
+class ResponseCacheTests(SynchronousTestCase):
+    """
+    Tests for caching the responses of routes with a L{CachePolicy}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.clock = Clock()
+        self.calls = []  # type: List[IRequest]
+
+    def route(self, url, policy, result=None, **kwargs):
+        # type: (str, CachePolicy, Any, **Any) -> ResponseCache
+        """
+        Add a route counting its calls, with a cache using C{self.clock}.
+        """
+
+        @self.app.route(url, cache=policy, **kwargs)
+        def handler(request):
+            # type: (IRequest) -> Any
+            self.calls.append(request)
+            if callable(result):
+                return result(request)
+            if result is None:
+                return u"call {}".format(len(self.calls))
+            return result
+
+        self.app.responseCaches["handler"].clock = self.clock
+        return self.app.responseCaches["handler"]
+
+    def get(self, path=b"/", **kwargs):
+        # type: (bytes, **Any) -> IRequest
+        request = requestMock(path, **kwargs)
+        # requestMock leaves the query out of the URI.
+        request.uri = path
+        self.successResultOf(_render(self.kr, request))
+        return request
+
+    def test_cached(self):
+        # type: () -> None
+        """
+        A successful response is served from the cache, with its headers,
+        until its time to live has passed.
+        """
+
+        def handler(request):
+            # type: (IRequest) -> bytes
+            request.setHeader(b"X-Thing", b"thing")
+            return b"body"
+
+        cache = self.route("/", CachePolicy(ttl=10), handler)
+
+        first = self.get()
+        self.clock.advance(9)
+        second = self.get()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.getWrittenData(), b"body")
+        self.assertEqual(second.code, 200)
+        self.assertEqual(
+            second.responseHeaders.getRawHeaders(b"x-thing"), [b"thing"]
+        )
+        self.assertEqual(
+            second.responseHeaders.getRawHeaders(b"content-length"), [b"4"]
+        )
+        self.assertEqual(first.getWrittenData(), b"body")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.clock.advance(1)
+        self.get()
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_renderedElement(self):
+        # type: () -> None
+        """
+        Responses written by rendering an element are cached too, and given a
+        C{Content-Length}.
+        """
+        self.route("/", CachePolicy(ttl=10), SimpleElement(u"hello"))
+
+        first = self.get()
+        second = self.get()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.getWrittenData(), first.getWrittenData())
+        self.assertIn(b"hello", second.getWrittenData())
+        self.assertEqual(
+            second.responseHeaders.getRawHeaders(b"content-length"),
+            [str(len(first.getWrittenData())).encode("ascii")],
+        )
+
+    def test_keyedByQueryAndVary(self):
+        # type: () -> None
+        """
+        Requests with different queries or values of the headers the policy
+        varies on are cached separately.
+        """
+        cache = self.route("/", CachePolicy(ttl=10, vary=["Accept-Language"]))
+
+        def getWith(path, language):
+            # type: (bytes, bytes) -> bytes
+            return self.get(
+                path, headers={b"Accept-Language": [language]}
+            ).getWrittenData()
+
+        self.assertEqual(getWith(b"/?a=1", b"en"), b"call 1")
+        self.assertEqual(getWith(b"/?a=1", b"fr"), b"call 2")
+        self.assertEqual(getWith(b"/?a=2", b"en"), b"call 3")
+        self.assertEqual(getWith(b"/?a=1", b"en"), b"call 1")
+        self.assertEqual(getWith(b"/?a=1", b"fr"), b"call 2")
+        self.assertEqual(len(cache), 3)
+
+    def test_staleWhileRevalidate(self):
+        # type: () -> None
+        """
+        Once a response expires, the next request refreshes it while the
+        stale response is served to others, until the refresh completes.
+        """
+        pending = []
+
+        def handler(request):
+            # type: (IRequest) -> Any
+            if len(self.calls) == 1:
+                return b"first"
+            pending.append(Deferred())
+            return pending[-1]
+
+        cache = self.route(
+            "/", CachePolicy(ttl=10, staleWhileRevalidate=5), handler
+        )
+        self.get()
+        self.clock.advance(11)
+
+        refreshing = requestMock(b"/")
+        _render(self.kr, refreshing)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.get().getWrittenData(), b"first")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(cache.staleHits, 1)
+
+        pending[0].callback(b"second")
+
+        self.assertEqual(refreshing.getWrittenData(), b"second")
+        self.assertEqual(self.get().getWrittenData(), b"second")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_staleExpires(self):
+        # type: () -> None
+        """
+        Responses aren't served once they are older than their time to live
+        and stale period together.
+        """
+        self.route("/", CachePolicy(ttl=10, staleWhileRevalidate=5))
+        self.get()
+        self.clock.advance(15)
+
+        self.assertEqual(self.get().getWrittenData(), b"call 2")
+
+    def test_head(self):
+        # type: () -> None
+        """
+        C{HEAD} requests are served from the cache, but don't fill it.
+        """
+        cache = self.route("/", CachePolicy(ttl=10))
+
+        self.get(method=b"HEAD")
+        self.assertEqual(len(cache), 0)
+
+        self.get()
+        request = self.get(method=b"HEAD")
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"6"]
+        )
+
+    def test_notCached(self):
+        # type: () -> None
+        """
+        Responses to requests with other methods or credentials, and
+        responses which fail, set a cookie or are private, aren't cached.
+        """
+
+        def handler(request):
+            # type: (IRequest) -> bytes
+            if request.args.get(b"code"):
+                request.setResponseCode(404)
+            if request.args.get(b"cookie"):
+                request.addCookie(b"a", b"b")
+            if request.args.get(b"private"):
+                request.setHeader(b"Cache-Control", b"Private, max-age=10")
+            return b"body"
+
+        cache = self.route(
+            "/", CachePolicy(ttl=10), handler, methods=["GET", "POST"]
+        )
+
+        for _ in range(2):
+            self.get(b"/?code=1")
+            self.get(b"/?cookie=1")
+            self.get(b"/?private=1")
+            self.get(b"/", method=b"POST")
+            self.get(b"/", headers={b"Authorization": [b"Basic eDp5"]})
+
+        self.assertEqual(len(self.calls), 10)
+        self.assertEqual(len(cache), 0)
+
+    def test_maxEntries(self):
+        # type: () -> None
+        """
+        Only the most recently used C{maxEntries} responses are kept.
+        """
+        cache = self.route("/", CachePolicy(ttl=10, maxEntries=2))
+
+        self.get(b"/?1")
+        self.get(b"/?2")
+        self.get(b"/?1")
+        self.get(b"/?3")
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(self.get(b"/?1").getWrittenData(), b"call 1")
+        self.assertEqual(self.get(b"/?2").getWrittenData(), b"call 4")
+
+    def test_boundInstances(self):
+        # type: () -> None
+        """
+        Apps bound to different instances cache their responses separately.
+        """
+
+        class Application(object):
+            app = Klein()
+
+            def __init__(self, name):
+                # type: (bytes) -> None
+                self.name = name
+
+            @app.route("/", cache=CachePolicy(ttl=10))
+            def home(self, request):
+                # type: (IRequest) -> bytes
+                return self.name
+
+        one, two = Application(b"one"), Application(b"two")
+        oneResource, twoResource = one.app.resource(), two.app.resource()
+
+        for resource, name in [
+            (oneResource, b"one"),
+            (twoResource, b"two"),
+            (oneResource, b"one"),
+        ]:
+            request = requestMock(b"/")
+            self.successResultOf(_render(resource, request))
+            self.assertEqual(request.getWrittenData(), name)
+
+        self.assertEqual(one.app.responseCaches["home"].hits, 1)
+        self.assertEqual(two.app.responseCaches["home"].hits, 0)
+
+
+class SingleFlightTests(SynchronousTestCase):
+    """
+    Tests for coalescing requests to routes with C{coalesce=True}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.calls = []  # type: List[Deferred]
+        self.cancelled = []  # type: List[Deferred]
+
+        @self.app.route("/", coalesce=True, methods=["GET", "POST"])
+        def handler(request):
+            # type: (IRequest) -> Deferred
+            request.setHeader(b"X-Call", str(len(self.calls)).encode("ascii"))
+            d = Deferred(self.cancelled.append)
+            self.calls.append(d)
+            return d
+
+        self.singleFlight = self.app.singleFlights["handler"]
+
+    def render(self, path=b"/", **kwargs):
+        # type: (bytes, **Any) -> Tuple[IRequest, Deferred]
+        request = requestMock(path, **kwargs)
+        request.uri = path
+        return request, _render(self.kr, request)
+
+    def test_coalesced(self):
+        # type: () -> None
+        """
+        Concurrent requests for the same URI share one call, and every one of
+        them gets its result and the headers it set.
+        """
+        leader, leaderDone = self.render()
+        follower, followerDone = self.render()
+        other, otherDone = self.render(b"/?other")
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.singleFlight.joined, 1)
+
+        self.calls[0].callback(b"shared")
+
+        for request, done in [(leader, leaderDone), (follower, followerDone)]:
+            self.successResultOf(done)
+            self.assertEqual(request.getWrittenData(), b"shared")
+            self.assertEqual(
+                request.responseHeaders.getRawHeaders(b"x-call"), [b"0"]
+            )
+        self.assertNoResult(otherDone)
+        self.assertEqual(len(self.singleFlight), 1)
+
+        self.render()
+        self.assertEqual(len(self.calls), 3)
+
+    def test_waiterDisconnects(self):
+        # type: () -> None
+        """
+        When a waiting request's connection is lost, including the request
+        whose call the others are waiting on, the call carries on for the
+        others.  It's only cancelled when nothing is waiting for it.
+        """
+        leader, leaderDone = self.render()
+        follower, followerDone = self.render()
+        last, lastDone = self.render()
+
+        for request, done in [(leader, leaderDone), (follower, followerDone)]:
+            request.connectionLost(ConnectionLost())
+            self.failureResultOf(done, ConnectionLost)
+        self.assertEqual(self.cancelled, [])
+
+        self.calls[0].callback(b"shared")
+        self.assertEqual(last.getWrittenData(), b"shared")
+
+        leader, leaderDone = self.render()
+        leader.connectionLost(ConnectionLost())
+        self.failureResultOf(leaderDone, ConnectionLost)
+        self.assertEqual(self.cancelled, [self.calls[1]])
+        self.assertEqual(len(self.singleFlight), 0)
+
+    def test_failure(self):
+        # type: () -> None
+        """
+        A failed call fails every waiting request.
+        """
+        leader, leaderDone = self.render()
+        follower, followerDone = self.render()
+
+        self.calls[0].errback(ZeroDivisionError())
+
+        self.assertEqual(leader.processingFailed.call_count, 1)
+        self.assertEqual(follower.processingFailed.call_count, 1)
+        self.flushLoggedErrors(ZeroDivisionError)
+
+    def test_notCoalesced(self):
+        # type: () -> None
+        """
+        Requests with other methods or with credentials aren't coalesced.
+        """
+        self.render()
+        self.render(method=b"POST")
+        self.render(headers={b"Authorization": [b"Basic eDp5"]})
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(self.singleFlight.joined, 0)
+
+    def test_notReplayable(self):
+        # type: () -> None
+        """
+        When the call's result is a generator, which can only be written
+        once, the first request gets it and the route is called again for
+        each of the others.
+        """
+        app = Klein()
+        kr = KleinResource(app)
+        calls = []  # type: List[Deferred]
+
+        @app.route("/", coalesce=True)
+        def handler(request):
+            # type: (IRequest) -> Deferred
+            d = Deferred()
+            calls.append(d)
+            return d
+
+        def rows():
+            # type: () -> Iterator[bytes]
+            yield b"row1\n"
+            yield b"row2\n"
+
+        requests = [requestMock(b"/") for _ in range(3)]
+        done = [_render(kr, request) for request in requests]
+        self.assertEqual(len(calls), 1)
+
+        calls[0].callback(rows())
+        self.assertEqual(len(calls), 3)
+        for d in calls[1:]:
+            d.callback(rows())
+
+        for request, d in zip(requests, done):
+            self.successResultOf(d)
+            self.assertEqual(request.getWrittenData(), b"row1\nrow2\n")
+        self.assertEqual(app.singleFlights["handler"].calls, 3)
+        self.assertEqual(app.singleFlights["handler"].joined, 2)
+
+    def test_fileResponse(self):
+        # type: () -> None
+        """
+        A L{FileResponse} of a file object isn't shared either, so that
+        each request is served the whole file.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(b"0123456789")
+        app = Klein()
+        kr = KleinResource(app)
+        ready = Deferred()  # type: Deferred
+
+        @app.route("/", coalesce=True)
+        def handler(request):
+            # type: (IRequest) -> Any
+            response = FileResponse(path.open())
+            if ready.called:
+                return response
+            return ready.addCallback(lambda _: response)
+
+        first, second = requestMock(b"/"), requestMock(b"/")
+        firstDone, secondDone = _render(kr, first), _render(kr, second)
+        ready.callback(None)
+
+        for request, d in [(first, firstDone), (second, secondDone)]:
+            self.successResultOf(d)
+            self.assertEqual(request.getWrittenData(), b"0123456789")
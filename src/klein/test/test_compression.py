@@ -0,0 +1,440 @@
+"""
+Tests for L{klein._compression}.
+"""
+
+from __future__ import absolute_import, division
+
+import zlib
+from hashlib import sha1
+from typing import Any, List, Optional, Tuple
+
+try:
+    from unittest.mock import Mock
+except Exception:
+    from mock import Mock
+
+from twisted.internet.defer import Deferred
+from twisted.python.compat import intToBytes
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import IRequest
+
+from .test_resource import SimpleElement, _render, requestMock
+from .. import CachePolicy, Compression, Klein
+from .._conditional import bodyETag
+from .._resource import KleinResource
+
+
+BODY = b"compressible " * 200
+
+
+def gunzip(data):
+    # type: (bytes) -> bytes
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class CompressionTests(SynchronousTestCase):
+    """
+    Tests for L{Compression}.
+    """
+
+    def negotiate(self, *acceptEncoding, **kwargs):
+        # type: (*bytes, **Any) -> Tuple[Optional[bytes], IRequest]
+        request = requestMock(
+            b"/", headers={b"Accept-Encoding": list(acceptEncoding)}
+        )
+        return Compression(**kwargs).negotiate(request), request
+
+    def test_negotiate(self):
+        # type: () -> None
+        """
+        The first of the offered content codings with the highest quality
+        in the request's C{Accept-Encoding} headers is chosen.
+        """
+        for values, expected in [
+            ([b"gzip, deflate"], b"gzip"),
+            ([b"deflate", b"gzip"], b"gzip"),
+            ([b"deflate, gzip;q=0.5"], b"deflate"),
+            ([b"GZIP ; Q=0.1, br"], b"gzip"),
+            ([b"gzip;q=0, deflate;q=0"], None),
+            ([b"*"], b"gzip"),
+            ([b"*;q=0.1, deflate"], b"deflate"),
+            ([b"gzip;q=0, *"], b"deflate"),
+            ([b"br, identity"], None),
+        ]:
+            self.assertEqual(self.negotiate(*values)[0], expected, values)
+
+        self.assertEqual(
+            self.negotiate(b"gzip, deflate", encodings=["deflate"])[0],
+            b"deflate",
+        )
+
+    def test_negotiateVary(self):
+        # type: () -> None
+        """
+        Negotiating adds C{Accept-Encoding} to the response's C{Vary}
+        header, whether or not the request accepts any content coding.
+        """
+        request = requestMock(b"/")
+        request.setHeader(b"Vary", b"Cookie")
+        self.assertIsNone(Compression().negotiate(request))
+        Compression().negotiate(request)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"vary"),
+            [b"Cookie", b"Accept-Encoding"],
+        )
+
+    def test_unsupportedEncoding(self):
+        # type: () -> None
+        """
+        Only C{gzip} and C{deflate} are supported.
+        """
+        self.assertRaises(ValueError, Compression, encodings=["br"])
+
+    def test_compressible(self):
+        # type: () -> None
+        """
+        Responses which are small, already compressed or unsuccessful aren't
+        worth compressing.
+        """
+        compression = Compression(minimumSize=10)
+        for code, headers, expected in [
+            (200, {}, True),
+            (200, {b"Content-Length": [b"10"]}, True),
+            (200, {b"Content-Length": [b"9"]}, False),
+            (200, {b"Content-Type": [b"text/html; charset=utf-8"]}, True),
+            (200, {b"Content-Type": [b"image/png"]}, False),
+            (200, {b"Content-Type": [b"image/svg+xml"]}, True),
+            (200, {b"Content-Type": [b"application/zip"]}, False),
+            (200, {b"Content-Encoding": [b"br"]}, False),
+            (404, {}, True),
+            (204, {}, False),
+            (206, {}, False),
+            (304, {}, False),
+        ]:
+            self.assertEqual(
+                compression.compressible(code, Headers(headers)),
+                expected,
+                (code, headers),
+            )
+
+    def test_compress(self):
+        # type: () -> None
+        """
+        L{Compression.compress} compresses a whole body.
+        """
+        compression = Compression()
+        self.assertEqual(gunzip(compression.compress(BODY, b"gzip")), BODY)
+        self.assertEqual(
+            zlib.decompress(compression.compress(BODY, b"deflate")), BODY
+        )
+
+
+class CompressedRouteTests(SynchronousTestCase):
+    """
+    Tests for compressing the responses of routes.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.calls = []  # type: List[IRequest]
+
+    def get(self, path=b"/", encoding=b"gzip", **kwargs):
+        # type: (bytes, Optional[bytes], **Any) -> IRequest
+        headers = kwargs.setdefault("headers", {})
+        if encoding is not None:
+            headers[b"Accept-Encoding"] = [encoding]
+        request = requestMock(path, **kwargs)
+        self.successResultOf(_render(self.kr, request))
+        return request
+
+    def assertCompressed(self, request, body=BODY, encoding=b"gzip"):
+        # type: (IRequest, bytes, bytes) -> None
+        headers = request.responseHeaders
+        self.assertEqual(headers.getRawHeaders(b"content-encoding"), [encoding])
+        self.assertFalse(headers.hasHeader(b"content-length"))
+        self.assertEqual(headers.getRawHeaders(b"vary"), [b"Accept-Encoding"])
+        if encoding == b"gzip":
+            self.assertEqual(gunzip(request.getWrittenData()), body)
+        else:
+            self.assertEqual(zlib.decompress(request.getWrittenData()), body)
+
+    def assertUncompressed(self, request, body=BODY):
+        # type: (IRequest, bytes) -> None
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-encoding"))
+        self.assertEqual(request.getWrittenData(), body)
+
+    def test_compressed(self):
+        # type: () -> None
+        """
+        The response to a request which accepts a content coding the route
+        offers is compressed with it.
+        """
+
+        @self.app.route("/", compress=True)
+        def root(request):
+            # type: (IRequest) -> bytes
+            return BODY
+
+        self.assertCompressed(self.get())
+        self.assertCompressed(
+            self.get(encoding=b"deflate"), encoding=b"deflate"
+        )
+        request = self.get(encoding=None)
+        self.assertUncompressed(request)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"),
+            [str(len(BODY)).encode("ascii")],
+        )
+
+    def test_notWorthCompressing(self):
+        # type: () -> None
+        """
+        Responses which are too small, or whose media type is already
+        compressed, aren't compressed.
+        """
+
+        @self.app.route("/small", compress=True)
+        def small(request):
+            # type: (IRequest) -> bytes
+            return b"small"
+
+        @self.app.route("/image", compress=True)
+        def image(request):
+            # type: (IRequest) -> bytes
+            request.setHeader(b"Content-Type", b"image/png")
+            return BODY
+
+        self.assertUncompressed(self.get(b"/small"), b"small")
+        self.assertUncompressed(self.get(b"/image"))
+
+    def test_streamed(self):
+        # type: () -> None
+        """
+        Bodies written in pieces are compressed as they're written, rather
+        than held until the response is finished.
+        """
+        pending = Deferred()
+        chunk = b"".join(sha1(intToBytes(i)).digest() for i in range(4096))
+
+        @self.app.route("/", compress=Compression(level=1))
+        def root(request):
+            # type: (IRequest) -> Deferred
+            request.write(chunk)
+            return pending
+
+        request = requestMock(b"/", headers={b"Accept-Encoding": [b"gzip"]})
+        done = _render(self.kr, request)
+        self.assertNoResult(done)
+        written = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+            request.getWrittenData()
+        )
+        self.assertTrue(written)
+        self.assertTrue(chunk.startswith(written))
+
+        pending.callback(BODY)
+        self.successResultOf(done)
+        self.assertCompressed(request, chunk + BODY)
+
+    def test_streamedFlushed(self):
+        # type: () -> None
+        """
+        While a streaming producer is registered, each piece of the body is
+        flushed as it's written, however small, so that clients can
+        decompress it before the response is finished.
+        """
+        pending = Deferred()
+
+        @self.app.route("/", compress=Compression(minimumSize=0))
+        def root(request):
+            # type: (IRequest) -> Deferred
+            request.registerProducer(Mock(), True)
+            request.write(b"event: tick\n\n")
+            return pending
+
+        request = requestMock(b"/", headers={b"Accept-Encoding": [b"gzip"]})
+        done = _render(self.kr, request)
+        self.assertNoResult(done)
+        self.assertFalse(request.finished)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(
+            decompressor.decompress(request.getWrittenData()),
+            b"event: tick\n\n",
+        )
+
+        request.unregisterProducer()
+        pending.callback(b"")
+        self.successResultOf(done)
+        self.assertCompressed(request, b"event: tick\n\n")
+
+    def test_smallWritesBuffered(self):
+        # type: () -> None
+        """
+        Without a streaming producer, small writes aren't flushed one by
+        one, but left to C{zlib} to compress together.
+        """
+
+        @self.app.route("/", compress=Compression(minimumSize=0))
+        def root(request):
+            # type: (IRequest) -> None
+            for _ in range(100):
+                request.write(b"row\n")
+
+        request = self.get()
+        self.assertCompressed(request, b"row\n" * 100)
+        self.assertEqual(request.writeCount, 2)
+
+    def test_empty(self):
+        # type: () -> None
+        """
+        A response without a body isn't encoded, and keeps its
+        C{Content-Length}.
+        """
+
+        @self.app.route("/", compress=Compression(minimumSize=0))
+        def root(request):
+            # type: (IRequest) -> bytes
+            request.setHeader(b"Content-Length", b"0")
+            return b""
+
+        request = self.get()
+        self.assertUncompressed(request, b"")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"0"]
+        )
+
+    def test_head(self):
+        # type: () -> None
+        """
+        The response to a C{HEAD} request isn't encoded, and keeps its
+        C{Content-Length}.
+        """
+
+        @self.app.route("/", compress=True, methods=["GET", "HEAD"])
+        def root(request):
+            # type: (IRequest) -> bytes
+            return BODY
+
+        request = self.get(method=b"HEAD")
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-encoding"))
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"),
+            [str(len(BODY)).encode("ascii")],
+        )
+
+    def test_renderedElement(self):
+        # type: () -> None
+        """
+        Rendered elements are compressed.
+        """
+
+        @self.app.route("/", compress=Compression(minimumSize=0))
+        def root(request):
+            # type: (IRequest) -> SimpleElement
+            return SimpleElement(u"hello")
+
+        request = self.get()
+        self.assertIn(b"hello", gunzip(request.getWrittenData()))
+
+    def test_appDefault(self):
+        # type: () -> None
+        """
+        Routes compress their responses as their app does, unless they say
+        otherwise.
+        """
+        self.app = Klein(compress=True)
+        self.kr = KleinResource(self.app)
+
+        @self.app.route("/")
+        def root(request):
+            # type: (IRequest) -> bytes
+            return BODY
+
+        @self.app.route("/plain", compress=False)
+        def plain(request):
+            # type: (IRequest) -> bytes
+            return BODY
+
+        self.assertCompressed(self.get())
+        self.assertUncompressed(self.get(b"/plain"))
+        self.assertFalse(self.get(b"/plain").responseHeaders.hasHeader(b"vary"))
+
+    def test_cachedCompressed(self):
+        # type: () -> None
+        """
+        Cached responses are stored already compressed, separately for each
+        content coding, so cache hits aren't compressed again.
+        """
+
+        @self.app.route("/", compress=True, cache=CachePolicy(ttl=10))
+        def root(request):
+            # type: (IRequest) -> bytes
+            self.calls.append(request)
+            return BODY
+
+        first = self.get()
+        second = self.get()
+        plain = self.get(encoding=None)
+        plainAgain = self.get(encoding=None)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.app.responseCaches["root"].hits, 2)
+        self.assertCompressed(first)
+        self.assertEqual(second.getWrittenData(), first.getWrittenData())
+        self.assertEqual(
+            second.responseHeaders.getRawHeaders(b"content-encoding"),
+            [b"gzip"],
+        )
+        self.assertEqual(
+            second.responseHeaders.getRawHeaders(b"content-length"),
+            [str(len(first.getWrittenData())).encode("ascii")],
+        )
+        self.assertUncompressed(plain)
+        self.assertUncompressed(plainAgain)
+
+    def test_etag(self):
+        # type: () -> None
+        """
+        The entity tag of a compressed response is weakened, since it
+        identifies the uncompressed body, and still matches it.
+        """
+
+        @self.app.route("/", compress=True, etag=True)
+        def root(request):
+            # type: (IRequest) -> bytes
+            return BODY
+
+        request = self.get()
+        self.assertCompressed(request)
+        etag = b"W/" + bodyETag(BODY)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"etag"), [etag])
+
+        request = self.get(headers={b"If-None-Match": [etag]})
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.getWrittenData(), b"")
+
+    def test_coalesced(self):
+        # type: () -> None
+        """
+        Requests sharing a call to a route are each compressed according to
+        their own C{Accept-Encoding} header.
+        """
+        pending = Deferred()
+
+        @self.app.route("/", compress=True, coalesce=True)
+        def root(request):
+            # type: (IRequest) -> Deferred
+            self.calls.append(request)
+            return pending
+
+        compressed = requestMock(b"/", headers={b"Accept-Encoding": [b"gzip"]})
+        plain = requestMock(b"/")
+        for request in (compressed, plain):
+            _render(self.kr, request)
+        pending.callback(BODY)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertCompressed(compressed)
+        self.assertUncompressed(plain)
@@ -0,0 +1,309 @@
+"""
+Tests for L{klein._conditional}.
+"""
+
+from __future__ import absolute_import, division
+
+from hashlib import sha1
+from typing import Any, Dict, List, Optional, Text
+
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.http import datetimeToString
+from twisted.web.iweb import IRequest
+
+from .test_resource import SimpleElement, _render, requestMock
+from .. import CachePolicy, Klein
+from .._conditional import bodyETag, notModified
+from .._resource import KleinResource
+
+
+class NotModifiedTests(SynchronousTestCase):
+    """
+    Tests for L{notModified}.
+    """
+
+    def check(
+        self,
+        headers,  # type: Dict[bytes, List[bytes]]
+        etag=None,  # type: Optional[bytes]
+        lastModified=None,  # type: Optional[float]
+        method=b"GET",  # type: bytes
+    ):
+        # type: (...) -> bool
+        request = requestMock(b"/", method=method, headers=headers)
+        return notModified(request, etag, lastModified)
+
+    def test_ifNoneMatch(self):
+        # type: () -> None
+        """
+        A request is not modified if any of the tags in its C{If-None-Match}
+        headers match, weakly, or it has the tag C{*}.
+        """
+        for value, expected in [
+            (b'"a"', True),
+            (b'"b", "a"', True),
+            (b'W/"a"', True),
+            (b"*", True),
+            (b'"b"', False),
+            (b'"ab"', False),
+        ]:
+            self.assertEqual(
+                self.check({b"If-None-Match": [value]}, etag=b'"a"'),
+                expected,
+                value,
+            )
+        self.assertTrue(
+            self.check({b"If-None-Match": [b'"b"', b'"a"']}, etag=b'"a"')
+        )
+        self.assertFalse(self.check({b"If-None-Match": [b"*"]}))
+
+    def test_ifModifiedSince(self):
+        # type: () -> None
+        """
+        A request is not modified if the response hasn't changed since its
+        C{If-Modified-Since} time.
+        """
+        since = {b"If-Modified-Since": [datetimeToString(1000)]}
+        self.assertTrue(self.check(since, lastModified=999.5))
+        self.assertTrue(self.check(since, lastModified=1000))
+        self.assertFalse(self.check(since, lastModified=1000.5))
+        self.assertFalse(self.check(since))
+        self.assertFalse(
+            self.check({b"If-Modified-Since": [b"garbage"]}, lastModified=1)
+        )
+
+    def test_ifNoneMatchTakesPrecedence(self):
+        # type: () -> None
+        """
+        If a request has an C{If-None-Match} header, its C{If-Modified-Since}
+        header is ignored.
+        """
+        headers = {
+            b"If-None-Match": [b'"b"'],
+            b"If-Modified-Since": [datetimeToString(1000)],
+        }
+        self.assertFalse(self.check(headers, etag=b'"a"', lastModified=1))
+
+    def test_otherMethods(self):
+        # type: () -> None
+        """
+        Only C{GET} and C{HEAD} requests are answered as not modified.
+        """
+        headers = {b"If-None-Match": [b'"a"']}
+        self.assertTrue(self.check(headers, etag=b'"a"', method=b"HEAD"))
+        self.assertFalse(self.check(headers, etag=b'"a"', method=b"POST"))
+
+
+class ConditionalRouteTests(SynchronousTestCase):
+    """
+    Tests for routes with the C{etag} and C{lastModified} options.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.calls = []  # type: List[Any]
+
+    def get(self, path=b"/", method=b"GET", **headers):
+        # type: (bytes, bytes, **bytes) -> IRequest
+        request = requestMock(
+            path,
+            method=method,
+            headers={
+                name.replace("_", "-").encode("ascii"): [value]
+                for name, value in headers.items()
+            },
+        )
+        self.successResultOf(_render(self.kr, request))
+        return request
+
+    def test_bodyETag(self):
+        # type: () -> None
+        """
+        With C{etag=True}, responses are tagged with a hash of their body,
+        and requests which already have it are answered with an empty C{304
+        Not Modified} response.
+        """
+
+        @self.app.route("/", etag=True)
+        def root(request):
+            # type: (IRequest) -> bytes
+            self.calls.append(request)
+            return b"body"
+
+        etag = b'"' + sha1(b"body").hexdigest().encode("ascii") + b'"'
+        self.assertEqual(bodyETag(b"body"), etag)
+
+        request = self.get()
+        self.assertEqual(request.getWrittenData(), b"body")
+        self.assertEqual(request.responseHeaders.getRawHeaders(b"etag"), [etag])
+
+        request = self.get(If_None_Match=etag)
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-length"))
+
+        request = self.get(If_None_Match=b'"other"')
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.getWrittenData(), b"body")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_bodyETagRenderedElement(self):
+        # type: () -> None
+        """
+        Rendered elements are tagged too, and given a C{Content-Length}.
+        """
+
+        @self.app.route("/", etag=True)
+        def root(request):
+            # type: (IRequest) -> SimpleElement
+            return SimpleElement(u"hello")
+
+        request = self.get()
+        body = request.getWrittenData()
+        self.assertIn(b"hello", body)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"etag"), [bodyETag(body)]
+        )
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"),
+            [str(len(body)).encode("ascii")],
+        )
+        self.assertEqual(self.get(If_None_Match=bodyETag(body)).code, 304)
+
+    def test_bodyETagOnlySuccess(self):
+        # type: () -> None
+        """
+        Unsuccessful responses aren't tagged.
+        """
+
+        @self.app.route("/", etag=True)
+        def root(request):
+            # type: (IRequest) -> bytes
+            request.setResponseCode(404)
+            return b"missing"
+
+        request = self.get()
+        self.assertEqual(request.getWrittenData(), b"missing")
+        self.assertFalse(request.responseHeaders.hasHeader(b"etag"))
+
+    def test_versionFunction(self):
+        # type: () -> None
+        """
+        With a version function, requests which already have the current
+        version are answered without calling the route.
+        """
+        versions = []
+
+        def version(request, name):
+            # type: (IRequest, Text) -> Text
+            versions.append(name)
+            return u"v1-" + name
+
+        @self.app.route("/<name>", etag=version)
+        def named(request, name):
+            # type: (IRequest, Text) -> Text
+            self.calls.append(name)
+            return name
+
+        request = self.get(b"/thing")
+        self.assertEqual(request.getWrittenData(), b"thing")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"etag"), [b'"v1-thing"']
+        )
+
+        request = self.get(b"/thing", If_None_Match=b'"v1-thing"')
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"etag"), [b'"v1-thing"']
+        )
+
+        self.assertEqual(self.calls, [u"thing"])
+        self.assertEqual(versions, [u"thing", u"thing"])
+
+    def test_lastModified(self):
+        # type: () -> None
+        """
+        With a C{lastModified} function, requests which have already seen the
+        current version according to their C{If-Modified-Since} header are
+        answered without calling the route.
+        """
+
+        @self.app.route("/", lastModified=lambda request: 1000)
+        def root(request):
+            # type: (IRequest) -> bytes
+            self.calls.append(request)
+            return b"body"
+
+        request = self.get()
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"last-modified"),
+            [datetimeToString(1000)],
+        )
+
+        request = self.get(If_Modified_Since=datetimeToString(1000))
+        self.assertEqual(request.code, 304)
+        request = self.get(If_Modified_Since=datetimeToString(999))
+        self.assertEqual(request.code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_otherMethods(self):
+        # type: () -> None
+        """
+        Requests with methods other than C{GET} and C{HEAD} aren't validated.
+        """
+
+        @self.app.route("/", methods=["POST"], etag=lambda request: b"v")
+        def root(request):
+            # type: (IRequest) -> bytes
+            return b"posted"
+
+        request = self.get(method=b"POST", If_None_Match=b'"v"')
+        self.assertEqual(request.getWrittenData(), b"posted")
+        self.assertFalse(request.responseHeaders.hasHeader(b"etag"))
+
+    def test_boundInstance(self):
+        # type: () -> None
+        """
+        Validator functions of routes on a class are called with the
+        instance, like the route.
+        """
+
+        class Application(object):
+            app = Klein()
+            version = b"1"
+
+            @app.route("/", etag=lambda self, request: self.version)
+            def root(self, request):
+                # type: (IRequest) -> bytes
+                return b"body"
+
+        application = Application()
+        application.version = b"7"
+        request = requestMock(b"/")
+        self.successResultOf(_render(application.app.resource(), request))
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"etag"), [b'"7"']
+        )
+
+    def test_cachedResponses(self):
+        # type: () -> None
+        """
+        Responses served from a route's response cache are validated too.
+        """
+
+        @self.app.route("/", etag=True, cache=CachePolicy(ttl=10))
+        def root(request):
+            # type: (IRequest) -> bytes
+            self.calls.append(request)
+            return b"body"
+
+        etag = self.get().responseHeaders.getRawHeaders(b"etag")[0]
+        request = self.get(If_None_Match=etag)
+
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.app.responseCaches["root"].hits, 1)
@@ -17,9 +17,13 @@ class PublicSymbolsTestCase(unittest.TestCase):
         """
         import klein as k
         import klein._app as a
+        import klein._cache as c
+        import klein._compression as z
         import klein._plating as p
 
         self.assertIdentical(k.Klein, a.Klein)
+        self.assertIdentical(k.CachePolicy, c.CachePolicy)
+        self.assertIdentical(k.Compression, z.Compression)
         self.assertIdentical(k.handle_errors, a.handle_errors)
         self.assertIdentical(k.route, a.route)
         self.assertIdentical(k.run, a.run)
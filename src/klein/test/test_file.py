@@ -0,0 +1,415 @@
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Tests for L{klein._file}.
+"""
+
+from __future__ import absolute_import, division
+
+import errno
+import io
+import os
+from email.parser import Parser
+from typing import Dict, List, Optional
+
+from twisted.internet.task import Clock
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.http import datetimeToString
+from twisted.web.iweb import IRequest
+
+from .test_resource import _render, requestMock
+from .. import FileResponse, Klein
+from .._file import FileInfoCache, parseRanges
+from .._resource import KleinResource
+
+
+class ParseRangesTests(SynchronousTestCase):
+    """
+    Tests for L{parseRanges}.
+    """
+
+    def test_ranges(self):
+        # type: () -> None
+        """
+        Ranges from one offset to another, from an offset to the end and of
+        the last so many bytes are parsed as half-open ranges, truncated to
+        the size of the file.
+        """
+        self.assertEqual(parseRanges([b"bytes=0-9"], 100), [(0, 10)])
+        self.assertEqual(parseRanges([b"bytes=90-"], 100), [(90, 100)])
+        self.assertEqual(parseRanges([b"bytes=-10"], 100), [(90, 100)])
+        self.assertEqual(parseRanges([b"bytes=-200"], 100), [(0, 100)])
+        self.assertEqual(parseRanges([b"bytes=50-200"], 100), [(50, 100)])
+        self.assertEqual(
+            parseRanges([b"Bytes = 1-2 , 4-5"], 100), [(1, 3), (4, 6)]
+        )
+
+    def test_merged(self):
+        # type: () -> None
+        """
+        Ranges are sorted, and overlapping and adjacent ones are merged.
+        """
+        self.assertEqual(
+            parseRanges([b"bytes=20-29,0-4,5-9,25-39"], 100),
+            [(0, 10), (20, 40)],
+        )
+
+    def test_unsatisfiable(self):
+        # type: () -> None
+        """
+        Ranges starting beyond the end of the file, and empty suffixes, are
+        dropped, which may leave none.
+        """
+        self.assertEqual(parseRanges([b"bytes=0-1,100-"], 100), [(0, 2)])
+        self.assertEqual(parseRanges([b"bytes=100-200"], 100), [])
+        self.assertEqual(parseRanges([b"bytes=-0"], 100), [])
+        self.assertEqual(parseRanges([b"bytes=-5"], 0), [])
+
+    def test_ignored(self):
+        # type: () -> None
+        """
+        Malformed headers, headers for other units and headers asking for
+        too many ranges are ignored.
+        """
+        for value in [
+            b"bytes",
+            b"bytes=",
+            b"bytes=,",
+            b"bytes=-",
+            b"bytes=5",
+            b"bytes=a-b",
+            b"bytes=5-1",
+            b"bytes=+1-2",
+            b"items=0-1",
+        ]:
+            self.assertIsNone(parseRanges([value], 100), value)
+        self.assertIsNone(parseRanges([b"bytes=0-1", b"bytes=2-3"], 100))
+        tooMany = b",".join(b"%d-%d" % (i, i) for i in range(0, 100, 2))
+        self.assertIsNone(parseRanges([b"bytes=" + tooMany], 100))
+
+
+class FileInfoCacheTests(SynchronousTestCase):
+    """
+    Tests for L{FileInfoCache}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.clock = Clock()
+        self.clock.advance(1000)
+        self.cache = FileInfoCache(maxAge=5, maxEntries=2, clock=self.clock)
+        self.path = FilePath(self.mktemp())
+        self.path.setContent(b"0123456789")
+
+    def test_cached(self):
+        # type: () -> None
+        """
+        What's known about a file is kept for C{maxAge} seconds, and then
+        it's C{stat}ed again.
+        """
+        info = self.cache.info(self.path.path)
+        self.assertEqual(info.size, 10)
+        self.assertEqual(info.lastModified, os.stat(self.path.path).st_mtime)
+        self.assertTrue(info.etag.startswith(b'"'))
+
+        self.path.setContent(b"changed")
+        self.clock.advance(4)
+        self.assertIs(self.cache.info(self.path.path), info)
+
+        self.clock.advance(1)
+        changed = self.cache.info(self.path.path)
+        self.assertEqual(changed.size, 7)
+        self.assertNotEqual(changed.etag, info.etag)
+
+    def test_missing(self):
+        # type: () -> None
+        """
+        Files which don't exist, and directories, can't be C{stat}ed, which
+        is remembered for C{maxAge} seconds too.
+        """
+        self.cache.info(self.path.path)
+        self.path.remove()
+        self.clock.advance(5)
+        self.assertRaises(OSError, self.cache.info, self.path.path)
+
+        self.path.setContent(b"back")
+        self.clock.advance(4)
+        self.assertRaises(OSError, self.cache.info, self.path.path)
+        self.clock.advance(1)
+        self.assertEqual(self.cache.info(self.path.path).size, 4)
+
+        error = self.assertRaises(OSError, self.cache.info, self.path.dirname())
+        self.assertEqual(error.errno, errno.EISDIR)
+
+    def test_bounded(self):
+        # type: () -> None
+        """
+        Only the C{maxEntries} files last C{stat}ed are remembered.
+        """
+        paths = []
+        for name in u"abc":
+            path = self.path.sibling(name)
+            path.setContent(b"x")
+            paths.append(path.path)
+            self.cache.info(path.path)
+        self.assertEqual(len(self.cache), 2)
+
+        first = self.cache.info(paths[1])
+        self.assertIs(self.cache.info(paths[1]), first)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+class FileResponseTests(SynchronousTestCase):
+    """
+    Tests for serving L{FileResponse}s.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.clock = Clock()
+        self.cache = FileInfoCache(clock=self.clock)
+        self.path = FilePath(self.mktemp() + u".txt")
+        self.path.setContent(b"0123456789")
+
+    def serve(
+        self,
+        response=None,  # type: Optional[FileResponse]
+        method=b"GET",  # type: bytes
+        headers=None,  # type: Optional[Dict[bytes, List[bytes]]]
+    ):
+        # type: (...) -> IRequest
+        """
+        Render a L{FileResponse}.
+
+        @return: The request.
+        """
+        if response is None:
+            response = FileResponse(self.path.path, cache=self.cache)
+
+        @self.app.route("/", methods=["GET", "HEAD"])
+        def root(request):
+            # type: (IRequest) -> Optional[FileResponse]
+            return response
+
+        request = requestMock(b"/", method=method, headers=headers)
+        self.successResultOf(_render(self.kr, request))
+        self.assertTrue(request.finished)
+        return request
+
+    def header(self, request, name):
+        # type: (IRequest, bytes) -> Optional[bytes]
+        values = request.responseHeaders.getRawHeaders(name)
+        return values[0] if values else None
+
+    def test_file(self):
+        # type: () -> None
+        """
+        A file is served whole, with its type, size and validators.
+        """
+        request = self.serve()
+
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.getWrittenData(), b"0123456789")
+        self.assertEqual(self.header(request, b"content-type"), b"text/plain")
+        self.assertEqual(self.header(request, b"content-length"), b"10")
+        self.assertEqual(self.header(request, b"accept-ranges"), b"bytes")
+        self.assertEqual(
+            self.header(request, b"etag"), self.cache.info(self.path.path).etag,
+        )
+        self.assertIsNotNone(self.header(request, b"last-modified"))
+
+    def test_chunks(self):
+        # type: () -> None
+        """
+        The file is written C{chunkSize} bytes at a time.
+        """
+        request = self.serve(
+            FileResponse(self.path, chunkSize=3, cache=self.cache)
+        )
+        self.assertEqual(request.getWrittenData(), b"0123456789")
+        self.assertEqual(request.writeCount, 4)
+
+    def test_fileObject(self):
+        # type: () -> None
+        """
+        A file object is served, and closed.
+        """
+        opened = self.path.open()
+        request = self.serve(FileResponse(opened, headers={u"X-Thing": u"1"}))
+
+        self.assertEqual(request.getWrittenData(), b"0123456789")
+        self.assertEqual(self.header(request, b"content-type"), b"text/plain")
+        self.assertEqual(self.header(request, b"x-thing"), b"1")
+        self.assertTrue(opened.closed)
+
+    def test_fileDescriptor(self):
+        # type: () -> None
+        """
+        A file descriptor is served as C{application/octet-stream}, without
+        caching what's known about it, and closed.
+        """
+        descriptor = os.open(self.path.path, os.O_RDONLY)
+        request = self.serve(FileResponse(descriptor, cache=self.cache))
+
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.getWrittenData(), b"0123456789")
+        self.assertEqual(
+            self.header(request, b"content-type"), b"application/octet-stream"
+        )
+        self.assertEqual(len(self.cache), 0)
+        self.assertRaises(OSError, os.fstat, descriptor)
+
+        opened = io.open(os.open(self.path.path, os.O_RDONLY), "rb")
+        request = self.serve(FileResponse(opened, contentType=b"text/csv"))
+        self.assertEqual(self.header(request, b"content-type"), b"text/csv")
+        self.assertTrue(opened.closed)
+
+    def test_contentType(self):
+        # type: () -> None
+        """
+        A given content type is used, and files whose type can't be guessed
+        are served as C{application/octet-stream}.
+        """
+        request = self.serve(
+            FileResponse(self.path, contentType=b"text/csv", cache=self.cache)
+        )
+        self.assertEqual(self.header(request, b"content-type"), b"text/csv")
+
+        path = self.path.sibling(u"archive.tar.gz")
+        path.setContent(b"")
+        request = self.serve(FileResponse(path, cache=self.cache))
+        self.assertEqual(
+            self.header(request, b"content-type"), b"application/octet-stream"
+        )
+
+    def test_notModified(self):
+        # type: () -> None
+        """
+        A request whose C{If-None-Match} header matches the file's entity
+        tag is answered with C{304 Not Modified}, without opening the file.
+        """
+        etag = self.cache.info(self.path.path).etag
+        self.path.remove()
+        request = self.serve(headers={b"If-None-Match": [etag]})
+
+        self.assertEqual(request.code, 304)
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertEqual(self.header(request, b"etag"), etag)
+
+    def test_range(self):
+        # type: () -> None
+        """
+        A request for a single range is answered with that range.
+        """
+        request = self.serve(headers={b"Range": [b"bytes=2-4"]})
+
+        self.assertEqual(request.code, 206)
+        self.assertEqual(request.getWrittenData(), b"234")
+        self.assertEqual(
+            self.header(request, b"content-range"), b"bytes 2-4/10"
+        )
+        self.assertEqual(self.header(request, b"content-length"), b"3")
+        self.assertEqual(self.header(request, b"content-type"), b"text/plain")
+
+    def test_multipleRanges(self):
+        # type: () -> None
+        """
+        A request for several ranges is answered with a
+        C{multipart/byteranges} body.
+        """
+        request = self.serve(headers={b"Range": [b"bytes=0-1,-2"]})
+
+        self.assertEqual(request.code, 206)
+        body = request.getWrittenData()
+        self.assertEqual(
+            self.header(request, b"content-length"), b"%d" % (len(body),)
+        )
+        [contentType] = request.responseHeaders.getRawHeaders(b"content-type")
+        contentType = contentType.decode("ascii")
+        message = Parser().parsestr(
+            u"Content-Type: {}\r\n\r\n{}".format(
+                contentType, body.decode("ascii")
+            )
+        )
+        self.assertEqual(message.get_content_type(), u"multipart/byteranges")
+        parts = message.get_payload()
+        self.assertEqual(
+            [
+                (
+                    part[u"content-range"],
+                    part.get_payload(),
+                    part[u"content-type"],
+                )
+                for part in parts
+            ],
+            [
+                (u"bytes 0-1/10", u"01", u"text/plain"),
+                (u"bytes 8-9/10", u"89", u"text/plain"),
+            ],
+        )
+
+    def test_unsatisfiable(self):
+        # type: () -> None
+        """
+        A request for ranges beyond the end of the file is answered with
+        C{416 Range Not Satisfiable}.
+        """
+        request = self.serve(headers={b"Range": [b"bytes=20-"]})
+
+        self.assertEqual(request.code, 416)
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertEqual(self.header(request, b"content-range"), b"bytes */10")
+
+    def test_ifRange(self):
+        # type: () -> None
+        """
+        A request's ranges are only served if its C{If-Range} header matches
+        the file's entity tag or modification date, and the whole file is
+        served otherwise.
+        """
+        os.utime(self.path.path, (1000000000, 1000000000))
+        info = self.cache.info(self.path.path)
+        for ifRange, code in [
+            (info.etag, 206),
+            (b"W/" + info.etag, 200),
+            (b'"other"', 200),
+            (datetimeToString(1000000000), 206),
+            (datetimeToString(999999999), 200),
+            (b"garbage", 200),
+        ]:
+            request = self.serve(
+                headers={b"Range": [b"bytes=0-0"], b"If-Range": [ifRange]}
+            )
+            self.assertEqual(request.code, code, ifRange)
+            expected = b"0" if code == 206 else b"0123456789"
+            self.assertEqual(request.getWrittenData(), expected)
+
+    def test_head(self):
+        # type: () -> None
+        """
+        A C{HEAD} request gets the headers a C{GET} request would, without a
+        body.
+        """
+        request = self.serve(method=b"HEAD", headers={b"Range": [b"bytes=1-"]})
+
+        self.assertEqual(request.code, 206)
+        self.assertEqual(self.header(request, b"content-length"), b"9")
+        self.assertEqual(request.getWrittenData(), b"")
+
+    def test_notFound(self):
+        # type: () -> None
+        """
+        Files which don't exist, and directories, aren't found.
+        """
+        request = self.serve(
+            FileResponse(self.path.sibling(u"missing"), cache=self.cache)
+        )
+        self.assertEqual(request.code, 404)
+        self.assertIsNone(self.header(request, b"accept-ranges"))
+
+        request = self.serve(FileResponse(self.path.parent(), cache=self.cache))
+        self.assertEqual(request.code, 404)
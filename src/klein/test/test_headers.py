@@ -367,6 +367,19 @@ class FrozenHTTPHeadersTests(GetValuesTestsMixIn, TestCase):
         headers = FrozenHTTPHeaders()
         self.assertEqual(headers.rawHeaders, ())
 
+    def test_commonNamesShared(self):
+        # type: () -> None
+        """
+        The normalized names of common headers are shared between messages,
+        however they were spelled.
+        """
+        first = FrozenHTTPHeaders(rawHeaders=((b"Content-Type", b"a"),))
+        second = FrozenHTTPHeaders(
+            rawHeaders=((u"content-type", u"b"),)  # type: ignore[arg-type]
+        )
+        self.assertIdentical(first.rawHeaders[0][0], second.rawHeaders[0][0])
+        self.assertEqual(list(second.getValues(b"CONTENT-TYPE")), [b"b"])
+
 
 class MutableHTTPHeadersTestsMixIn(GetValuesTestsMixIn):
     """
@@ -541,3 +554,42 @@ class MutableHTTPHeadersTests(MutableHTTPHeadersTestsMixIn, TestCase):
         """
         headers = MutableHTTPHeaders()
         self.assertEqual(headers.rawHeaders, ())
+
+    def test_lookupAfterChanges(self):
+        # type: () -> None
+        """
+        Looking headers up after adding and removing them reflects the
+        changes.
+        """
+        headers = MutableHTTPHeaders(rawHeaders=((b"a", b"1"), (b"b", b"2")))
+        self.assertEqual(list(headers.getValues(b"a")), [b"1"])
+
+        headers.addValue(b"a", b"3")
+        headers.addValue(u"c", u"4")
+        headers.remove(b"b")
+        headers.remove(b"missing")
+
+        self.assertEqual(list(headers.getValues(b"a")), [b"1", b"3"])
+        self.assertEqual(list(headers.getValues(u"c")), [u"4"])
+        self.assertEqual(list(headers.getValues(b"b")), [])
+        self.assertEqual(
+            headers.rawHeaders, ((b"a", b"1"), (b"a", b"3"), (b"c", b"4"))
+        )
+
+    def test_namesNormalized(self):
+        # type: () -> None
+        """
+        Header names are case-insensitive, and stored lower-cased, whether
+        they were given at init time or added later.
+        """
+        headers = MutableHTTPHeaders()
+        headers.addValue(b"X-Thing", b"1")
+        headers.addValue(u"X-THING", u"2")
+
+        self.assertEqual(
+            headers.rawHeaders, ((b"x-thing", b"1"), (b"x-thing", b"2"))
+        )
+        self.assertEqual(list(headers.getValues(b"x-Thing")), [b"1", b"2"])
+
+        headers.remove(u"X-Thing")
+        self.assertEqual(headers.rawHeaders, ())
@@ -5,7 +5,7 @@
 Tests for L{klein._headers}.
 """
 
-from typing import Text
+from typing import Callable, List, Text, Tuple
 
 from twisted.web.http_headers import Headers
 
@@ -84,3 +84,54 @@ class HTTPHeadersWrappingHeadersTests(MutableHTTPHeadersTestsMixIn, TestCase):
         self.assertEqual(
             sorted(headers.rawHeaders), sorted(normalizedRawHeaders)
         )
+
+    def test_viewsCached(self):
+        # type: () -> None
+        """
+        L{HTTPHeadersWrappingHeaders.rawHeaders}, and the values of headers
+        looked up by text names, are only rebuilt once the headers have been
+        changed.
+        """
+        webHeaders = Headers({b"a": [b"1"], b"b": [b"2"]})
+        headers = HTTPHeadersWrappingHeaders(headers=webHeaders)
+
+        rawHeaders = headers.rawHeaders
+        values = headers.getValues(u"a")
+        self.assertIdentical(headers.rawHeaders, rawHeaders)
+        self.assertIdentical(headers.getValues(u"a"), values)
+        self.assertEqual(list(values), [u"1"])
+
+        headers.addValue(u"a", u"3")
+        self.assertEqual(list(headers.getValues(u"a")), [u"1", u"3"])
+        self.assertEqual(
+            sorted(headers.rawHeaders),
+            [(b"a", b"1"), (b"a", b"3"), (b"b", b"2")],
+        )
+
+        headers.remove(b"a")
+        self.assertEqual(list(headers.getValues(u"a")), [])
+        self.assertEqual(headers.rawHeaders, ((b"b", b"2"),))
+
+    def test_valuesAfterDirectChange(self):
+        # type: () -> None
+        """
+        Once the wrapped L{Headers} are changed directly, the values of a
+        header looked up by a text name agree with those looked up by its
+        L{bytes} name, rather than being those cached before the change.
+        """
+        webHeaders = Headers({b"a": [b"1"]})
+        headers = HTTPHeadersWrappingHeaders(headers=webHeaders)
+        self.assertEqual(list(headers.getValues(u"a")), [u"1"])
+
+        changes = [
+            (lambda: webHeaders.addRawHeader(b"a", b"2"), [b"1", b"2"]),
+            (lambda: webHeaders.setRawHeaders(b"a", [b"3"]), [b"3"]),
+            (lambda: webHeaders.removeHeader(b"a"), []),
+        ]  # type: List[Tuple[Callable[[], None], List[bytes]]]
+        for change, expected in changes:
+            change()
+            self.assertEqual(list(headers.getValues(b"a")), expected)
+            self.assertEqual(
+                list(headers.getValues(u"a")),
+                [value.decode("ascii") for value in expected],
+            )
@@ -148,3 +148,32 @@ class FrozenHTTPMessageTestsMixIn(object):
         body2 = cast(TestCase, self).successResultOf(message.bodyAsBytes())
 
         cast(TestCase, self).assertIdentical(body1, body2)
+
+    @given(binary())
+    def test_bodyAsBufferFromBytes(self, data):
+        # type: (bytes) -> None
+        """
+        C{bodyAsBuffer} returns a read-only view of the bytes given to
+        C{__init__}, and the same view when called again.
+        """
+        message = self.messageFromBytes(data)
+        view = cast(TestCase, self).successResultOf(message.bodyAsBuffer())
+        again = cast(TestCase, self).successResultOf(message.bodyAsBuffer())
+
+        cast(TestCase, self).assertEqual(view.tobytes(), data)
+        cast(TestCase, self).assertTrue(view.readonly)
+        cast(TestCase, self).assertIdentical(view, again)
+
+    @given(binary())
+    def test_bodyAsBufferFromFount(self, data):
+        # type: (bytes) -> None
+        """
+        C{bodyAsBuffer} returns a view of the bytes from the fount given to
+        C{__init__}, which it shares with C{bodyAsBytes}.
+        """
+        message = self.messageFromFountFromBytes(data)
+        view = cast(TestCase, self).successResultOf(message.bodyAsBuffer())
+        body = cast(TestCase, self).successResultOf(message.bodyAsBytes())
+
+        cast(TestCase, self).assertEqual(view.tobytes(), data)
+        cast(TestCase, self).assertIdentical(view.obj, body)
@@ -5,7 +5,9 @@
 Tests for L{klein._irequest}.
 """
 
+from mmap import mmap
 from string import ascii_uppercase
+from tempfile import TemporaryFile
 from typing import Optional, Text
 
 from hyperlink import DecodedURL, EncodedURL
@@ -122,6 +124,20 @@ class HTTPRequestWrappingIRequestTests(TestCase):
             ),
         )
 
+    def test_uriNoHost(self):
+        # type: () -> None
+        """
+        Without a C{Host} header, L{HTTPRequestWrappingIRequest.uri} is of
+        the address the server received the request on, not the client's.
+        """
+        legacyRequest = self.legacyRequest(
+            path=b"/a", host=b"server.example", port=8080
+        )
+        legacyRequest.requestHeaders.removeHeader(b"host")
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+
+        self.assertEqual(request.uri.asText(), u"http://server.example:8080/a")
+
     def test_headers(self):
         # type: () -> None
         """
@@ -135,6 +151,19 @@ class HTTPRequestWrappingIRequestTests(TestCase):
             IHTTPHeaders, request.headers  # type: ignore[misc]
         )
 
+    def test_headersCached(self):
+        # type: () -> None
+        """
+        L{HTTPRequestWrappingIRequest.headers} is the same object each time
+        it's accessed, so the raw headers it has already built are reused.
+        """
+        legacyRequest = self.legacyRequest(headers={b"X-Thing": [b"1"]})
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+        rawHeaders = request.headers.rawHeaders
+
+        self.assertIs(request.headers, request.headers)
+        self.assertIs(request.headers.rawHeaders, rawHeaders)
+
     def test_bodyAsFountTwice(self):
         # type: () -> None
         """
@@ -172,3 +201,68 @@ class HTTPRequestWrappingIRequestTests(TestCase):
         body2 = self.successResultOf(request.bodyAsBytes())
 
         self.assertIdentical(body1, body2)
+
+    def test_bodyAsBuffer(self):
+        # type: () -> None
+        """
+        L{HTTPRequestWrappingIRequest.bodyAsBuffer} returns a read-only view
+        of the legacy request's content, leaving the fount available.
+        """
+        legacyRequest = self.legacyRequest(body=b"some data")
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+        view = self.successResultOf(request.bodyAsBuffer())
+
+        self.assertEqual(view.tobytes(), b"some data")
+        self.assertTrue(view.readonly)
+        self.assertIdentical(self.successResultOf(request.bodyAsBuffer()), view)
+        self.assertEqual(
+            self.successResultOf(request.bodyAsBytes()), b"some data"
+        )
+
+    def test_bodyAsBufferSpooled(self):
+        # type: () -> None
+        """
+        The content of a legacy request spooled to a file is memory mapped,
+        and stays readable once the file is closed.
+        """
+        legacyRequest = self.legacyRequest()
+        content = TemporaryFile()
+        content.write(b"spooled data")
+        content.seek(3)
+        legacyRequest.content = content
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+        view = self.successResultOf(request.bodyAsBuffer())
+
+        self.assertIsInstance(view.obj, mmap)
+        self.assertEqual(content.tell(), 3)
+        content.close()
+        self.assertEqual(view.tobytes(), b"spooled data")
+
+    def test_bodyAsBufferEmptyFile(self):
+        # type: () -> None
+        """
+        An empty file, which can't be memory mapped, gives an empty view.
+        """
+        legacyRequest = self.legacyRequest()
+        legacyRequest.content = TemporaryFile()
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+        self.assertEqual(
+            self.successResultOf(request.bodyAsBuffer()).tobytes(), b""
+        )
+
+    def test_bodyAsBufferAfterFount(self):
+        # type: () -> None
+        """
+        L{HTTPRequestWrappingIRequest.bodyAsBuffer} raises
+        L{FountAlreadyAccessedError} once the fount has been accessed,
+        unless the body was read with C{bodyAsBytes}.
+        """
+        request = HTTPRequestWrappingIRequest(request=self.legacyRequest())
+        request.bodyAsFount()
+        self.assertRaises(FountAlreadyAccessedError, request.bodyAsBuffer)
+
+        legacyRequest = self.legacyRequest(body=b"some data")
+        request = HTTPRequestWrappingIRequest(request=legacyRequest)
+        body = self.successResultOf(request.bodyAsBytes())
+        view = self.successResultOf(request.bodyAsBuffer())
+        self.assertIdentical(view.obj, body)
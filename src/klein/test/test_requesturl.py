@@ -0,0 +1,123 @@
+"""
+Tests for L{klein._requesturl}.
+"""
+
+from __future__ import absolute_import, division
+
+from typing import Text
+
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from .test_resource import requestMock
+from .. import Klein
+from .._dihttp import urlFromRequest
+from .._interfaces import IRequestURL
+from .._request_compat import HTTPRequestWrappingIRequest
+from .._requesturl import LazyRequestURL, requestURL
+
+
+class LazyRequestURLTests(SynchronousTestCase):
+    """
+    Tests for L{LazyRequestURL}.
+    """
+
+    def test_parts(self):
+        # type: () -> None
+        """
+        The scheme, host, port and path are worked out from the request
+        without parsing the whole URL.
+        """
+        request = requestMock(
+            b"/a%20b/c?d=e", host=b"example.com", port=8443, isSecure=True
+        )
+        url = LazyRequestURL(request)
+
+        self.assertEqual(url.scheme, u"https")
+        self.assertEqual(url.netloc, u"example.com:8443")
+        self.assertEqual(url.host, u"example.com")
+        self.assertEqual(url.port, 8443)
+        self.assertEqual(url.path, u"/a%20b/c")
+        self.assertIsNone(url._url)
+
+    def test_hostHeader(self):
+        # type: () -> None
+        """
+        The host and port are taken from the C{Host} header.
+        """
+        for header, host, port in [
+            (b"example.com", u"example.com", None),
+            (b"example.com:80", u"example.com", 80),
+            (b"example.com:", u"example.com", None),
+            (b"[::1]:8080", u"::1", 8080),
+            (b"[::1]", u"::1", None),
+        ]:
+            request = requestMock(b"/")
+            request.requestHeaders.setRawHeaders(b"host", [header])
+            url = LazyRequestURL(request)
+            self.assertEqual((url.host, url.port), (host, port), header)
+
+    def test_noHostHeader(self):
+        # type: () -> None
+        """
+        Without a C{Host} header, the client's address is used.
+        """
+        request = requestMock(b"/")
+        request.requestHeaders.removeHeader(b"host")
+        url = LazyRequestURL(request)
+
+        self.assertIsNone(url.netloc)
+        self.assertEqual(url.host, u"192.168.1.1")
+        self.assertEqual(url.port, 12344)
+
+    def test_url(self):
+        # type: () -> None
+        """
+        L{LazyRequestURL.url} is a L{DecodedURL}, parsed once.
+        """
+        request = requestMock(b"/a%20b", host=b"example.com", port=8080)
+        url = LazyRequestURL(request)
+
+        self.assertEqual(url.url.asText(), u"http://example.com:8080/a%20b")
+        self.assertEqual(url.url.path, (u"a b",))
+        self.assertIdentical(url.url, url.url)
+
+    def test_shared(self):
+        # type: () -> None
+        """
+        One L{LazyRequestURL} is stored on each request, and its URL shared
+        by L{urlFromRequest} and L{HTTPRequestWrappingIRequest.uri}.
+        """
+        request = requestMock(b"/")
+        url = requestURL(request)
+
+        self.assertIsInstance(url, LazyRequestURL)
+        self.assertIdentical(IRequestURL(request), url)
+        self.assertIdentical(requestURL(request), url)
+        self.assertIdentical(urlFromRequest(request), url.url)
+        self.assertIdentical(
+            HTTPRequestWrappingIRequest(request=request).uri, url.url
+        )
+        self.assertIsNot(requestURL(requestMock(b"/")), url)
+
+    def test_urlForScheme(self):
+        # type: () -> None
+        """
+        L{Klein.urlFor} builds external URLs with the request's scheme.
+        """
+        app = Klein()
+
+        @app.route("/user/<name>")
+        def userpage(request, name):
+            # type: (IRequest, Text) -> Text
+            return name
+
+        request = requestMock(
+            b"/", host=b"example.com", port=443, isSecure=True
+        )
+        self.assertEqual(
+            app.urlFor(
+                request, "userpage", {"name": "john"}, force_external=True
+            ),
+            "https://example.com/user/john",
+        )
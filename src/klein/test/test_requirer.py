@@ -1,4 +1,4 @@
-from typing import Iterable, List, Text, Tuple
+from typing import Any, Dict, Iterable, List, Text, Tuple
 
 from hyperlink import DecodedURL
 
@@ -12,6 +12,8 @@ from zope.interface import Interface
 
 from klein import Klein, RequestComponent, RequestURL, Requirer, Response
 
+from .test_resource import requestMock
+
 
 class BadlyBehavedHeaders(Headers):
     """
@@ -188,3 +190,60 @@ class ResponseTests(SynchronousTestCase):
             response.headers.getRawHeaders(b"X-Multi-Header"),
             [b"two", b"three"],
         )
+
+    def test_frozen(self):
+        # type: () -> None
+        """
+        A L{Response} made with L{Response.frozen} sets the same code and
+        headers as one made directly, and doesn't change if the mapping its
+        headers came from does.
+        """
+        headers = {
+            u"X-Single-Header": u"one \N{SNOWMAN}",
+            b"X-Multi-Header": [b"two", u"three"],
+        }  # type: Dict[Any, Any]
+        plain = Response(code=209, headers=headers, body=u"body")
+        frozen = Response.frozen(code=209, headers=headers, body=u"body")
+        self.assertEqual(frozen, plain)
+        headers[u"X-Added"] = u"later"
+
+        for response in (plain, frozen):
+            request = requestMock(b"/")
+            self.assertEqual(response._applyToRequest(request), u"body")
+            self.assertEqual(request.code, 209)
+            responseHeaders = request.responseHeaders
+            self.assertEqual(
+                responseHeaders.getRawHeaders(b"x-single-header"),
+                [u"one \N{SNOWMAN}".encode("utf-8")],
+            )
+            self.assertEqual(
+                responseHeaders.getRawHeaders(b"x-multi-header"),
+                [b"two", b"three"],
+            )
+        self.assertFalse(request.responseHeaders.hasHeader(b"x-added"))
+
+    def test_frozenWithBody(self):
+        # type: () -> None
+        """
+        L{Response.withBody} copies a frozen response, sharing its encoded
+        headers.
+        """
+        frozen = Response.frozen(headers={u"X-Header": u"value"})
+        response = frozen.withBody(b"new body")
+
+        self.assertEqual(response.body, b"new body")
+        self.assertIdentical(response._plan, frozen._plan)
+        request = requestMock(b"/")
+        self.assertEqual(response._applyToRequest(request), b"new body")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"x-header"), [b"value"]
+        )
+
+    def test_frozenInvalid(self):
+        # type: () -> None
+        """
+        L{Response.frozen} raises L{TypeError} for header names or values
+        which aren't text or bytes.
+        """
+        self.assertRaises(TypeError, Response.frozen, headers={1: u"one"})
+        self.assertRaises(TypeError, Response.frozen, headers={u"a": [1]})
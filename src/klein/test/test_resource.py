@@ -1,7 +1,11 @@
 from __future__ import absolute_import, division
 
+import json
 import os
+from array import array
+from ctypes import c_char
 from io import BytesIO
+from mmap import mmap
 
 try:
     from unittest.mock import Mock, call
@@ -13,26 +17,42 @@ from six.moves.urllib.parse import parse_qs
 from twisted.internet.defer import CancelledError, Deferred, fail, succeed
 from twisted.internet.error import ConnectionLost
 from twisted.internet.unix import Server
-from twisted.python.compat import _PY3, unicode
+from twisted.python.compat import _PY3, intToBytes, unicode
+from twisted.python.failure import Failure
 from twisted.trial.unittest import SynchronousTestCase
 from twisted.web import server
 from twisted.web.http_headers import Headers
-from twisted.web.resource import Resource
+from twisted.web.resource import IResource, Resource
 from twisted.web.static import File
 from twisted.web.template import Element, XMLString, renderer
 from twisted.web.test.test_web import DummyChannel
 
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import (
+    BadRequest,
+    MethodNotAllowed,
+    NotFound,
+    Unauthorized,
+)
+
+from zope.interface import directlyProvides
 
 from .util import EqualityTestsMixin
-from .. import Klein
+from .. import Klein, Response
+from .._headers import FrozenHTTPHeaders
+from .._imessage import BodyTooLargeError
 from .._interfaces import IKleinRequest
+from .._request_compat import HTTPRequestWrappingIRequest
 from .._resource import (
+    ErrorDispatcher,
     KleinResource,
+    ResultDispatcher,
     _URLDecodeError,
     _extractURLparts,
+    _httpExceptionResponse,
     ensure_utf8_bytes,
 )
+from .._response import FrozenHTTPResponse
+from .._tubes import bytesToFount
 
 
 def requestMock(
@@ -76,6 +96,7 @@ def requestMock(
 
     def registerProducer(producer, streaming):
         request.producer = producer
+        request.streamingProducer = streaming
         for _ in range(2):
             if request.producer:
                 request.producer.resumeProducing()
@@ -542,6 +563,142 @@ class KleinResourceTests(SynchronousTestCase):
         self.assertEqual(request.finishCount, 1)
         self.assertEqual(request.writeCount, 1)
 
+    def test_synchronousContentLength(self):
+        """
+        A synchronously returned body is written with a C{Content-Length}
+        header, and the request is finished without waiting on
+        C{notifyFinish}.
+        """
+        app = self.app
+        request = requestMock(b"/snowman")
+        request.notifyFinish = Mock(wraps=request.notifyFinish)
+
+        @app.route("/snowman")
+        def snowman(request):
+            return u"\u2603"
+
+        result = self.kr.render(request)
+
+        self.assertIs(result, server.NOT_DONE_YET)
+        self.assertTrue(request.finished)
+        self.assertEqual(request.getWrittenData(), b"\xE2\x98\x83")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"3"]
+        )
+        self.assertEqual(request.notifyFinish.call_count, 0)
+
+    def test_contentLengthNotReplaced(self):
+        """
+        A C{Content-Length} header set by the endpoint is left alone, as is
+        a response that the endpoint has already started writing.
+        """
+        app = self.app
+
+        @app.route("/explicit")
+        def explicit(request):
+            request.setHeader(b"Content-Length", b"10")
+            return b"abc"
+
+        @app.route("/started")
+        def started(request):
+            request.write(b"abc")
+            return b"def"
+
+        request = requestMock(b"/explicit")
+        self.assertFired(_render(self.kr, request))
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"10"]
+        )
+
+        request = requestMock(b"/started")
+        self.assertFired(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"abcdef")
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-length"))
+
+    def test_noContentLengthWithoutBody(self):
+        """
+        Responses whose code forbids a body don't get a C{Content-Length}.
+        """
+        app = self.app
+        request = requestMock(b"/")
+
+        @app.route("/")
+        def root(request):
+            request.setResponseCode(204)
+            return b""
+
+        self.assertFired(_render(self.kr, request))
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-length"))
+
+    def test_deferredNotifiesOnce(self):
+        """
+        A L{Deferred} returned by the endpoint is waited on with a single
+        call to C{notifyFinish}, and its result written with a
+        C{Content-Length}.
+        """
+        app = self.app
+        request = requestMock(b"/")
+        request.notifyFinish = Mock(wraps=request.notifyFinish)
+        result = Deferred()
+
+        @app.route("/")
+        def root(request):
+            return result
+
+        self.kr.render(request)
+        self.assertEqual(request.notifyFinish.call_count, 1)
+        self.assertFalse(request.finished)
+
+        result.callback(b"later")
+
+        self.assertTrue(request.finished)
+        self.assertEqual(request.getWrittenData(), b"later")
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"5"]
+        )
+
+    def test_fountRendering(self):
+        """
+        A fount returned by the endpoint is flowed to the request, which is
+        finished once the fount's flow stops.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            return bytesToFount(b"flowed")
+
+        request = requestMock(b"/")
+        self.assertFired(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b"flowed")
+        self.assertTrue(request.finished)
+        self.assertIsNone(request.producer)
+
+    def test_httpResponseRendering(self):
+        """
+        An L{IHTTPResponse} returned by the endpoint sets the status and
+        headers of the response, and its body is flowed to the request.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            return FrozenHTTPResponse(
+                status=201,
+                headers=FrozenHTTPHeaders(
+                    rawHeaders=((b"X-Thing", b"one"), (b"X-Thing", b"two"))
+                ),
+                body=bytesToFount(b"created"),
+            )
+
+        request = requestMock(b"/")
+        self.assertFired(_render(self.kr, request))
+
+        self.assertEqual(request.code, 201)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"x-thing"), [b"one", b"two"]
+        )
+        self.assertEqual(request.getWrittenData(), b"created")
+
     def test_staticRoot(self):
         app = self.app
 
@@ -892,6 +1049,36 @@ class KleinResourceTests(SynchronousTestCase):
         self.assertEqual(request.code, 404)
         self.assertEqual(request.getWrittenData(), b"Nothing found")
 
+    def test_errorHandlerRaises(self):
+        """
+        If an error handler raises an exception, that exception is handled by
+        the later error handlers.
+        """
+        app = self.app
+        request = requestMock(b"/")
+        failures = []
+
+        class HandlerError(Exception):
+            pass
+
+        @app.handle_errors(NotFound)
+        def handle_not_found(request, failure):
+            raise HandlerError()
+
+        @app.handle_errors(HandlerError)
+        def handle_handler_error(request, failure):
+            failures.append(failure)
+            request.setResponseCode(502)
+            return b"handled"
+
+        d = _render(self.kr, request)
+
+        self.assertFired(d)
+        [failure] = failures
+        self.assertIsInstance(failure.value, HandlerError)
+        self.assertEqual(request.code, 502)
+        self.assertEqual(request.getWrittenData(), b"handled")
+
     def test_requestWriteAfterFinish(self):
         app = self.app
         request = requestMock(b"/")
@@ -1168,6 +1355,273 @@ class KleinResourceTests(SynchronousTestCase):
         self.assertEqual(reported_length, actual_length)
 
 
+class NativeRouteTests(SynchronousTestCase):
+    """
+    Tests for routes which take an L{IHTTPRequest} and return an
+    L{IHTTPResponse}.
+    """
+
+    def setUp(self):
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.requests = []
+
+    def response(self, body=b"ok"):
+        return FrozenHTTPResponse(
+            status=201,
+            headers=FrozenHTTPHeaders(rawHeaders=((b"X-Thing", b"one"),)),
+            body=body,
+        )
+
+    def test_native(self):
+        """
+        The handler of a native route is called with an L{IHTTPRequest}
+        wrapping the request, and any arguments from the URL, and the
+        status, headers and body of the L{IHTTPResponse} it returns are
+        written to the request.
+        """
+
+        @self.app.route("/user/<name>", native=True)
+        def user(request, name):
+            self.requests.append(request)
+            return self.response(name.encode("ascii"))
+
+        request = requestMock(b"/user/bob")
+        self.successResultOf(_render(self.kr, request))
+
+        [wrapped] = self.requests
+        self.assertIsInstance(wrapped, HTTPRequestWrappingIRequest)
+        self.assertEqual(wrapped.method, u"GET")
+        self.assertEqual(request.code, 201)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"x-thing"), [b"one"]
+        )
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"), [b"3"]
+        )
+        self.assertEqual(request.getWrittenData(), b"bob")
+        self.assertTrue(request.finished)
+
+    def test_validatorsShareRequest(self):
+        """
+        A native route's validators are given the same L{IHTTPRequest} as
+        its handler.
+        """
+        validated = []
+
+        def etag(request):
+            validated.append(request)
+            return b'"v"'
+
+        def lastModified(request):
+            validated.append(request)
+            return 1000
+
+        @self.app.route("/", native=True, etag=etag, lastModified=lastModified)
+        def root(request):
+            self.requests.append(request)
+            return self.response()
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        [wrapped] = self.requests
+        self.assertIsInstance(wrapped, HTTPRequestWrappingIRequest)
+        self.assertEqual(len(validated), 2)
+        for other in validated:
+            self.assertIs(other, wrapped)
+
+    def test_reused(self):
+        """
+        A response with a L{bytes} body may be returned again and again.
+        """
+        response = self.response()
+
+        @self.app.route("/", native=True)
+        def root(request):
+            return response
+
+        for _ in range(2):
+            request = requestMock(b"/")
+            self.successResultOf(_render(self.kr, request))
+            self.assertEqual(request.getWrittenData(), b"ok")
+
+    def test_fount(self):
+        """
+        A response's body may be a fount, flowed to the request.
+        """
+
+        @self.app.route("/", native=True)
+        def root(request):
+            return self.response(bytesToFount(b"flowed"))
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"flowed")
+
+    def test_deferred(self):
+        """
+        The handler may return a L{Deferred} resulting in the response.
+        """
+        d = Deferred()
+
+        @self.app.route("/", native=True)
+        def root(request):
+            return d
+
+        request = requestMock(b"/")
+        rendered = _render(self.kr, request)
+        d.callback(self.response())
+
+        self.successResultOf(rendered)
+        self.assertEqual(request.code, 201)
+        self.assertEqual(request.getWrittenData(), b"ok")
+
+    def test_notResponse(self):
+        """
+        Anything else returned by the handler, or resulting from a
+        L{Deferred} it returns, fails the request with a L{TypeError}.
+        """
+
+        @self.app.route("/bytes", native=True)
+        def bytesRoute(request):
+            return b"not a response"
+
+        @self.app.route("/deferred", native=True)
+        def deferredRoute(request):
+            return succeed(b"not a response")
+
+        for path in (b"/bytes", b"/deferred"):
+            request = requestMock(path)
+            self.successResultOf(_render(self.kr, request))
+            self.assertEqual(request.processingFailed.call_count, 1)
+            self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+
+    def test_branchAndMethod(self):
+        """
+        Native routes may be branches, and methods of a class with a bound
+        app.
+        """
+
+        class Thing(object):
+            app = Klein()
+
+            @app.route("/", native=True, branch=True)
+            def root(this, request):
+                self.requests.append(request)
+                return self.response()
+
+        request = requestMock(b"/a/b")
+        self.successResultOf(_render(Thing().app.resource(), request))
+        self.assertEqual(request.getWrittenData(), b"ok")
+        self.assertIsInstance(self.requests[0], HTTPRequestWrappingIRequest)
+
+
+class MaxBodySizeTests(SynchronousTestCase):
+    """
+    Tests for limiting the size of the request bodies routes accept.
+    """
+
+    def setUp(self):
+        self.app = Klein(maxBodySize=10)
+        self.kr = KleinResource(self.app)
+        self.calls = []
+
+        @self.app.route("/", methods=["POST"])
+        def root(request):
+            self.calls.append(request)
+            return b"accepted"
+
+        @self.app.route("/large", methods=["POST"], maxBodySize=100)
+        def large(request):
+            self.calls.append(request)
+            return b"accepted"
+
+    def post(self, path, body, headers=None):
+        request = requestMock(path, b"POST", body=body, headers=headers)
+        self.successResultOf(_render(self.kr, request))
+        return request
+
+    def test_declaredLength(self):
+        """
+        A request whose C{Content-Length} is larger than the route accepts
+        is answered with C{413 Request Entity Too Large}, without calling
+        the route.
+        """
+        request = self.post(
+            b"/", b"x" * 11, headers={b"Content-Length": [b"11"]}
+        )
+        self.assertEqual(request.code, 413)
+        self.assertEqual(self.calls, [])
+
+        request = self.post(
+            b"/", b"x" * 10, headers={b"Content-Length": [b"10"]}
+        )
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.getWrittenData(), b"accepted")
+
+    def test_chunked(self):
+        """
+        A request without a C{Content-Length}, whose body was sent in
+        chunks, is measured by the body received.
+        """
+        request = self.post(b"/", b"x" * 11)
+        self.assertEqual(request.code, 413)
+        self.assertEqual(self.calls, [])
+
+    def test_routeLimit(self):
+        """
+        A route's own limit overrides the app's.
+        """
+        request = self.post(b"/large", b"x" * 50)
+        self.assertEqual(request.code, 200)
+        self.assertEqual(len(self.calls), 1)
+
+        request = self.post(b"/large", b"x" * 101)
+        self.assertEqual(request.code, 413)
+
+    def test_bodyAsBytes(self):
+        """
+        Reading more of the body than the route accepts through
+        L{HTTPRequestWrappingIRequest.bodyAsBytes} fails with
+        L{BodyTooLargeError}, even if
+        the C{Content-Length} understated it.
+        """
+        results = []
+
+        @self.app.route("/read", methods=["POST"])
+        def read(request):
+            d = HTTPRequestWrappingIRequest(request=request).bodyAsBytes()
+            d.addBoth(results.append)
+            return b""
+
+        self.post(b"/read", b"x" * 20, headers={b"Content-Length": [b"5"]})
+        self.assertEqual(len(results), 1)
+        results[0].trap(BodyTooLargeError)
+
+        self.post(b"/read", b"x" * 5)
+        self.assertEqual(results[1], b"x" * 5)
+
+    def test_bodyAsBuffer(self):
+        """
+        L{HTTPRequestWrappingIRequest.bodyAsBuffer} fails with
+        L{BodyTooLargeError} if the body is larger than the route accepts.
+        """
+        results = []
+
+        @self.app.route("/read", methods=["POST"])
+        def read(request):
+            d = HTTPRequestWrappingIRequest(request=request).bodyAsBuffer()
+            d.addBoth(results.append)
+            return b""
+
+        self.post(b"/read", b"x" * 20, headers={b"Content-Length": [b"5"]})
+        results[0].trap(BodyTooLargeError)
+
+        self.post(b"/read", b"x" * 5)
+        self.assertEqual(results[1].tobytes(), b"x" * 5)
+
+
 class ExtractURLpartsTests(SynchronousTestCase):
     """
     Tests for L{klein.resource._extractURLparts}.
@@ -1264,6 +1718,553 @@ class ExtractURLpartsTests(SynchronousTestCase):
         self.assertIsInstance(script_name, unicode)
 
 
+class HTTPExceptionResponseTests(SynchronousTestCase):
+    """
+    Tests for L{_httpExceptionResponse}.
+    """
+
+    def test_routingFailuresComputedOnce(self):
+        """
+        The response to a routing failure is only computed once.
+        """
+        first = _httpExceptionResponse(MethodNotAllowed([u"GET", u"HEAD"]))
+        second = _httpExceptionResponse(MethodNotAllowed([u"GET", u"HEAD"]))
+        self.assertIs(first, second)
+        code, headers, body = first
+        self.assertEqual(code, 405)
+        self.assertIn((b"Allow", b"GET, HEAD"), headers)
+        self.assertIn(b"405 Method Not Allowed", body)
+
+    def test_cannedByDescription(self):
+        """
+        Responses to werkzeug's exceptions are cached by their class, code and
+        description.
+        """
+        first = _httpExceptionResponse(BadRequest(u"Bad thing."))
+        self.assertIs(_httpExceptionResponse(BadRequest(u"Bad thing.")), first)
+        other = _httpExceptionResponse(BadRequest(u"Worse thing."))
+        self.assertIsNot(other, first)
+        self.assertIn(b"Worse thing.", other[2])
+
+    def test_customResponsesNotCanned(self):
+        """
+        Responses to exceptions whose headers depend on more than their
+        description, or which carry their own response, aren't cached.
+        """
+        unauthorized = Unauthorized(www_authenticate=[u"Basic"])
+        self.assertIsNot(
+            _httpExceptionResponse(unauthorized),
+            _httpExceptionResponse(unauthorized),
+        )
+        code, headers, body = _httpExceptionResponse(unauthorized)
+        self.assertIn((b"WWW-Authenticate", b"Basic"), headers)
+
+        class CustomNotFound(NotFound):
+            def get_body(self, environ=None):
+                return u"custom"
+
+        self.assertEqual(_httpExceptionResponse(CustomNotFound())[2], b"custom")
+
+    def test_json(self):
+        """
+        With the C{"json"} format, the body is a compact JSON object, and any
+        other headers of the exception are kept.
+        """
+        code, headers, body = _httpExceptionResponse(
+            MethodNotAllowed([u"GET"]), "json"
+        )
+        self.assertEqual(code, 405)
+        self.assertEqual(
+            body,
+            b'{"code":405,"description":'
+            b'"The method is not allowed for the requested URL.",'
+            b'"name":"Method Not Allowed"}',
+        )
+        self.assertEqual(
+            list(headers),
+            [
+                (b"Content-Type", b"application/json"),
+                (b"Allow", b"GET"),
+                (b"Content-Length", intToBytes(len(body))),
+            ],
+        )
+
+    def test_text(self):
+        """
+        With the C{"text"} format, the body is a line of plain text.
+        """
+        code, headers, body = _httpExceptionResponse(
+            NotFound(u"No such thing."), "text"
+        )
+        self.assertEqual(code, 404)
+        self.assertEqual(body, b"404 Not Found: No such thing.")
+        self.assertEqual(
+            list(headers),
+            [
+                (b"Content-Type", b"text/plain; charset=utf-8"),
+                (b"Content-Length", b"29"),
+            ],
+        )
+
+
+class ErrorBodyFormatTests(SynchronousTestCase):
+    """
+    Tests for the C{errorBodyFormat} option of L{Klein}.
+    """
+
+    def test_notFound(self):
+        """
+        Unhandled C{HTTPException}s are rendered in the app's format.
+        """
+        app = Klein(errorBodyFormat="json")
+        request = requestMock(b"/missing")
+
+        d = _render(KleinResource(app), request)
+
+        self.assertEqual(self.successResultOf(d), None)
+        self.assertEqual(request.code, 404)
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-type"),
+            [b"application/json"],
+        )
+        self.assertIn(b'"code":404', request.getWrittenData())
+
+    def test_boundApp(self):
+        """
+        Apps bound to an instance have the same format.
+        """
+
+        class Application(object):
+            app = Klein(errorBodyFormat="text")
+
+        self.assertEqual(Application().app._errorBodyFormat, "text")
+
+    def test_invalidFormat(self):
+        """
+        An unknown format is rejected.
+        """
+        self.assertRaises(ValueError, Klein, errorBodyFormat="xml")
+
+
+class ErrorDispatcherTests(SynchronousTestCase):
+    """
+    Tests for L{ErrorDispatcher}.
+    """
+
+    def failureOf(self, exception):
+        try:
+            raise exception
+        except Exception:
+            return Failure()
+
+    def test_findInDefinitionOrder(self):
+        """
+        L{ErrorDispatcher.find} returns the index of the first handler from
+        C{start} onwards whose exception types match the failure, including
+        by a base class.
+        """
+        handlers = [
+            ([KeyError], "key"),
+            ([ValueError, LookupError], "value or lookup"),
+            ([Exception], "any"),
+        ]
+        dispatcher = ErrorDispatcher(handlers)
+        keyError = self.failureOf(KeyError())
+        valueError = self.failureOf(ValueError())
+
+        self.assertEqual(dispatcher.find(keyError), 0)
+        self.assertEqual(dispatcher.find(keyError, 1), 1)
+        self.assertEqual(dispatcher.find(keyError, 2), 2)
+        self.assertIsNone(dispatcher.find(keyError, 3))
+        self.assertEqual(dispatcher.find(valueError), 1)
+        self.assertEqual(dispatcher.find(self.failureOf(TypeError())), 2)
+
+    def test_agreesWithCheck(self):
+        """
+        L{ErrorDispatcher.find} finds the same handler as calling
+        L{Failure.check} with each handler's exception types in turn.
+        """
+        handlers = [
+            ([NotFound], None),
+            ([ZeroDivisionError, KeyError], None),
+            ([ArithmeticError], None),
+            ([LookupError], None),
+            ([RuntimeError], None),
+        ]
+        dispatcher = ErrorDispatcher(handlers)
+        for exception in [
+            NotFound(),
+            ZeroDivisionError(),
+            OverflowError(),
+            KeyError(),
+            IndexError(),
+            NotImplementedError(),
+            ValueError(),
+        ]:
+            reason = self.failureOf(exception)
+            for start in range(len(handlers) + 1):
+                expected = None
+                for index in range(start, len(handlers)):
+                    if reason.check(*handlers[index][0]):
+                        expected = index
+                        break
+                self.assertEqual(dispatcher.find(reason, start), expected)
+
+    def test_handlersAdded(self):
+        """
+        Handlers added after L{ErrorDispatcher.find} has been called are
+        found by later calls.
+        """
+        handlers = [([KeyError], None)]
+        dispatcher = ErrorDispatcher(handlers)
+        reason = self.failureOf(ValueError())
+        self.assertIsNone(dispatcher.find(reason))
+
+        handlers.append(([ValueError], None))
+
+        self.assertEqual(dispatcher.find(reason), 1)
+
+    def test_equality(self):
+        """
+        L{ErrorDispatcher}s are equal if their handlers are, whatever they
+        have cached.
+        """
+        first = ErrorDispatcher([([KeyError], None)])
+        second = ErrorDispatcher([([KeyError], None)])
+        first.find(self.failureOf(KeyError()))
+
+        self.assertEqual(first, second)
+
+
+class ResultDispatcherTests(SynchronousTestCase):
+    """
+    Tests for L{ResultDispatcher}.
+    """
+
+    def test_builtin(self):
+        """
+        Without any handlers registered, L{ResultDispatcher.find} finds how
+        Klein renders each type of result it knows about, including
+        subclasses of them.
+        """
+
+        class Text(unicode):
+            pass
+
+        dispatcher = ResultDispatcher()
+        self.assertEqual(dispatcher.find(bytes), KleinResource._writeResult)
+        self.assertEqual(dispatcher.find(Text), KleinResource._writeResult)
+        self.assertEqual(
+            dispatcher.find(Deferred), KleinResource._handleDeferred
+        )
+        self.assertEqual(
+            dispatcher.find(FrozenHTTPResponse),
+            KleinResource._writeHTTPResponse,
+        )
+        self.assertEqual(
+            dispatcher.find(LeafResource), KleinResource._renderResource
+        )
+        self.assertEqual(
+            dispatcher.find(SimpleElement), KleinResource._renderElement
+        )
+        self.assertEqual(dispatcher.find(list), KleinResource._handleStreamable)
+        self.assertEqual(dispatcher.find(dict), KleinResource._handleOther)
+
+    def test_nearestClass(self):
+        """
+        The handler registered for the nearest class in a type's MRO
+        applies to it, whether that's registered with the dispatcher or one
+        Klein knows about.  A handler registered for C{object} only applies
+        to types Klein doesn't otherwise know about.
+        """
+
+        class Base(object):
+            pass
+
+        class Derived(Base):
+            pass
+
+        class Resource(Base, LeafResource):
+            pass
+
+        dispatcher = ResultDispatcher()
+        dispatcher.register([Base, dict], "base")
+        dispatcher.register([Derived], "derived")
+        dispatcher.register([object], "object")
+
+        def handlerOf(resultType):
+            return dispatcher.find(resultType).args[0]
+
+        self.assertEqual(handlerOf(Base), "base")
+        self.assertEqual(handlerOf(dict), "base")
+        self.assertEqual(handlerOf(Derived), "derived")
+        self.assertEqual(handlerOf(Resource), "base")
+        self.assertEqual(handlerOf(int), "object")
+        self.assertEqual(dispatcher.find(bytes), KleinResource._writeResult)
+        self.assertEqual(
+            dispatcher.find(LeafResource), KleinResource._renderResource
+        )
+
+    def test_memoized(self):
+        """
+        L{ResultDispatcher.find} returns the same function for a type each
+        time, until another handler is registered.
+        """
+        dispatcher = ResultDispatcher()
+        first = dispatcher.find(dict)
+        self.assertIs(dispatcher.find(dict), first)
+
+        dispatcher.register([dict], "dict")
+
+        self.assertIsNot(dispatcher.find(dict), first)
+        self.assertEqual(dispatcher.find(dict).args, ("dict",))
+
+
+class ResultHandlerTests(SynchronousTestCase):
+    """
+    Tests for result handlers registered with L{Klein.handleResults}.
+    """
+
+    def setUp(self):
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+
+        @self.app.handleResults(dict)
+        def asJSON(request, result):
+            request.setHeader(b"Content-Type", b"application/json")
+            return json.dumps(result, sort_keys=True)
+
+    def test_handled(self):
+        """
+        A route's result is rendered as whatever the handler registered for
+        its type returns for it.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            return {u"a": 1}
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b'{"a": 1}')
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-type"),
+            [b"application/json"],
+        )
+        self.assertTrue(request.finished)
+
+    def test_deferred(self):
+        """
+        The results of L{Deferred}s and error handlers go through the result
+        handlers too, and handlers may return L{Deferred}s.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            return succeed({u"ok": False})
+
+        @self.app.handleResults(list)
+        def later(request, result):
+            return succeed(result[0])
+
+        @self.app.handle_errors(NotFound)
+        def notFound(request, failure):
+            request.setResponseCode(404)
+            return [{u"missing": True}]
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b'{"ok": false}')
+
+        request = requestMock(b"/nowhere")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.code, 404)
+        self.assertEqual(request.getWrittenData(), b'{"missing": true}')
+
+    def test_failure(self):
+        """
+        If a result handler raises an exception, it's handled like one
+        raised by the route.
+        """
+
+        @self.app.handleResults(int)
+        def broken(request, result):
+            raise ValueError(result)
+
+        @self.app.handle_errors(ValueError)
+        def valueError(request, failure):
+            return u"bad value {}".format(failure.value.args[0])
+
+        @self.app.route("/")
+        def root(request):
+            return 7
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"bad value 7")
+
+    def test_bound(self):
+        """
+        Result handlers registered with an app that's an attribute of a
+        class are passed the instance it's bound to.
+        """
+
+        class App(object):
+            app = Klein()
+            prefix = u"instance "
+
+            @app.route("/")
+            def root(self, request):
+                return {u"name": u"root"}
+
+            @app.handleResults(dict)
+            def named(self, request, result):
+                return self.prefix + result[u"name"]
+
+        resource = App().app.resource()
+        request = requestMock(b"/")
+        self.successResultOf(_render(resource, request))
+        self.assertEqual(request.getWrittenData(), b"instance root")
+
+    def test_noTypes(self):
+        """
+        L{Klein.handleResults} needs at least one type.
+        """
+        self.assertRaises(TypeError, self.app.handleResults)
+
+    def test_directlyProvided(self):
+        """
+        A result of a type Klein doesn't know about which directly provides
+        an interface it does is rendered as such.
+        """
+
+        class Thing(object):
+            pass
+
+        thing = Thing()
+        directlyProvides(thing, IResource)
+        thing.isLeaf = True
+        thing.render = lambda request: b"thing"
+
+        @self.app.route("/")
+        def root(request):
+            return thing
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"thing")
+
+
+class BufferResultTests(SynchronousTestCase):
+    """
+    Tests for results supporting the buffer protocol.
+    """
+
+    def setUp(self):
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+
+    def render(self, result):
+        """
+        Render C{result}, returned by a route.
+
+        @return: The request, and a L{list} of what was written to it.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            return result
+
+        request = requestMock(b"/")
+        written = []
+        write = request.write
+
+        def recordingWrite(data):
+            written.append(data)
+            write(data)
+
+        request.write = recordingWrite
+        self.successResultOf(_render(self.kr, request))
+        self.assertTrue(request.finished)
+        return request, written
+
+    def assertContentLength(self, request, length):
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-length"),
+            [intToBytes(length)],
+        )
+
+    def test_memoryview(self):
+        """
+        A L{memoryview} of bytes is written as it is, without being copied,
+        with a C{Content-Length} header.
+        """
+        tiles = bytearray(b"0123456789")
+        view = memoryview(tiles)[2:5]
+        request, written = self.render(view)
+
+        self.assertEqual(request.getWrittenData(), b"234")
+        self.assertContentLength(request, 3)
+        self.assertIs(written[0].obj, tiles)
+
+    def test_bytearray(self):
+        """
+        A L{bytearray} is written as a view of its bytes.
+        """
+        buffer = bytearray(b"abc")
+        request, written = self.render(buffer)
+
+        self.assertEqual(request.getWrittenData(), b"abc")
+        self.assertContentLength(request, 3)
+        self.assertIs(written[0].obj, buffer)
+
+    def test_array(self):
+        """
+        The C{Content-Length} of an L{array} of larger items is the number
+        of bytes in it.
+        """
+        items = array("H", [1, 2, 3])
+        request, written = self.render(items)
+
+        self.assertEqual(request.getWrittenData(), items.tobytes())
+        self.assertContentLength(request, 3 * items.itemsize)
+
+    def test_mmap(self):
+        """
+        An L{mmap} is written as a view of its bytes.
+        """
+        mapped = mmap(-1, 4)
+        mapped.write(b"data")
+        request, written = self.render(mapped)
+
+        self.assertEqual(request.getWrittenData(), b"data")
+        self.assertContentLength(request, 4)
+        self.assertIsInstance(written[0], memoryview)
+
+    def test_otherBuffers(self):
+        """
+        Objects of other types supporting the buffer protocol are written
+        as views of their bytes.
+        """
+        request, written = self.render((c_char * 3).from_buffer_copy(b"abc"))
+
+        self.assertEqual(request.getWrittenData(), b"abc")
+        self.assertContentLength(request, 3)
+        self.assertIsInstance(written[0], memoryview)
+
+    def test_responseBody(self):
+        """
+        A buffer may be the body of a L{Response}.
+        """
+        buffer = bytearray(b"body")
+        request, written = self.render(Response(code=201, body=buffer))
+
+        self.assertEqual(request.code, 201)
+        self.assertEqual(request.getWrittenData(), b"body")
+        self.assertIs(written[0].obj, buffer)
+
+
 class GlobalAppTests(SynchronousTestCase):
     """
     Tests for the global app object
@@ -0,0 +1,450 @@
+"""
+Tests for L{klein._router}.
+"""
+
+from __future__ import absolute_import, division
+
+from typing import Any, Callable, Dict, List, Text, Tuple, cast
+
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import (
+    Map,
+    RequestRedirect,
+    Rule,
+    RuleFactory,
+    Submount,
+)
+
+from . import test_resource
+from .test_resource import _render, requestMock
+from .. import Klein
+from .._resource import KleinResource
+from .._router import CompiledRouter, MatchCache
+
+
+def werkzeugMatch(urlMap, path, method):
+    # type: (Map, Text, Text) -> Tuple[Any, Any]
+    """
+    Match C{path} with werkzeug.
+
+    @return: The endpoint and arguments, or the type of the exception raised
+        and, for L{MethodNotAllowed}, the sorted allowed methods.
+    """
+    try:
+        rule, kwargs = urlMap.bind("localhost").match(
+            path, method, return_rule=True
+        )
+    except MethodNotAllowed as e:
+        return MethodNotAllowed, sorted(e.valid_methods)
+    except (NotFound, RequestRedirect) as e:
+        return type(e), None
+    return rule.endpoint, kwargs
+
+
+def compiledMatch(router, urlMap, path, method):
+    # type: (CompiledRouter, Map, Text, Text) -> Tuple[Any, Any]
+    """
+    Match C{path} with C{router}, falling back to werkzeug as L{KleinResource}
+    does.
+
+    @return: The same as L{werkzeugMatch}.
+    """
+    segments = path.encode("utf-8").split(b"/")[1:]
+    try:
+        match = router.match(segments, method.encode("ascii"))
+    except MethodNotAllowed as e:
+        return MethodNotAllowed, sorted(e.valid_methods)
+    except NotFound:
+        return NotFound, None
+    if match is None:
+        return werkzeugMatch(urlMap, path, method)
+    rule, kwargs = match
+    return rule.endpoint, kwargs
+
+
+class CompiledRouterTests(SynchronousTestCase):
+    """
+    Tests for L{CompiledRouter}.
+    """
+
+    paths = [
+        u"",
+        u"/",
+        u"//",
+        u"/foo",
+        u"/foo/",
+        u"/foo//",
+        u"/foo/bar",
+        u"/foo/bar/",
+        u"/foo/7",
+        u"/foo/007",
+        u"/foo/-7",
+        u"/foo/1.5",
+        u"/foo/x/y/z",
+        u"/foo/x/y/z/",
+        u"/f\xf6\xf6",
+        u"/f\xf6\xf6/",
+        u"/nonstrict",
+        u"/nonstrict/",
+        u"/folder",
+        u"/folder/",
+        u"/branch",
+        u"/branch/",
+        u"/branch/a",
+        u"/branch/a/",
+        u"/branch/a/b",
+        u"/branch/a//b",
+        u"/sub/one",
+        u"/sub/one/",
+        u"/sub/two/3",
+        u"/pick/red",
+        u"/pick/blue",
+        u"/pick/green",
+        u"/uuid/1f3c2ab8-4a5b-4e1c-9d2f-3a6b7c8d9e0f",
+        u"/uuid/nope",
+        u"/short/ab",
+        u"/short/abcd",
+        u"/missing",
+    ]
+
+    methods = [u"GET", u"HEAD", u"POST", u"DELETE"]
+
+    def rules(self):
+        # type: () -> List[RuleFactory]
+        """
+        A variety of rules covering the behaviour the trie must reproduce.
+        """
+        return [
+            Rule(u"/", endpoint="root"),
+            Rule(u"/foo", endpoint="foo"),
+            Rule(u"/foo", endpoint="postFoo", methods=[u"POST"]),
+            Rule(u"/foo/bar", endpoint="fooBar"),
+            Rule(u"/foo/<int:number>", endpoint="fooInt"),
+            Rule(u"/foo/<float:number>", endpoint="fooFloat"),
+            Rule(u"/foo/<name>", endpoint="fooName", methods=[u"DELETE"]),
+            Rule(u"/foo/<path:rest>", endpoint="fooRest"),
+            Rule(u"/f\xf6\xf6", endpoint="unicode"),
+            Rule(u"/nonstrict/", endpoint="nonstrict", strict_slashes=False),
+            Rule(u"/folder/", endpoint="folder"),
+            Rule(u"/branch", endpoint="branch"),
+            Rule(u"/branch/<path:__rest__>", endpoint="branch_branch"),
+            Submount(
+                u"/sub",
+                [
+                    Rule(u"/one", endpoint="subOne"),
+                    Rule(u"/two/<int:n>", endpoint="subTwo"),
+                ],
+            ),
+            Rule(u"/pick/<any(red, blue):colour>", endpoint="pick"),
+            Rule(u"/uuid/<uuid:u>", endpoint="uuid"),
+            Rule(u"/short/<string(maxlength=3):s>", endpoint="short"),
+        ]
+
+    def assertMatchesLikeWerkzeug(self, rules):
+        # type: (List[RuleFactory]) -> CompiledRouter
+        """
+        Assert that a L{CompiledRouter} for C{rules} gives the same result as
+        werkzeug for every combination of C{self.paths} and C{self.methods}.
+
+        @return: The router.
+        """
+        urlMap = Map(rules)
+        router = CompiledRouter(urlMap)
+        router.compile()
+        for path in self.paths:
+            for method in self.methods:
+                self.assertEqual(
+                    compiledMatch(router, urlMap, path, method),
+                    werkzeugMatch(urlMap, path, method),
+                    "{} {!r}".format(method, path),
+                )
+        return router
+
+    def test_sameAsWerkzeug(self):
+        # type: () -> None
+        """
+        L{CompiledRouter} matches the same rule as werkzeug, with the same
+        arguments, and raises the same exceptions.
+        """
+        router = self.assertMatchesLikeWerkzeug(self.rules())
+        self.assertTrue(router.supported)
+
+    def test_unsupportedRule(self):
+        # type: () -> None
+        """
+        If a rule can't be compiled, L{CompiledRouter.match} defers to
+        werkzeug for every request.
+        """
+        rules = self.rules() + [Rule(u"/file.<ext>", endpoint="file")]
+        router = self.assertMatchesLikeWerkzeug(rules)
+        self.assertFalse(router.supported)
+        self.assertIsNone(router.match([b"foo"], b"GET"))
+
+    def test_aliases(self):
+        # type: () -> None
+        """
+        Rules with aliases or defaults are left to werkzeug.
+        """
+        rules = self.rules() + [
+            Rule(u"/alias", endpoint="foo", alias=True),
+            Rule(u"/page/", endpoint="page", defaults={"n": 1}),
+        ]
+        router = self.assertMatchesLikeWerkzeug(rules)
+        self.assertFalse(router.supported)
+
+    def test_recompile(self):
+        # type: () -> None
+        """
+        Rules added to the map after compiling are picked up.
+        """
+        urlMap = Map([Rule(u"/", endpoint="root")])
+        router = CompiledRouter(urlMap)
+        router.compile()
+        self.assertRaises(NotFound, router.match, [b"late"], b"GET")
+        urlMap.add(Rule(u"/late", endpoint="late"))
+        rule, kwargs = cast(
+            Tuple[Rule, Dict[str, Any]], router.match([b"late"], b"GET")
+        )
+        self.assertEqual((rule.endpoint, kwargs), ("late", {}))
+
+    def test_redirectDefersToWerkzeug(self):
+        # type: () -> None
+        """
+        A path that matches a rule only once a trailing slash is added is
+        left to werkzeug, which redirects.
+        """
+        urlMap = Map([Rule(u"/folder/", endpoint="folder")])
+        router = CompiledRouter(urlMap)
+        router.compile()
+        self.assertIsNone(router.match([b"folder"], b"GET"))
+
+
+class CompiledKleinResourceTests(test_resource.KleinResourceTests):
+    """
+    L{KleinResourceTests}, run against an app using compiled routing.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein(compiledRouting=True)
+        self.kr = KleinResource(self.app)
+
+    def test_compiledOnResource(self):
+        # type: () -> None
+        """
+        L{Klein.resource} compiles the routing rules.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            # type: (IRequest) -> bytes
+            return b"root"
+
+        self.assertFalse(self.app._router.supported)
+        resource = self.app.resource()
+        self.assertTrue(self.app._router.supported)
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(resource, request))
+        self.assertEqual(request.getWrittenData(), b"root")
+
+    def test_boundAppSharesRouter(self):
+        # type: () -> None
+        """
+        A L{Klein} bound to an instance shares its router.
+        """
+
+        class Thing(object):
+            app = Klein(compiledRouting=True)
+
+        self.assertIs(Thing().app._router, Thing.app._router)
+
+    def test_encodedSlash(self):
+        # type: () -> None
+        """
+        A path segment containing a decoded C{%2F} is left to werkzeug, so
+        that it's routed as it would be without compiled routing.
+        """
+        results = []
+        for app in [self.app, Klein()]:
+
+            @app.route("/a/b")
+            def ab(request):
+                # type: (IRequest) -> bytes
+                return b"a/b"
+
+            @app.route("/<name>")
+            def named(request, name):
+                # type: (IRequest, Text) -> Text
+                return name
+
+            for path, postpath in [(b"/a%2Fb", b"a/b"), (b"/c%2F", b"c/")]:
+                request = requestMock(path)
+                # Twisted decodes each segment after splitting the path.
+                request.postpath = [postpath]
+                self.successResultOf(_render(KleinResource(app), request))
+                results.append((request.code, request.getWrittenData()))
+
+        compiled, werkzeug = results[:2], results[2:]
+        self.assertEqual(compiled, werkzeug)
+        self.assertEqual(compiled[0], (200, b"a/b"))
+
+
+class MatchCacheTests(SynchronousTestCase):
+    """
+    Tests for L{MatchCache}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.urlMap = Map([Rule(u"/", endpoint="root")])
+        self.cache = MatchCache(self.urlMap, 2)
+        self.calls = []  # type: List[Any]
+
+    def matcher(self, result):
+        # type: (Any) -> Callable[[], Tuple[Any, ...]]
+        """
+        Make a matcher that records its calls and returns C{result}, or
+        raises it if it's an exception.
+        """
+
+        def match():
+            # type: () -> Tuple[Any, ...]
+            self.calls.append(result)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        return match
+
+    def test_hit(self):
+        # type: () -> None
+        """
+        A cached match is returned without calling the matcher again.
+        """
+        result = ("root", {}, 0)  # type: Tuple[str, Dict[str, Any], int]
+        self.assertEqual(self.cache.match("a", self.matcher(result)), result)
+        self.assertEqual(self.cache.match("a", self.matcher(result)), result)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_negative(self):
+        # type: () -> None
+        """
+        L{NotFound} and L{MethodNotAllowed} are cached, and a fresh copy is
+        raised on each hit.
+        """
+        error = MethodNotAllowed(valid_methods=[u"GET"])
+        first = self.assertRaises(
+            MethodNotAllowed, self.cache.match, "a", self.matcher(error)
+        )
+        second = self.assertRaises(
+            MethodNotAllowed, self.cache.match, "a", self.matcher(error)
+        )
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.valid_methods, [u"GET"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_otherErrorsNotCached(self):
+        # type: () -> None
+        """
+        Other exceptions, like redirects, are not cached.
+        """
+        error = RequestRedirect(u"http://localhost/a/")
+        for _ in range(2):
+            self.assertRaises(
+                RequestRedirect, self.cache.match, "a", self.matcher(error)
+            )
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_leastRecentlyUsedEvicted(self):
+        # type: () -> None
+        """
+        When full, the least recently used entry is evicted.
+        """
+        self.cache.match("a", self.matcher(("a", {}, 0)))
+        self.cache.match("b", self.matcher(("b", {}, 0)))
+        self.cache.match("a", self.matcher(("a", {}, 0)))
+        self.cache.match("c", self.matcher(("c", {}, 0)))
+        self.assertEqual(len(self.cache), 2)
+        self.cache.match("a", self.matcher(("a", {}, 0)))
+        self.cache.match("b", self.matcher(("b", {}, 0)))
+        self.assertEqual(
+            self.calls, [("a", {}, 0), ("b", {}, 0), ("c", {}, 0), ("b", {}, 0)]
+        )
+
+    def test_errorsDontEvictMatches(self):
+        # type: () -> None
+        """
+        Negative entries are bounded separately from successful matches.
+        """
+        self.cache.match("a", self.matcher(("a", {}, 0)))
+        for key in "bcde":
+            self.assertRaises(
+                NotFound, self.cache.match, key, self.matcher(NotFound())
+            )
+        self.assertEqual(len(self.cache), 3)
+        self.cache.match("a", self.matcher(("a", {}, 0)))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_clearedWhenRulesChange(self):
+        # type: () -> None
+        """
+        Adding a rule to the map empties the cache.
+        """
+        self.assertRaises(
+            NotFound, self.cache.match, "late", self.matcher(NotFound())
+        )
+        self.urlMap.add(Rule(u"/late", endpoint="late"))
+        result = ("late", {}, 1)  # type: Tuple[str, Dict[str, Any], int]
+        self.assertEqual(self.cache.match("late", self.matcher(result)), result)
+        self.assertEqual(self.cache.hits, 0)
+
+
+class CachedKleinResourceTests(test_resource.KleinResourceTests):
+    """
+    L{KleinResourceTests}, run against an app with a match cache.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein(matchCacheSize=10)
+        self.kr = KleinResource(self.app)
+
+    def test_cachedRequests(self):
+        # type: () -> None
+        """
+        Repeated requests are routed from the cache, including those that
+        don't match any route, which get the same response each time.
+        """
+
+        @self.app.route("/<int:n>")
+        def number(request, n):
+            # type: (IRequest, int) -> str
+            return str(n)
+
+        responses = []
+        for path in [b"/1", b"/1", b"/nope", b"/nope"]:
+            request = requestMock(path)
+            self.successResultOf(_render(self.kr, request))
+            responses.append((request.code, request.getWrittenData()))
+
+        self.assertEqual(responses[0], (200, b"1"))
+        self.assertEqual(responses[1], (200, b"1"))
+        self.assertEqual(responses[2][0], 404)
+        self.assertEqual(responses[2], responses[3])
+        self.assertEqual(
+            (self.app.matchCache.hits, self.app.matchCache.misses), (2, 2)
+        )
+
+    def test_noCacheByDefault(self):
+        # type: () -> None
+        """
+        L{Klein} has no match cache unless one is asked for.
+        """
+        self.assertIsNone(Klein().matchCache)
@@ -0,0 +1,577 @@
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Tests for L{klein._static}.
+"""
+
+from __future__ import absolute_import, division
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Any, Dict, List, Optional, Text, cast
+
+from twisted.internet.task import Clock
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import BuildError
+
+from .test_resource import _render, requestMock
+from .. import AssetManifest, FileResponse, Klein
+from .._interfaces import IKleinRequest
+from .._resource import KleinResource
+from .._static import (
+    StaticFiles,
+    _CachedFileResponse,
+    _IMMUTABLE,
+    isFingerprinted,
+)
+
+
+# Which type .js files have depends on the platform's table of types.
+_JAVASCRIPT = cast(str, mimetypes.guess_type(u"app.js")[0]).encode("ascii")
+
+
+class IsFingerprintedTests(SynchronousTestCase):
+    """
+    Tests for L{isFingerprinted}.
+    """
+
+    def test_names(self):
+        # type: () -> None
+        """
+        Names with at least eight hexadecimal digits before their extension
+        are fingerprinted.
+        """
+        for name in [u"app.0123abcd.js", u"style-0123456789abcdef.css"]:
+            self.assertTrue(isFingerprinted(name), name)
+        for name in [u"app.js", u"app.0123.js", u"app.0123abcd", u"0123abcd"]:
+            self.assertFalse(isFingerprinted(name), name)
+
+
+class AssetManifestTests(SynchronousTestCase):
+    """
+    Tests for L{AssetManifest}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.directory = FilePath(self.mktemp())
+        self.directory.makedirs()
+        self.directory.child(u"app.js").setContent(b"var app;")
+        self.directory.child(u"css").makedirs()
+        self.directory.child(u"css").child(u"site.min.css").setContent(b"p{}")
+        self.directory.child(u"LICENSE").setContent(b"MIT")
+        self.directory.child(u".hidden").setContent(b"")
+
+    def fingerprint(self, content):
+        # type: (bytes) -> Text
+        return hashlib.sha256(content).hexdigest()[:8]
+
+    def test_fromDirectory(self):
+        # type: () -> None
+        """
+        L{AssetManifest.fromDirectory} hashes each file with an extension in
+        the directory and its subdirectories, and puts the start of the
+        hash before its extension.
+        """
+        manifest = AssetManifest.fromDirectory(self.directory.path)
+
+        self.assertEqual(
+            manifest.names,
+            {
+                u"app.js": u"app.{}.js".format(self.fingerprint(b"var app;")),
+                u"css/site.min.css": u"css/site.min.{}.css".format(
+                    self.fingerprint(b"p{}")
+                ),
+            },
+        )
+        for fingerprinted in manifest.names.values():
+            self.assertTrue(isFingerprinted(fingerprinted))
+
+        longer = AssetManifest.fromDirectory(self.directory, length=12)
+        self.assertEqual(
+            longer.fingerprinted(u"app.js"),
+            u"app.{}.js".format(hashlib.sha256(b"var app;").hexdigest()[:12]),
+        )
+
+    def test_names(self):
+        # type: () -> None
+        """
+        L{AssetManifest.fingerprinted} finds a file's fingerprinted name,
+        and L{AssetManifest.source} the name of the file a fingerprinted
+        name is for.
+        """
+        manifest = AssetManifest({u"app.js": u"app.0123abcd.js"})
+
+        self.assertEqual(manifest.fingerprinted(u"app.js"), u"app.0123abcd.js")
+        self.assertEqual(manifest.fingerprinted(u"other.js"), u"other.js")
+        self.assertEqual(manifest.source(u"app.0123abcd.js"), u"app.js")
+        self.assertIsNone(manifest.source(u"app.js"))
+
+    def test_saveLoad(self):
+        # type: () -> None
+        """
+        A manifest saved with L{AssetManifest.save} is loaded by
+        L{AssetManifest.load}, without hashing the files again.
+        """
+        manifest = AssetManifest.fromDirectory(self.directory)
+        path = FilePath(self.mktemp())
+        manifest.save(path)
+
+        self.directory.child(u"app.js").setContent(b"changed")
+        self.assertEqual(AssetManifest.load(path.path), manifest)
+
+    def test_loadNotObject(self):
+        # type: () -> None
+        """
+        L{AssetManifest.load} raises L{ValueError} for JSON which isn't an
+        object.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(b"[]")
+        self.assertRaises(ValueError, AssetManifest.load, path)
+
+
+class StaticFilesTests(SynchronousTestCase):
+    """
+    Tests for serving L{StaticFiles}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.clock = Clock()
+        self.directory = FilePath(self.mktemp())
+        self.directory.makedirs()
+        self.directory.child(u"app.js").setContent(b"var app;")
+        self.directory.child(u"sub").makedirs()
+        self.directory.child(u"sub").child(u"page.html").setContent(b"<p>")
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+
+    def mount(self, **kwargs):
+        # type: (**Any) -> StaticFiles
+        """
+        Serve the directory under C{/assets}.
+
+        @return: The L{StaticFiles}.
+        """
+        files = StaticFiles(self.directory, clock=self.clock, **kwargs)
+
+        @self.app.route("/assets", branch=True)
+        def assets(request):
+            # type: (IRequest) -> FileResponse
+            return files.respond(
+                request, IKleinRequest(request).branch_segments
+            )
+
+        return files
+
+    def get(self, path, method=b"GET", headers=None):
+        # type: (bytes, bytes, Optional[Dict[bytes, List[bytes]]]) -> IRequest
+        request = requestMock(path, method=method, headers=headers)
+        self.successResultOf(_render(self.kr, request))
+        self.assertTrue(request.finished)
+        return request
+
+    def header(self, request, name):
+        # type: (IRequest, bytes) -> Optional[bytes]
+        values = request.responseHeaders.getRawHeaders(name)
+        return values[0] if values else None
+
+    def test_served(self):
+        # type: () -> None
+        """
+        Files in the directory and its subdirectories are served, with their
+        type and validators.
+        """
+        self.mount()
+        request = self.get(b"/assets/app.js")
+
+        self.assertEqual(request.code, 200)
+        self.assertEqual(request.getWrittenData(), b"var app;")
+        self.assertEqual(self.header(request, b"content-type"), _JAVASCRIPT)
+        self.assertIsNotNone(self.header(request, b"etag"))
+        self.assertIsNotNone(self.header(request, b"last-modified"))
+        self.assertEqual(self.header(request, b"vary"), b"Accept-Encoding")
+        self.assertIsNone(self.header(request, b"cache-control"))
+
+        request = self.get(b"/assets/sub/page.html")
+        self.assertEqual(request.getWrittenData(), b"<p>")
+
+    def test_notFound(self):
+        # type: () -> None
+        """
+        Paths which don't lead to a file within the directory aren't found.
+        """
+        files = self.mount()
+        for path in [
+            b"/assets",
+            b"/assets/",
+            b"/assets/missing.js",
+            b"/assets/sub",
+            b"/assets/sub/",
+        ]:
+            self.assertEqual(self.get(path).code, 404, path)
+        for segments in [[u".."], [u"sub", u"..", u"app.js"], [u"a\0"]]:
+            self.assertRaises(NotFound, files.respond, None, segments)
+
+    def test_cachedInMemory(self):
+        # type: () -> None
+        """
+        Small files are kept in memory, and only checked for changes every
+        C{statInterval} seconds.
+        """
+        files = self.mount(statInterval=5)
+        response = files.respond(requestMock(b"/"), [u"app.js"])
+        self.assertIsInstance(response, _CachedFileResponse)
+        self.assertEqual(
+            cast(_CachedFileResponse, response).content, b"var app;"
+        )
+
+        path = self.directory.child(u"app.js")
+        path.remove()
+        self.assertEqual(
+            self.get(b"/assets/app.js").getWrittenData(), b"var app;"
+        )
+
+        self.clock.advance(5)
+        self.assertEqual(self.get(b"/assets/app.js").code, 404)
+
+        path.setContent(b"var changed;")
+        self.clock.advance(5)
+        self.assertEqual(
+            self.get(b"/assets/app.js").getWrittenData(), b"var changed;"
+        )
+
+    def test_rangesFromMemory(self):
+        # type: () -> None
+        """
+        Files kept in memory, or ranges of them, are written at once.
+        """
+        self.mount()
+        request = self.get(b"/assets/app.js")
+        self.assertEqual(request.writeCount, 1)
+
+        request = self.get(
+            b"/assets/app.js", headers={b"Range": [b"bytes=4-6"]}
+        )
+        self.assertEqual(request.code, 206)
+        self.assertEqual(request.getWrittenData(), b"app")
+        self.assertEqual(request.writeCount, 1)
+
+        request = self.get(
+            b"/assets/app.js", headers={b"Range": [b"bytes=0-0,4-6"]}
+        )
+        self.assertEqual(request.code, 206)
+        self.assertIn(b"app", request.getWrittenData())
+        request = self.get(b"/assets/app.js", method=b"HEAD")
+        self.assertEqual(request.getWrittenData(), b"")
+        self.assertEqual(self.header(request, b"content-length"), b"8")
+
+    def test_large(self):
+        # type: () -> None
+        """
+        Files larger than C{maxCachedSize} are read from disk, and no more
+        than C{cacheSize} bytes are kept in memory.
+        """
+        files = self.mount(maxCachedSize=4)
+        response = files.respond(requestMock(b"/"), [u"app.js"])
+        self.assertIs(type(response), FileResponse)
+        self.assertEqual(
+            self.get(b"/assets/app.js").getWrittenData(), b"var app;"
+        )
+
+        files = StaticFiles(self.directory, cacheSize=10, clock=self.clock)
+        files.respond(requestMock(b"/"), [u"app.js"])
+        files.respond(requestMock(b"/"), [u"sub", u"page.html"])
+        self.assertEqual(files._cachedBytes, 3)
+        self.assertEqual(len(files._contents), 1)
+
+    def compress(self):
+        # type: () -> FilePath
+        """
+        Give C{app.js} a C{.gz} sibling.
+        """
+        compressed = self.directory.child(u"app.js.gz")
+        with gzip.GzipFile(compressed.path, "wb") as f:
+            f.write(b"var app;")
+        return compressed
+
+    def test_precompressed(self):
+        # type: () -> None
+        """
+        Clients which accept C{gzip} are served a file's C{.gz} sibling,
+        with the file's type.
+        """
+        compressed = self.compress()
+        self.mount()
+        request = self.get(
+            b"/assets/app.js", headers={b"Accept-Encoding": [b"br, gzip"]}
+        )
+
+        self.assertEqual(request.getWrittenData(), compressed.getContent())
+        self.assertEqual(self.header(request, b"content-encoding"), b"gzip")
+        self.assertEqual(self.header(request, b"content-type"), _JAVASCRIPT)
+        self.assertEqual(self.header(request, b"vary"), b"Accept-Encoding")
+
+        unaccepted = [
+            {},
+            {b"Accept-Encoding": [b"gzip;q=0, br"]},
+        ]  # type: List[Dict[bytes, List[bytes]]]
+        for headers in unaccepted:
+            request = self.get(b"/assets/app.js", headers=headers)
+            self.assertEqual(request.getWrittenData(), b"var app;")
+            self.assertIsNone(self.header(request, b"content-encoding"))
+
+    def test_precompressedStale(self):
+        # type: () -> None
+        """
+        A C{.gz} sibling older than its file, or any sibling if
+        C{precompressed} is false, isn't served.
+        """
+        compressed = self.compress()
+        os.utime(compressed.path, (0, 0))
+        self.mount()
+        request = self.get(
+            b"/assets/app.js", headers={b"Accept-Encoding": [b"gzip"]}
+        )
+        self.assertEqual(request.getWrittenData(), b"var app;")
+
+        os.utime(compressed.path, None)
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.mount(precompressed=False)
+        request = self.get(
+            b"/assets/app.js", headers={b"Accept-Encoding": [b"gzip"]}
+        )
+        self.assertEqual(request.getWrittenData(), b"var app;")
+        self.assertIsNone(self.header(request, b"vary"))
+
+    def test_cacheControl(self):
+        # type: () -> None
+        """
+        Files C{immutable} says are fingerprinted may be cached for a year
+        without being revalidated, and others for C{maxAge} seconds.
+        """
+        self.directory.child(u"app.0123abcd.js").setContent(b"var app;")
+        self.mount(maxAge=60, immutable=isFingerprinted)
+
+        request = self.get(b"/assets/app.0123abcd.js")
+        self.assertEqual(
+            self.header(request, b"cache-control"),
+            b"public, max-age=31536000, immutable",
+        )
+        request = self.get(b"/assets/app.js")
+        self.assertEqual(
+            self.header(request, b"cache-control"), b"public, max-age=60"
+        )
+
+    def test_notImmutableByDefault(self):
+        # type: () -> None
+        """
+        By default, no file is immutable by its name alone, so names which
+        merely look fingerprinted, such as ones stamped with a date, are
+        revalidated.
+        """
+        for name in [u"app.0123abcd.js", u"report-20201017.pdf"]:
+            self.directory.child(name).setContent(b"content")
+        self.mount()
+
+        for path in [
+            b"/assets/app.0123abcd.js",
+            b"/assets/report-20201017.pdf",
+        ]:
+            request = self.get(path)
+            self.assertEqual(request.getWrittenData(), b"content")
+            self.assertIsNone(self.header(request, b"cache-control"), path)
+
+    def test_manifest(self):
+        # type: () -> None
+        """
+        Files in the manifest are served under their fingerprinted names,
+        as immutable, as well as their own.
+        """
+        self.directory.child(u"app.js.gz").setContent(b"compressed")
+        manifest = AssetManifest(
+            {
+                u"app.js": u"app.0123abcd.js",
+                u"sub/page.html": u"sub/page.4567cdef.html",
+                u"escape.js": u"../app.js",
+            }
+        )
+        self.mount(manifest=manifest, maxAge=60)
+
+        request = self.get(b"/assets/app.0123abcd.js")
+        self.assertEqual(request.getWrittenData(), b"var app;")
+        self.assertEqual(self.header(request, b"cache-control"), _IMMUTABLE)
+        request = self.get(b"/assets/sub/page.4567cdef.html")
+        self.assertEqual(request.getWrittenData(), b"<p>")
+        self.assertEqual(self.header(request, b"content-type"), b"text/html")
+
+        request = self.get(
+            b"/assets/app.0123abcd.js", headers={b"Accept-Encoding": [b"gzip"]}
+        )
+        self.assertEqual(request.getWrittenData(), b"compressed")
+
+        request = self.get(b"/assets/app.js")
+        self.assertEqual(request.getWrittenData(), b"var app;")
+        self.assertEqual(
+            self.header(request, b"cache-control"), b"public, max-age=60"
+        )
+        self.assertEqual(self.get(b"/assets/app.89abcdef.js").code, 404)
+        self.assertEqual(self.get(b"/assets/escape.js").code, 404)
+
+
+class KleinStaticTests(SynchronousTestCase):
+    """
+    Tests for L{Klein.static}.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.directory = FilePath(self.mktemp())
+        self.directory.makedirs()
+        self.directory.child(u"app.js").setContent(b"var app;")
+
+    def test_static(self):
+        # type: () -> None
+        """
+        L{Klein.static} adds a branch route serving the directory's files,
+        and returns its L{StaticFiles}.
+        """
+        app = Klein()
+        files = app.static("/assets", self.directory.path, maxAge=10)
+
+        self.assertIsInstance(files, StaticFiles)
+        self.assertEqual(files.directory, self.directory)
+        self.assertEqual(files.maxAge, 10)
+        self.assertIsNone(files.immutable)
+        self.assertIn("static", app.endpoints)
+        self.assertIs(
+            app.static(
+                "/other", self.directory, endpoint="other", immutable=True
+            ).immutable,
+            isFingerprinted,
+        )
+
+        request = requestMock(b"/assets/app.js")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(request.getWrittenData(), b"var app;")
+
+        request = requestMock(b"/assets/app.js", method=b"POST")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(request.code, 405)
+
+    def test_endpointTaken(self):
+        # type: () -> None
+        """
+        Serving a second directory under the same endpoint name raises a
+        L{ValueError} asking for another, rather than replacing the first
+        directory's endpoint.
+        """
+        app = Klein()
+        app.static("/assets", self.directory)
+
+        error = self.assertRaises(
+            ValueError, app.static, "/other", self.directory
+        )
+        self.assertIn("endpoint=", str(error))
+        app.static("/other", self.directory, endpoint="other")
+
+        request = requestMock(b"/assets/app.js")
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(request.getWrittenData(), b"var app;")
+
+    def test_bound(self):
+        # type: () -> None
+        """
+        Directories may be served by apps bound to instances.
+        """
+        directory = self.directory
+
+        class Site(object):
+            app = Klein()
+            app.static("/files", directory, endpoint="files")
+
+        request = requestMock(b"/files/app.js")
+        self.successResultOf(_render(Site().app.resource(), request))
+        self.assertEqual(request.getWrittenData(), b"var app;")
+
+    def test_manifest(self):
+        # type: () -> None
+        """
+        With C{manifest=True}, L{Klein.static} hashes the directory's files,
+        and serves them under their fingerprinted names.
+        """
+        app = Klein()
+        files = app.static("/assets", self.directory, manifest=True)
+        fingerprinted = files.manifest.fingerprinted(u"app.js")
+        self.assertNotEqual(fingerprinted, u"app.js")
+
+        request = requestMock(b"/assets/" + fingerprinted.encode("ascii"))
+        self.successResultOf(_render(app.resource(), request))
+        self.assertEqual(request.getWrittenData(), b"var app;")
+
+        self.assertIsNone(
+            app.static("/other", self.directory, endpoint="other").manifest
+        )
+
+    def test_urlFor(self):
+        # type: () -> None
+        """
+        L{Klein.urlFor} builds the URL of a file served by L{Klein.static}
+        from a C{path} value, using its fingerprinted name if it has one.
+        """
+        app = Klein()
+        manifest = AssetManifest({u"app.js": u"app.0123abcd.js"})
+        app.static("/assets", self.directory, manifest=manifest)
+        app.static("/files/", self.directory, endpoint="files")
+        request = requestMock(b"/")
+
+        self.assertEqual(
+            app.urlFor(request, "static", {"path": u"app.js"}),
+            "/assets/app.0123abcd.js",
+        )
+        self.assertEqual(
+            app.urlFor(request, "static", {"path": u"css/a b.css"}),
+            "/assets/css/a%20b.css",
+        )
+        self.assertEqual(
+            app.urlFor(request, "files", {"path": u"app.js", "v": 1}),
+            "/files/app.js?v=1",
+        )
+        self.assertEqual(app.urlFor(request, "static"), "/assets")
+        self.assertRaises(
+            BuildError,
+            app.urlFor,
+            request,
+            "static",
+            {"path": u"app.js"},
+            append_unknown=False,
+            method="POST",
+        )
+
+    def test_urlForBound(self):
+        # type: () -> None
+        """
+        Fingerprinted URLs may be built by apps bound to instances.
+        """
+        directory = self.directory
+
+        class Site(object):
+            app = Klein()
+            app.static(
+                "/assets",
+                directory,
+                manifest=AssetManifest({u"app.js": u"app.0123abcd.js"}),
+            )
+
+        self.assertEqual(
+            Site().app.urlFor(requestMock(b"/"), "static", {"path": u"app.js"}),
+            "/assets/app.0123abcd.js",
+        )
@@ -0,0 +1,349 @@
+"""
+Tests for L{klein._stream}.
+"""
+
+from __future__ import absolute_import, division
+
+import gc
+import sys
+import weakref
+from array import array
+from typing import Any, Iterable, Iterator, List
+
+try:
+    import builtins
+except ImportError:  # pragma: no cover
+    import __builtin__ as builtins  # type: ignore
+
+from twisted.internet.error import ConnectionLost
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import IRequest
+
+from .test_resource import _render, requestMock
+from .. import Klein
+from .._resource import KleinResource
+from .._stream import byteView, isStreamable, streamResponse
+
+
+class IsStreamableTests(SynchronousTestCase):
+    """
+    Tests for L{isStreamable}.
+    """
+
+    def test_iterables(self):
+        # type: () -> None
+        """
+        Iterables other than strings and mappings are streamed.
+        """
+        self.assertTrue(isStreamable(iter([])))
+        self.assertTrue(isStreamable([b"a"]))
+        self.assertTrue(isStreamable(x for x in [b"a"]))
+        for result in [b"a", u"a", bytearray(b"a"), {}, None, 1]:
+            self.assertFalse(isStreamable(result), result)
+
+
+class ByteViewTests(SynchronousTestCase):
+    """
+    Tests for L{byteView}.
+    """
+
+    def test_bytes(self):
+        # type: () -> None
+        """
+        A buffer of bytes is viewed as it is, without being copied.
+        """
+        buffer = bytearray(b"abcdef")
+        view = byteView(memoryview(buffer)[1:4])
+        self.assertIsInstance(view, memoryview)
+        buffer[1:4] = b"BCD"
+        self.assertEqual(bytes(view), b"BCD")
+
+    def test_items(self):
+        # type: () -> None
+        """
+        A contiguous buffer of larger items is viewed as its bytes, so that
+        its length is theirs.
+        """
+        items = array("i", [1, 2, 3])
+        view = byteView(items)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(len(view), 3 * items.itemsize)
+        self.assertEqual(bytes(view), items.tobytes())
+
+    def test_notContiguous(self):
+        # type: () -> None
+        """
+        A buffer which isn't contiguous is copied into L{bytes}.
+        """
+        view = byteView(memoryview(bytearray(b"abcdef"))[::2])
+        self.assertEqual(view, b"ace")
+
+    def test_notBuffer(self):
+        # type: () -> None
+        """
+        L{byteView} raises L{TypeError} for objects which don't support the
+        buffer protocol.
+        """
+        self.assertRaises(TypeError, byteView, u"text")
+        self.assertRaises(TypeError, byteView, 1)
+
+
+class StreamedRouteTests(SynchronousTestCase):
+    """
+    Tests for streaming the iterables returned by routes.
+    """
+
+    def setUp(self):
+        # type: () -> None
+        self.app = Klein()
+        self.kr = KleinResource(self.app)
+        self.produced = []  # type: List[Any]
+        self.closed = []  # type: List[bool]
+
+    def generate(self, items):
+        # type: (Iterable[Any]) -> Iterator[Any]
+        try:
+            for item in items:
+                self.produced.append(item)
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.closed.append(True)
+
+    def route(self, items):
+        # type: (Iterable[Any]) -> None
+        @self.app.route("/")
+        def root(request):
+            # type: (IRequest) -> Iterator[Any]
+            return self.generate(items)
+
+    def test_streamed(self):
+        # type: () -> None
+        """
+        Each item is written as it's produced, and the request is finished
+        after the last.
+        """
+        self.route([b"one", u"two \N{SNOWMAN}", b"three"])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(
+            request.getWrittenData(), u"onetwo \N{SNOWMAN}three".encode("utf-8")
+        )
+        self.assertEqual(request.writeCount, 3)
+        self.assertTrue(request.finished)
+        self.assertIsNone(request.producer)
+        self.assertFalse(request.responseHeaders.hasHeader(b"content-length"))
+
+    def test_list(self):
+        # type: () -> None
+        """
+        Lists are streamed too.
+        """
+
+        @self.app.route("/")
+        def root(request):
+            # type: (IRequest) -> List[bytes]
+            return [b"a", b"b"]
+
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"ab")
+
+    def test_buffers(self):
+        # type: () -> None
+        """
+        Items may be buffers, such as L{bytearray}s and L{memoryview}s.
+        """
+        self.route([bytearray(b"a"), memoryview(b"xbx")[1:2], u"c"])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+        self.assertEqual(request.getWrittenData(), b"abc")
+
+    def test_paused(self):
+        # type: () -> None
+        """
+        No items are produced while the transport has paused the request's
+        producer.
+        """
+        self.route([b"%d" % (i,) for i in range(5)])
+        request = requestMock(b"/")
+        write = request.write
+
+        def pausingWrite(data):
+            # type: (bytes) -> None
+            write(data)
+            request.producer.pauseProducing()
+
+        request.write = pausingWrite
+        done = _render(self.kr, request)
+
+        # The fake request resumes the producer twice as it's registered.
+        self.assertEqual(request.getWrittenData(), b"01")
+        self.assertEqual(len(self.produced), 2)
+        request.producer.resumeProducing()
+        self.assertEqual(len(self.produced), 3)
+        self.assertNoResult(done)
+
+        while request.producer is not None:
+            request.producer.resumeProducing()
+        self.successResultOf(done)
+        self.assertEqual(request.getWrittenData(), b"01234")
+
+    def test_connectionLost(self):
+        # type: () -> None
+        """
+        The generator is closed when the connection is lost.
+        """
+        self.route([b"%d" % (i,) for i in range(5)])
+        request = requestMock(b"/")
+        write = request.write
+
+        def pausingWrite(data):
+            # type: (bytes) -> None
+            write(data)
+            request.producer.pauseProducing()
+
+        request.write = pausingWrite
+        done = _render(self.kr, request)
+
+        request.connectionLost(ConnectionLost())
+        self.failureResultOf(done, ConnectionLost)
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(len(self.produced), 2)
+
+    def test_failure(self):
+        # type: () -> None
+        """
+        An exception raised by the generator before anything has been
+        written is handled by the app's error handlers.
+        """
+
+        @self.app.handle_errors(ZeroDivisionError)
+        def handler(request, failure):
+            # type: (IRequest, Failure) -> bytes
+            return b"handled"
+
+        self.route([ZeroDivisionError()])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b"handled")
+        self.assertTrue(request.finished)
+        self.assertEqual(self.closed, [True])
+
+    def test_failureWithoutAsync(self):
+        # type: () -> None
+        """
+        Exceptions raised by iterators are handled on Pythons without
+        C{StopAsyncIteration}.
+        """
+        stopAsyncIteration = getattr(builtins, "StopAsyncIteration", None)
+        if stopAsyncIteration is not None:
+            del builtins.StopAsyncIteration
+            self.addCleanup(
+                setattr, builtins, "StopAsyncIteration", stopAsyncIteration
+            )
+
+        @self.app.handle_errors(ZeroDivisionError)
+        def handler(request, failure):
+            # type: (IRequest, Failure) -> bytes
+            return b"handled"
+
+        self.route([ZeroDivisionError()])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b"handled")
+
+    def test_failureAfterWriting(self):
+        # type: () -> None
+        """
+        An exception raised by the generator once part of the response has
+        been written is logged, and the connection aborted, rather than an
+        error page being appended to the partial body.
+        """
+        handled = []  # type: List[Failure]
+
+        @self.app.handle_errors(ZeroDivisionError)
+        def handler(request, failure):
+            # type: (IRequest, Failure) -> bytes
+            handled.append(failure)
+            return b"handled"
+
+        self.route([b"row1\n", b"row2\n", ZeroDivisionError()])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b"row1\nrow2\n")
+        self.assertEqual(handled, [])
+        self.assertEqual(request.processingFailed.call_count, 0)
+        self.assertEqual(request.code, 200)
+        self.assertTrue(request.transport.disconnected)
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+    def test_notBytes(self):
+        # type: () -> None
+        """
+        Items which aren't L{bytes}, text or buffers abort the response, and
+        close the generator.
+        """
+        self.route([b"ok", 1, b"never"])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.getWrittenData(), b"ok")
+        self.assertEqual(request.processingFailed.call_count, 0)
+        self.assertTrue(request.transport.disconnected)
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(self.produced, [b"ok", 1])
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+
+    def test_notBytesFirst(self):
+        # type: () -> None
+        """
+        A first item which isn't L{bytes}, text or a buffer fails the
+        request.
+        """
+        self.route([1, b"never"])
+        request = requestMock(b"/")
+        self.successResultOf(_render(self.kr, request))
+
+        self.assertEqual(request.processingFailed.call_count, 1)
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(self.produced, [1])
+        self.flushLoggedErrors(TypeError)
+
+    def test_released(self):
+        # type: () -> None
+        """
+        Once every item has been written, or the response is no longer
+        wanted, the request and the iterator are let go of, so that they're
+        freed without waiting for the garbage collector.
+        """
+        gc.disable()
+        self.addCleanup(gc.enable)
+
+        for cancel in [False, True]:
+            request = requestMock(b"/")
+            if cancel:
+                request.write = lambda data: request.producer.pauseProducing()
+            items = self.generate([b"a", b"b", b"c"])
+            released = weakref.ref(items)
+            done = streamResponse(request, items)
+            del items
+            if cancel:
+                done.cancel()
+                self.failureResultOf(done)
+            else:
+                self.successResultOf(done)
+            self.assertIsNone(released(), cancel)
+
+
+if sys.version_info >= (3, 6):
+    from .py3_test_stream import AsyncStreamedRouteTests
+
+    AsyncStreamedRouteTests  # shh pyflakes
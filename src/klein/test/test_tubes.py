@@ -0,0 +1,326 @@
+# Copyright (c) 2011-2019. See LICENSE for details.
+
+"""
+Tests for L{klein._tubes}.
+"""
+
+from io import BytesIO
+from typing import List, Optional
+
+from tubes.itube import IDrain, IFount, IPause, ISegment
+from tubes.kit import Pauser, beginFlowingTo
+
+from twisted.internet.defer import CancelledError
+from twisted.internet.error import ConnectionLost
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+
+from zope.interface import implementer
+
+from ._trial import TestCase
+from .test_resource import requestMock
+from .._imessage import BodyTooLargeError
+from .._tubes import IOFount, RequestDrain, fountToBytes, fountToRequest
+
+
+__all__ = ()
+
+
+@implementer(IFount)
+class ListFount(object):
+    """
+    Fount which delivers items from a list when asked to.
+    """
+
+    outputType = ISegment
+
+    def __init__(self, items):
+        # type: (List[bytes]) -> None
+        self.items = items
+        self.drain = None  # type: Optional[IDrain]
+        self.paused = False
+        self.stopped = False
+        self._pauser = Pauser(self._pause, self._resume)
+
+    def _pause(self):
+        # type: () -> None
+        self.paused = True
+
+    def _resume(self):
+        # type: () -> None
+        self.paused = False
+
+    def flowTo(self, drain):
+        # type: (IDrain) -> Optional[IFount]
+        return beginFlowingTo(self, drain)
+
+    def pauseFlow(self):
+        # type: () -> IPause
+        return self._pauser.pause()
+
+    def stopFlow(self):
+        # type: () -> None
+        self.stopped = True
+
+    def deliver(self):
+        # type: () -> None
+        """
+        Deliver the next item to the drain, or stop the flow if there are
+        none left.
+        """
+        assert self.drain is not None
+        if self.items:
+            self.drain.receive(self.items.pop(0))
+        else:
+            self.drain.flowStopped(Failure(StopIteration()))
+
+
+@implementer(IDrain)
+class ListDrain(object):
+    """
+    Drain which keeps the items it receives, and can pause its fount as it
+    receives each one.
+    """
+
+    inputType = ISegment
+    fount = None  # type: Optional[IFount]
+
+    def __init__(self, pauseEach=False):
+        # type: (bool) -> None
+        self.received = []  # type: List[bytes]
+        self.stopped = []  # type: List[Failure]
+        self.pauses = []  # type: List[IPause]
+        self.pauseEach = pauseEach
+
+    def flowingFrom(self, fount):
+        # type: (Optional[IFount]) -> None
+        self.fount = fount
+
+    def receive(self, item):
+        # type: (bytes) -> float
+        self.received.append(item)
+        if self.pauseEach:
+            assert self.fount is not None
+            self.pauses.append(self.fount.pauseFlow())
+        return 0.0
+
+    def flowStopped(self, reason):
+        # type: (Failure) -> None
+        self.stopped.append(reason)
+
+
+class IOFountTests(TestCase):
+    """
+    Tests for L{IOFount}.
+    """
+
+    def test_chunks(self):
+        # type: () -> None
+        """
+        The source is delivered C{chunkSize} bytes at a time, and then the
+        flow stops.
+        """
+        drain = ListDrain()
+        IOFount(source=BytesIO(b"abcdefg"), chunkSize=3).flowTo(drain)
+
+        self.assertEqual(drain.received, [b"abc", b"def", b"g"])
+        self.assertEqual(len(drain.stopped), 1)
+        self.assertTrue(drain.stopped[0].check(StopIteration))
+
+    def test_paused(self):
+        # type: () -> None
+        """
+        Nothing more is read from the source while the flow is paused.  Once
+        it's resumed, the flow carries on from the reactor.
+        """
+        clock = Clock()
+        source = BytesIO(b"abcdefg")
+        drain = ListDrain(pauseEach=True)
+        IOFount(source=source, chunkSize=3, reactor=clock).flowTo(drain)
+
+        self.assertEqual(drain.received, [b"abc"])
+        self.assertEqual(source.tell(), 3)
+
+        drain.pauses.pop().unpause()
+        self.assertEqual(drain.received, [b"abc"])
+        clock.advance(0)
+        self.assertEqual(drain.received, [b"abc", b"def"])
+
+        drain.pauseEach = False
+        drain.pauses.pop().unpause()
+        clock.advance(0)
+        self.assertEqual(drain.received, [b"abc", b"def", b"g"])
+        self.assertEqual(len(drain.stopped), 1)
+
+    def test_stopFlow(self):
+        # type: () -> None
+        """
+        Once the flow is stopped, nothing more is delivered, even if it was
+        about to be resumed.
+        """
+        clock = Clock()
+        drain = ListDrain(pauseEach=True)
+        fount = IOFount(source=BytesIO(b"abcdefg"), chunkSize=3, reactor=clock)
+        fount.flowTo(drain)
+        drain.pauses.pop().unpause()
+        fount.stopFlow()
+        clock.advance(0)
+
+        self.assertEqual(drain.received, [b"abc"])
+        self.assertEqual(drain.stopped, [])
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_fountToBytes(self):
+        # type: () -> None
+        """
+        L{fountToBytes} collects every chunk.
+        """
+        fount = IOFount(source=BytesIO(b"x" * 10), chunkSize=3)
+        self.assertEqual(self.successResultOf(fountToBytes(fount)), b"x" * 10)
+
+    def test_fountToBytesLimit(self):
+        # type: () -> None
+        """
+        Given a C{maxLength}, L{fountToBytes} collects up to that many bytes,
+        and otherwise stops the flow and fails with L{BodyTooLargeError}.
+        """
+        fount = IOFount(source=BytesIO(b"x" * 10), chunkSize=3)
+        self.assertEqual(
+            self.successResultOf(fountToBytes(fount, 10)), b"x" * 10
+        )
+
+        source = BytesIO(b"x" * 10)
+        fount = IOFount(source=source, chunkSize=3)
+        failure = self.failureResultOf(fountToBytes(fount, 5))
+        failure.trap(BodyTooLargeError)
+        self.assertEqual(failure.value.maxLength, 5)
+        self.assertEqual(failure.value.code, 413)
+        self.assertEqual(source.tell(), 6)
+
+    def test_toRequest(self):
+        # type: () -> None
+        """
+        Flowed to a request, the fount is read no faster than the request's
+        transport accepts its chunks.
+        """
+        clock = Clock()
+        request = requestMock(b"/")
+        write = request.write
+
+        def pausingWrite(data):
+            # type: (bytes) -> None
+            write(data)
+            request.producer.pauseProducing()
+
+        request.write = pausingWrite
+        source = BytesIO(b"abcdefg")
+        d = fountToRequest(
+            IOFount(source=source, chunkSize=3, reactor=clock), request
+        )
+
+        self.assertEqual(request.getWrittenData(), b"abc")
+        self.assertEqual(source.tell(), 3)
+        while request.producer is not None:
+            request.producer.resumeProducing()
+            clock.advance(0)
+        self.successResultOf(d)
+        self.assertEqual(request.getWrittenData(), b"abcdefg")
+
+
+class FountToRequestTests(TestCase):
+    """
+    Tests for L{fountToRequest} and L{RequestDrain}.
+    """
+
+    def test_writes(self):
+        # type: () -> None
+        """
+        Items from the fount are written to the request as they're received,
+        and the returned L{Deferred} fires once the flow stops, without
+        finishing the request.
+        """
+        request = requestMock(b"/")
+        fount = ListFount([b"one", b"two"])
+        d = fountToRequest(fount, request)
+
+        self.assertIsInstance(request.producer, RequestDrain)
+        fount.deliver()
+        self.assertEqual(request.getWrittenData(), b"one")
+        self.assertNoResult(d)
+
+        fount.deliver()
+        fount.deliver()
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual(request.getWrittenData(), b"onetwo")
+        self.assertIsNone(request.producer)
+        self.assertFalse(request.finished)
+
+    def test_pauseResume(self):
+        # type: () -> None
+        """
+        The fount is paused while the request's transport has paused its
+        producer.
+        """
+        request = requestMock(b"/")
+        fount = ListFount([b"one"])
+        fountToRequest(fount, request)
+
+        request.producer.pauseProducing()
+        request.producer.pauseProducing()
+        self.assertTrue(fount.paused)
+        request.producer.resumeProducing()
+        self.assertFalse(fount.paused)
+
+    def test_failure(self):
+        # type: () -> None
+        """
+        If the flow stops for any reason other than reaching its end, the
+        returned L{Deferred} fails with it.
+        """
+        request = requestMock(b"/")
+        fount = ListFount([])
+        d = fountToRequest(fount, request)
+
+        assert fount.drain is not None
+        fount.drain.flowStopped(Failure(ZeroDivisionError()))
+        self.failureResultOf(d, ZeroDivisionError)
+        self.assertIsNone(request.producer)
+
+    def test_stopped(self):
+        # type: () -> None
+        """
+        When the request's producer is stopped, or the returned L{Deferred}
+        cancelled, the fount is stopped and the L{Deferred} fails with
+        L{CancelledError}.
+        """
+        request = requestMock(b"/")
+        fount = ListFount([b"one"])
+        d = fountToRequest(fount, request)
+
+        request.producer.stopProducing()
+        self.assertTrue(fount.stopped)
+        self.failureResultOf(d, CancelledError)
+
+        request = requestMock(b"/")
+        fount = ListFount([b"one"])
+        d = fountToRequest(fount, request)
+        request.connectionLost(ConnectionLost())
+        d.cancel()
+
+        self.assertTrue(fount.stopped)
+        self.failureResultOf(d, CancelledError)
+
+    def test_writeFails(self):
+        # type: () -> None
+        """
+        If writing an item fails, the fount is stopped and the returned
+        L{Deferred} fails.
+        """
+        request = requestMock(b"/")
+        request.finish()
+        fount = ListFount([b"one"])
+        d = fountToRequest(fount, request)
+
+        fount.deliver()
+        self.assertTrue(fount.stopped)
+        self.failureResultOf(d, RuntimeError)